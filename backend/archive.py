@@ -0,0 +1,94 @@
+"""Moves old posts and their puzzle attempts out of the hot collections"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from pymongo.errors import BulkWriteError
+
+from changes import record_change
+
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE_SECONDS = 0.05
+DUPLICATE_KEY_ERROR = 11000
+
+
+async def copy_ignoring_duplicates(collection, docs: list):
+    """Insert documents that are not in the collection yet, so a rerun is harmless"""
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != DUPLICATE_KEY_ERROR for err in e.details.get("writeErrors", [])):
+            raise
+
+
+async def summarize_archived_attempts(db, post_id: str) -> dict:
+    """Attempt counts for a post whose attempts are all in the archive"""
+    result = await db.puzzle_attempts_archive.aggregate([
+        {"$match": {"post_id": post_id}},
+        {"$group": {
+            "_id": None,
+            "attempt_count": {"$sum": 1},
+            "players": {"$addToSet": "$user_id"},
+            "solvers": {"$addToSet": {"$cond": ["$is_correct", "$user_id", "$$REMOVE"]}},
+        }},
+    ]).to_list(1)
+    if not result:
+        return {"attempt_count": 0, "player_count": 0, "solved_count": 0}
+    return {
+        "attempt_count": result[0]["attempt_count"],
+        "player_count": len(result[0]["players"]),
+        "solved_count": len(result[0]["solvers"]),
+    }
+
+
+async def archive_post(db, post: dict) -> int:
+    """Move one post and its attempts to the archive collections
+
+    Every step is idempotent and the hot post is removed last, so an
+    interrupted run is simply completed by the next one.
+    """
+    post_id = post["post_id"]
+    await db.posts_archive.replace_one({"post_id": post_id}, post, upsert=True)
+
+    moved = 0
+    while True:
+        attempts = await db.puzzle_attempts.find({"post_id": post_id}).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not attempts:
+            break
+        await copy_ignoring_duplicates(db.puzzle_attempts_archive, attempts)
+        await db.puzzle_attempts.delete_many({"_id": {"$in": [a["_id"] for a in attempts]}})
+        moved += len(attempts)
+        await asyncio.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+
+    # Unfinished multi-move attempts are not worth keeping
+    await db.puzzle_progress.delete_many({"post_id": post_id})
+
+    # Counted from the archive so attempts moved by an interrupted run are included
+    summary = await summarize_archived_attempts(db, post_id)
+    await db.post_summaries.update_one(
+        {"post_id": post_id},
+        {"$set": {
+            **summary,
+            "title": post.get("title"),
+            "is_puzzle": post.get("is_puzzle", False),
+            "created_at": post["created_at"],
+            "archived_at": datetime.now(timezone.utc),
+        }},
+        upsert=True
+    )
+    await db.posts.delete_one({"post_id": post_id})
+    await record_change(db, "post", "archive", post_id)
+    return moved
+
+
+async def archive_old_posts(db, older_than: timedelta, limit: int = 100) -> dict:
+    """Archive up to `limit` of the oldest posts created before the cutoff"""
+    cutoff = datetime.now(timezone.utc) - older_than
+    posts = await db.posts.find(
+        {"published": True, "created_at": {"$lt": cutoff}},
+        {"_id": 0}
+    ).sort("created_at", 1).limit(limit).to_list(limit)
+
+    attempts = 0
+    for post in posts:
+        attempts += await archive_post(db, post)
+    return {"posts": len(posts), "attempts": attempts}
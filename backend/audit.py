@@ -0,0 +1,109 @@
+"""Buffered audit log of owner actions, written in batches"""
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class AuditLog:
+    """Collects audit entries in memory and writes them with insert_many
+
+    `record` never touches the database, so auditing adds no round trip to
+    the request. Entries are written once `batch_size` are waiting, every
+    `flush_interval` seconds otherwise, and on shutdown. If a write fails
+    the entries are kept for the next flush, up to `max_buffered`; beyond
+    that the oldest are dropped and counted.
+    """
+
+    def __init__(self, collection, batch_size: int, flush_interval: float, max_buffered: int):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self._buffer = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self.recorded = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def record(self, actor_id: Optional[str], action: str, target_type: str, target_id: str,
+               before: Optional[dict] = None, after: Optional[dict] = None, client: Optional[str] = None):
+        self._buffer.append({
+            "audit_id": f"audit_{uuid.uuid4().hex[:12]}",
+            "created_at": datetime.now(timezone.utc),
+            "actor_id": actor_id,
+            "action": action,
+            "target_type": target_type,
+            "target_id": target_id,
+            "before": before,
+            "after": after,
+            "client": client,
+        })
+        self.recorded += 1
+        self._trim()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _trim(self):
+        overflow = len(self._buffer) - self.max_buffered
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped += overflow
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            entries, self._buffer = self._buffer, []
+            if not entries:
+                return 0
+            self.flushes += 1
+            try:
+                await self.collection.insert_many(entries, ordered=False)
+            except BulkWriteError as e:
+                # Duplicates are entries an interrupted flush already wrote;
+                # anything else is kept for the next flush
+                failed = [
+                    entries[error["index"]] for error in e.details.get("writeErrors", [])
+                    if error.get("code") != DUPLICATE_KEY_ERROR
+                ]
+                written = e.details.get("nInserted", 0)
+                self.written += written
+                if failed:
+                    self.failed_flushes += 1
+                    self._requeue(failed)
+                return written
+            except BaseException:
+                # Includes cancellation at shutdown, which flushes once more afterwards
+                self.failed_flushes += 1
+                self._requeue(entries)
+                raise
+            self.written += len(entries)
+            return len(entries)
+
+    def _requeue(self, entries: list):
+        self._buffer[:0] = entries
+        self._trim()
+
+    async def wait(self):
+        """Return once a batch is full or the flush interval has passed"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,55 @@
+"""Perft check and benchmark for the puzzle move generator
+
+Counts the leaf nodes of the legal move tree for well known positions and
+compares them with the published numbers, so any move generation bug shows
+up as a mismatch. Prints nodes per second for each run.
+
+    python bench_perft.py            # default depths, a few seconds
+    python bench_perft.py --deep     # one ply deeper, for a longer run
+"""
+import argparse
+import sys
+import time
+
+from movegen import START_FEN, Position, perft
+
+# (name, FEN, leaf counts for depth 1, 2, 3, ...)
+PERFT_POSITIONS = [
+    ("start", START_FEN, [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("castling", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379]),
+]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--deep", action="store_true", help="also run the deepest listed depth")
+    args = parser.parse_args()
+
+    failures = 0
+    total_nodes = 0
+    total_seconds = 0.0
+    for name, fen, counts in PERFT_POSITIONS:
+        position = Position.from_fen(fen)
+        depths = len(counts) if args.deep else len(counts) - 1
+        for depth in range(1, depths + 1):
+            started = time.perf_counter()
+            nodes = perft(position, depth)
+            seconds = time.perf_counter() - started
+            expected = counts[depth - 1]
+            status = "ok" if nodes == expected else f"MISMATCH (expected {expected})"
+            failures += nodes != expected
+            total_nodes += nodes
+            total_seconds += seconds
+            print(f"{name:<11} depth {depth}  {nodes:>9} nodes  {seconds:7.2f}s  "
+                  f"{nodes / max(seconds, 1e-9):>9.0f} nodes/s  {status}")
+
+    print(f"total       {total_nodes} nodes in {total_seconds:.2f}s "
+          f"({total_nodes / max(total_seconds, 1e-9):.0f} nodes/s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Import throughput benchmark for the PGN parser and game packing
+
+Generates a PGN of random legal games (with comments, variations and NAGs
+mixed in), then times splitting, SAN replay and packing the way the import
+does. Checks that every game round-trips to the same moves and that each
+position reached is found through its Zobrist hash.
+
+    python bench_pgn.py
+    python bench_pgn.py --games 20000 --batch-size 1000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from movegen import START_FEN, Position, san, uci, zobrist_hash
+from pgn import PgnSplitter, build_documents, decode_moves, import_pgn, signed_hash
+
+
+def random_game(rng: random.Random, max_plies: int) -> list:
+    position = Position.from_fen(START_FEN)
+    moves = []
+    for _ in range(rng.randint(20, max_plies)):
+        legal = position.legal_moves()
+        if not legal:
+            break
+        move = rng.choice(legal)
+        moves.append((move, san(position, move, legal)))
+        position = position.make_move(move)
+    return moves
+
+
+def game_pgn(number: int, moves: list, rng: random.Random) -> str:
+    result = rng.choice(["1-0", "0-1", "1/2-1/2"])
+    tags = [
+        f'[Event "Benchmark {number // 100}"]',
+        '[Site "Warje"]',
+        f'[Date "2024.01.{number % 28 + 1:02d}"]',
+        f'[Round "{number % 9 + 1}"]',
+        f'[White "Player {rng.randint(1, 500)}"]',
+        f'[Black "Player {rng.randint(1, 500)}"]',
+        f'[Result "{result}"]',
+        f'[WhiteElo "{rng.randint(1000, 2400)}"]',
+    ]
+    text = []
+    for ply, (_, notation) in enumerate(moves):
+        if ply % 2 == 0:
+            text.append(f"{ply // 2 + 1}.")
+        text.append(notation)
+        roll = rng.random()
+        if roll < 0.03:
+            text.append("{a comment}")
+        elif roll < 0.05:
+            text.append("$1")
+        elif roll < 0.06:
+            text.append("(1. e4 e5 {side line})")
+    text.append(result)
+    return "\n".join(tags) + "\n\n" + " ".join(text) + "\n\n"
+
+
+class CountingCollection:
+    """Stands in for db.games so only parsing and packing are measured"""
+
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+async def chunked(text: str, size: int):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=3000)
+    parser.add_argument("--max-plies", type=int, default=120)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    games = [random_game(rng, args.max_plies) for _ in range(args.games)]
+    pgn_text = "".join(game_pgn(i, moves, rng) for i, moves in enumerate(games))
+    plies = sum(len(moves) for moves in games)
+    print(f"generated {args.games} games, {plies} plies, {len(pgn_text) / 1e6:.1f} MB "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    splitter = PgnSplitter()
+    texts = [t for chunk_start in range(0, len(pgn_text), 65536)
+             for t in splitter.feed(pgn_text[chunk_start:chunk_start + 65536])]
+    texts.extend(splitter.close())
+    split_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    docs, errors = build_documents(texts)
+    parse_seconds = time.perf_counter() - started
+
+    collection = CountingCollection()
+    started = time.perf_counter()
+    summary = asyncio.run(import_pgn(chunked(pgn_text, 65536), collection, batch_size=args.batch_size))
+    import_seconds = time.perf_counter() - started
+
+    print(f"split       {len(texts)} games in {split_seconds:.2f}s")
+    print(f"replay+pack {len(docs)} games in {parse_seconds:.2f}s  "
+          f"{len(docs) / parse_seconds:.0f} games/s  {plies / parse_seconds:.0f} plies/s")
+    print(f"import      {summary['imported']} games in {import_seconds:.2f}s  "
+          f"{summary['imported'] / import_seconds:.0f} games/s")
+
+    packed = sum(len(doc["moves"]) for doc in docs)
+    as_san = sum(len(notation) + 1 for moves in games for _, notation in moves)
+    print(f"moves stored in {packed} bytes ({packed / max(plies, 1):.1f} per ply), "
+          f"{as_san} as SAN strings")
+
+    problems = []
+    if errors or len(docs) != args.games or summary["imported"] != args.games:
+        problems.append(f"{len(errors)} games rejected, {summary['imported']} imported: {errors[:3]}")
+    index = {}
+    for number, (doc, moves) in enumerate(zip(docs, games)):
+        if decode_moves(doc["moves"]) != [move for move, _ in moves]:
+            problems.append(f"game {number} moves do not round-trip")
+        for position_hash in doc["positions"]:
+            index.setdefault(position_hash, []).append(number)
+
+    # Every position of a sample of games must lead back to that game
+    started = time.perf_counter()
+    lookups = 0
+    for number in rng.sample(range(len(games)), min(50, len(games))):
+        position = Position.from_fen(START_FEN)
+        for move, _ in games[number]:
+            position = position.make_move(move)
+            lookups += 1
+            if number not in index.get(signed_hash(zobrist_hash(position)), ()):
+                problems.append(f"game {number} not found after {uci(move)}")
+                break
+    print(f"position lookups: {lookups} in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({len(index)} distinct positions indexed)")
+
+    for problem in problems[:20]:
+        print(f"  PROBLEM {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Benchmark and sanity check for the Swiss pairing engine
+
+Plays synthetic open tournaments with rating based random results, timing
+each pairing and tie-break update. Checks that no game repeats, nobody gets
+two byes, colours stay within the Swiss limits and the incremental
+tie-breaks match a full recomputation.
+
+    python bench_swiss.py
+    python bench_swiss.py --players 500 --rounds 11 --events 3
+"""
+import argparse
+import random
+import sys
+import time
+
+from swiss import RESULT_POINTS, SwissPlayer, apply_round, pair_round
+
+
+def play_game(white: SwissPlayer, black: SwissPlayer, rng: random.Random) -> str:
+    expected = 1 / (1 + 10 ** ((black.rating - white.rating) / 400))
+    roll = rng.random()
+    if roll < expected - 0.1:
+        return "1-0"
+    if roll < expected + 0.1:
+        return "1/2-1/2"
+    return "0-1"
+
+
+def recompute_tiebreaks(players: dict) -> dict:
+    """Buchholz and Sonneborn-Berger from scratch, to compare with the incremental values"""
+    return {
+        player_id: (
+            sum(players[o].score for o in player.results),
+            sum(players[o].score * points for o, points in player.results.items()),
+        )
+        for player_id, player in players.items()
+    }
+
+
+def run_event(player_count: int, rounds: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    players = {
+        f"p{i}": SwissPlayer(f"p{i}", rating=rng.randint(800, 2400))
+        for i in range(player_count)
+    }
+    pairing_times = []
+    update_times = []
+    problems = []
+
+    for round_number in range(1, rounds + 1):
+        started = time.perf_counter()
+        boards, bye = pair_round(list(players.values()))
+        pairing_times.append(time.perf_counter() - started)
+
+        games = []
+        for white_id, black_id in boards:
+            if black_id in players[white_id].results:
+                problems.append(f"round {round_number}: {white_id} and {black_id} meet again")
+            games.append((white_id, black_id, play_game(players[white_id], players[black_id], rng)))
+        if bye:
+            if players[bye].had_bye:
+                problems.append(f"round {round_number}: second bye for {bye}")
+            games.append((bye, None, None))
+
+        started = time.perf_counter()
+        apply_round(players, games)
+        update_times.append(time.perf_counter() - started)
+
+    for player in players.values():
+        played = player.colors.replace("-", "")
+        if abs(played.count("W") - played.count("B")) > 2:
+            problems.append(f"{player.player_id} has colours {player.colors}")
+    if any(
+        (players[p].buchholz, players[p].sonneborn_berger) != values
+        for p, values in recompute_tiebreaks(players).items()
+    ):
+        problems.append("incremental tie-breaks differ from a full recomputation")
+
+    return {"pairing": pairing_times, "update": update_times, "problems": problems}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=9)
+    parser.add_argument("--events", type=int, default=5)
+    args = parser.parse_args()
+
+    assert set(RESULT_POINTS) == {"1-0", "0-1", "1/2-1/2"}
+    failures = 0
+    for seed in range(args.events):
+        result = run_event(args.players, args.rounds, seed)
+        pairing_ms = [t * 1000 for t in result["pairing"]]
+        update_ms = [t * 1000 for t in result["update"]]
+        print(f"event {seed}: {args.players} players, {args.rounds} rounds  "
+              f"pairing avg {sum(pairing_ms) / len(pairing_ms):.1f} ms, max {max(pairing_ms):.1f} ms  "
+              f"tie-break update avg {sum(update_ms) / len(update_ms):.2f} ms")
+        for problem in result["problems"]:
+            print(f"  PROBLEM {problem}")
+        failures += bool(result["problems"])
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
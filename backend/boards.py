@@ -0,0 +1,373 @@
+"""FEN positions rendered to SVG and PNG board images, with a two level cache"""
+import hashlib
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Optional
+
+FEN_PIECES = "KQRBNPkqrbnp"
+CASTLING_RE = re.compile(r"^(-|K?Q?k?q?)$")
+EN_PASSANT_RE = re.compile(r"^(-|[a-h][36])$")
+ORIENTATIONS = ("white", "black")
+
+# 16x16 piece silhouettes, drawn for both colours with a one pixel outline
+MASK_SIZE = 16
+PIECE_MASKS = {
+    "k": (
+        "................",
+        ".......##.......",
+        "......####......",
+        ".......##.......",
+        "..####.##.####..",
+        ".##############.",
+        ".##############.",
+        ".##############.",
+        "..############..",
+        "...##########...",
+        "....########....",
+        "....########....",
+        "...##########...",
+        "...##########...",
+        "................",
+        "................",
+    ),
+    "q": (
+        "................",
+        "..#....##....#..",
+        "..##..####..##..",
+        "..###.####.###..",
+        "..############..",
+        "..############..",
+        "...##########...",
+        "....########....",
+        ".....######.....",
+        ".....######.....",
+        "....########....",
+        "...##########...",
+        "..############..",
+        "..############..",
+        "................",
+        "................",
+    ),
+    "r": (
+        "................",
+        "................",
+        "...##..##..##...",
+        "...##########...",
+        "....########....",
+        ".....######.....",
+        ".....######.....",
+        ".....######.....",
+        ".....######.....",
+        ".....######.....",
+        "....########....",
+        "...##########...",
+        "..############..",
+        "..############..",
+        "................",
+        "................",
+    ),
+    "b": (
+        "................",
+        ".......##.......",
+        "......####......",
+        ".....##..##.....",
+        ".....######.....",
+        "....########....",
+        "....########....",
+        ".....######.....",
+        "......####......",
+        "......####......",
+        ".....######.....",
+        "....########....",
+        "..############..",
+        "..############..",
+        "................",
+        "................",
+    ),
+    "n": (
+        "................",
+        "......#.#.......",
+        ".....######.....",
+        "....########....",
+        "...##.#######...",
+        "..###########...",
+        "..#####..####...",
+        "...##...#####...",
+        ".......#####....",
+        "......######....",
+        ".....######.....",
+        "....########....",
+        "...##########...",
+        "...##########...",
+        "................",
+        "................",
+    ),
+    "p": (
+        "................",
+        "................",
+        "................",
+        "......####......",
+        ".....######.....",
+        ".....######.....",
+        "......####......",
+        ".....######.....",
+        "......####......",
+        "......####......",
+        ".....######.....",
+        "....########....",
+        "...##########...",
+        "...##########...",
+        "................",
+        "................",
+    ),
+}
+
+# PNG palette indexes and the colours they stand for
+LIGHT, DARK, WHITE_FILL, BLACK_FILL, OUTLINE = range(5)
+PALETTE = (
+    (240, 217, 181),
+    (181, 136, 99),
+    (255, 255, 255),
+    (70, 70, 70),
+    (0, 0, 0),
+)
+SVG_COLORS = ["#%02x%02x%02x" % rgb for rgb in PALETTE]
+
+PNG_SQUARE_SIZES = (16, 32, 48, 64)
+
+
+def normalize_fen(fen: str, side_to_move: Optional[str] = None) -> str:
+    """Validate a FEN (or just its piece placement) and return all six fields
+
+    `side_to_move` ("w" or "b") overrides the side given in the FEN.
+    Raises ValueError describing the first problem found.
+    """
+    fields = fen.strip().split()
+    if not fields or len(fields) > 6:
+        raise ValueError("FEN must have between 1 and 6 fields")
+
+    ranks = fields[0].split("/")
+    if len(ranks) != 8:
+        raise ValueError("FEN piece placement must have 8 ranks")
+    for rank_index, rank in enumerate(ranks):
+        width = 0
+        for char in rank:
+            if char in "12345678":
+                width += int(char)
+            elif char in FEN_PIECES:
+                width += 1
+                if char in "Pp" and rank_index in (0, 7):
+                    raise ValueError("Pawns cannot stand on the first or last rank")
+            else:
+                raise ValueError(f"Invalid character '{char}' in FEN")
+        if width != 8:
+            raise ValueError(f"FEN rank {8 - rank_index} does not have 8 squares")
+    if fields[0].count("K") != 1 or fields[0].count("k") != 1:
+        raise ValueError("FEN must have exactly one king of each colour")
+
+    defaults = ["w", "-", "-", "0", "1"]
+    fields += defaults[len(fields) - 1:]
+    if side_to_move is not None:
+        fields[1] = side_to_move
+    if fields[1] not in ("w", "b"):
+        raise ValueError("Side to move must be 'w' or 'b'")
+    if not CASTLING_RE.match(fields[2]):
+        raise ValueError("Invalid castling field in FEN")
+    if not EN_PASSANT_RE.match(fields[3]):
+        raise ValueError("Invalid en passant field in FEN")
+    if not fields[4].isdigit() or not fields[5].isdigit() or int(fields[5]) < 1:
+        raise ValueError("Invalid move counters in FEN")
+    return " ".join(fields)
+
+
+def board_id(fen: str, orientation: str) -> str:
+    """Cache key of a rendered board; only placement and orientation affect the image"""
+    placement = fen.split()[0]
+    return hashlib.sha256(f"{placement} {orientation}".encode()).hexdigest()[:24]
+
+
+def board_rows(fen: str, orientation: str) -> list:
+    """Eight strings of eight squares ('.' when empty) in display order"""
+    rows = []
+    for rank in fen.split()[0].split("/"):
+        rows.append("".join("." * int(c) if c.isdigit() else c for c in rank))
+    if orientation == "black":
+        rows = [row[::-1] for row in reversed(rows)]
+    return rows
+
+
+@lru_cache(maxsize=None)
+def piece_layers(piece: str) -> tuple:
+    """Outline and fill pixels of a piece silhouette, as sets of (x, y)"""
+    mask = PIECE_MASKS[piece.lower()]
+    cells = {(x, y) for y, line in enumerate(mask) for x, char in enumerate(line) if char == "#"}
+    outline = {
+        (x, y) for x, y in cells
+        if not {(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)} <= cells
+    }
+    return frozenset(outline), frozenset(cells - outline)
+
+
+def svg_runs(cells) -> str:
+    """Path data drawing a set of unit pixels as horizontal runs"""
+    parts = []
+    for y in range(MASK_SIZE):
+        x = 0
+        while x < MASK_SIZE:
+            if (x, y) not in cells:
+                x += 1
+                continue
+            start = x
+            while x < MASK_SIZE and (x, y) in cells:
+                x += 1
+            parts.append(f"M{start} {y}h{x - start}v1h{start - x}z")
+    return "".join(parts)
+
+
+def render_svg(fen: str, orientation: str) -> bytes:
+    """Board as a compact SVG; each piece used is defined once and referenced"""
+    rows = board_rows(fen, orientation)
+    size = 8 * MASK_SIZE
+    dark_squares = "".join(
+        f"M{file * MASK_SIZE} {rank * MASK_SIZE}h{MASK_SIZE}v{MASK_SIZE}h-{MASK_SIZE}z"
+        for rank in range(8) for file in range(8) if (rank + file) % 2
+    )
+
+    defs = []
+    for piece in sorted({p for row in rows for p in row if p != "."}):
+        outline, fill = piece_layers(piece)
+        fill_color = SVG_COLORS[WHITE_FILL if piece.isupper() else BLACK_FILL]
+        defs.append(
+            f'<g id="{piece_symbol(piece)}">'
+            f'<path fill="{SVG_COLORS[OUTLINE]}" d="{svg_runs(outline | fill)}"/>'
+            f'<path fill="{fill_color}" d="{svg_runs(fill)}"/></g>'
+        )
+
+    uses = [
+        f'<use href="#{piece_symbol(piece)}" x="{file * MASK_SIZE}" y="{rank * MASK_SIZE}"/>'
+        for rank, row in enumerate(rows) for file, piece in enumerate(row) if piece != "."
+    ]
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<defs>{"".join(defs)}</defs>'
+        f'<rect width="{size}" height="{size}" fill="{SVG_COLORS[LIGHT]}"/>'
+        f'<path fill="{SVG_COLORS[DARK]}" d="{dark_squares}"/>'
+        f'{"".join(uses)}</svg>'
+    ).encode()
+
+
+def piece_symbol(piece: str) -> str:
+    return ("w" if piece.isupper() else "b") + piece.upper()
+
+
+@lru_cache(maxsize=None)
+def square_sprite(piece: str, square: int, scale: int) -> tuple:
+    """Palette index rows of one square, scaled up from the 16x16 mask"""
+    if piece == ".":
+        return (bytes([square]) * MASK_SIZE * scale,) * MASK_SIZE * scale
+
+    outline, fill = piece_layers(piece)
+    fill_index = WHITE_FILL if piece.isupper() else BLACK_FILL
+    rows = []
+    for y in range(MASK_SIZE):
+        row = bytearray()
+        for x in range(MASK_SIZE):
+            index = fill_index if (x, y) in fill else OUTLINE if (x, y) in outline else square
+            row += bytes([index]) * scale
+        rows.extend([bytes(row)] * scale)
+    return tuple(rows)
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def render_png(fen: str, orientation: str, square_size: int = 32) -> bytes:
+    """Board as an 8 bit palette PNG, assembled from prebuilt square sprites"""
+    if square_size not in PNG_SQUARE_SIZES:
+        raise ValueError(f"square_size must be one of {PNG_SQUARE_SIZES}")
+    scale = square_size // MASK_SIZE
+    rows = board_rows(fen, orientation)
+
+    raw = bytearray()
+    for rank, row in enumerate(rows):
+        sprites = [
+            square_sprite(piece, DARK if (rank + file) % 2 else LIGHT, scale)
+            for file, piece in enumerate(row)
+        ]
+        for y in range(square_size):
+            raw += b"\x00"  # no filter
+            for sprite in sprites:
+                raw += sprite[y]
+
+    size = 8 * square_size
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        png_chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 3, 0, 0, 0)),
+        png_chunk(b"PLTE", b"".join(bytes(rgb) for rgb in PALETTE)),
+        png_chunk(b"IDAT", zlib.compress(bytes(raw), 9)),
+        png_chunk(b"IEND", b""),
+    ])
+
+
+class BoardImageCache:
+    """Rendered boards in an in-memory LRU, backed by files on disk
+
+    `get` only looks at memory and is cheap enough for the event loop;
+    `load` reads or renders and writes the file, so run it in a thread.
+    """
+
+    def __init__(self, directory: Path, max_entries: int):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return data
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def load(self, key: str, render: Callable[[], bytes]) -> bytes:
+        path = self.directory / key
+        try:
+            data = path.read_bytes()
+            self.disk_hits += 1
+        except FileNotFoundError:
+            data = render()
+            self.renders += 1
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Written under a unique name and renamed so readers never see a partial file
+            tmp_path = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        self._remember(key, data)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "renders": self.renders,
+        }
@@ -0,0 +1,64 @@
+"""Change journal with a monotonic sequence, read by the delta sync endpoint"""
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument
+
+# Journal entries are dropped by a TTL index after this long. Clients whose
+# token is older than the oldest entry get a full sync instead.
+CHANGE_RETENTION = timedelta(days=30)
+
+# A gap in the sequence younger than this may be a write still in flight, so
+# readers stop before it. Older gaps are sequence numbers whose write failed.
+CHANGE_SETTLE = timedelta(seconds=5)
+
+
+async def next_sequence(db, name: str) -> int:
+    counter = await db.counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["value"]
+
+
+async def current_sequence(db) -> int:
+    counter = await db.counters.find_one({"_id": "changes"})
+    return counter["value"] if counter else 0
+
+
+async def record_change(db, kind: str, op: str, entity_id: str, user_id: str = None):
+    """Journal a change; user_id scopes it to one member, None means everyone"""
+    await db.changes.insert_one({
+        "seq": await next_sequence(db, "changes"),
+        "kind": kind,
+        "op": op,
+        "entity_id": entity_id,
+        "user_id": user_id,
+        "at": datetime.now(timezone.utc),
+    })
+
+
+async def read_changes(db, since: int, limit: int):
+    """Entries after `since` up to the first unsettled gap in the sequence
+
+    Returns the entries and whether more may be available.
+    """
+    entries = await db.changes.find(
+        {"seq": {"$gt": since}},
+        {"_id": 0}
+    ).sort("seq", 1).limit(limit).to_list(limit)
+
+    settled_before = datetime.now(timezone.utc) - CHANGE_SETTLE
+    expected = since + 1
+    for i, entry in enumerate(entries):
+        at = entry["at"].replace(tzinfo=timezone.utc)
+        if entry["seq"] != expected and at > settled_before:
+            return entries[:i], True
+        expected = entry["seq"] + 1
+    return entries, len(entries) == limit
+
+
+async def oldest_sequence(db):
+    entry = await db.changes.find_one({}, {"_id": 0, "seq": 1}, sort=[("seq", 1)])
+    return entry["seq"] if entry else None
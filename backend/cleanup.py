@@ -0,0 +1,65 @@
+"""Batched removal of data that belongs to deleted posts"""
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from uploads import POST_IMAGE_BUCKET
+
+# Collections holding per-post data, with the field that references the post
+POST_CASCADE = [
+    ("puzzle_attempts", "post_id"),
+    ("puzzle_progress", "post_id"),
+]
+
+CLEANUP_BATCH_SIZE = 500
+# Pause between batches so a huge cleanup never saturates MongoDB
+CLEANUP_BATCH_PAUSE_SECONDS = 0.05
+
+
+async def delete_in_batches(collection, query: dict,
+                            batch_size: int = CLEANUP_BATCH_SIZE,
+                            pause: float = CLEANUP_BATCH_PAUSE_SECONDS) -> int:
+    """Delete matching documents a bounded batch at a time"""
+    deleted = 0
+    while True:
+        ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return deleted
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        deleted += result.deleted_count
+        await asyncio.sleep(pause)
+
+
+async def cascade_post_delete(db, post_id: str) -> dict:
+    """Remove everything that references a deleted post"""
+    return {
+        name: await delete_in_batches(db[name], {field: post_id})
+        for name, field in POST_CASCADE
+    }
+
+
+async def delete_image_if_unreferenced(db, image_id: str) -> bool:
+    """Remove an uploaded image once no live or archived post uses it"""
+    for name in ("posts", "posts_archive"):
+        if await db[name].find_one({"image_id": image_id}, {"_id": 1}):
+            return False
+
+    bucket = AsyncIOMotorGridFSBucket(db, bucket_name=POST_IMAGE_BUCKET)
+    async for file_doc in db[f"{POST_IMAGE_BUCKET}.files"].find({"metadata.sha256": image_id}, {"_id": 1}):
+        await bucket.delete(file_doc["_id"])
+    return True
+
+
+async def find_orphaned_post_ids(db) -> set:
+    """Post ids referenced by cascade collections whose post no longer exists"""
+    referenced = set()
+    for name, field in POST_CASCADE:
+        referenced.update(await db[name].distinct(field))
+
+    existing = set()
+    referenced_list = sorted(referenced)
+    for start in range(0, len(referenced_list), 1000):
+        chunk = referenced_list[start:start + 1000]
+        existing.update(await db.posts.distinct("post_id", {"post_id": {"$in": chunk}}))
+
+    return referenced - existing
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Database maintenance commands for Warje Chess Club
+
+    python manage.py export --out ./export       # streaming, resumable export
+    python manage.py import --src ./export       # bulk import of an export
+    python manage.py gc-orphans [--dry-run]      # remove data of deleted posts
+    python manage.py archive --older-than-days 90  # move old posts to the archive
+    python manage.py import-pgn games.pgn        # add games to the game archive
+
+Exports are gzip compressed NDJSON (MongoDB extended JSON), one part file per
+batch, with post images written to separate files. A checkpoint is kept after
+every part so an interrupted export picks up where it stopped; exporting again
+into a directory holding a complete export replaces it.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from bson import json_util
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo.errors import BulkWriteError
+
+from archive import archive_old_posts
+from pgn import IMPORT_BATCH_SIZE, import_pgn
+from cleanup import cascade_post_delete, find_orphaned_post_ids
+from uploads import POST_IMAGE_BUCKET
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+EXPORT_COLLECTIONS = ["users", "posts", "puzzle_attempts", "user_sessions"]
+BATCH_SIZE = 1000
+CHECKPOINT_FILE = "checkpoint.json"
+IMPORT_CHECKPOINT_FILE = "import_checkpoint.json"
+MANIFEST_FILE = "manifest.json"
+UPLOADED_IMAGES_DIR = "uploaded_images"
+
+DATA_URI_PATTERN = re.compile(r"^data:(?P<mime>[\w.+-]+/[\w.+-]+);base64,(?P<data>.*)$", re.DOTALL)
+IMAGE_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp"}
+PGN_READ_SIZE = 1024 * 1024
+
+# Duplicate key errors are expected when an import is re-run
+DUPLICATE_KEY_ERROR = 11000
+
+
+def get_database():
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    return client, client[os.environ['DB_NAME']]
+
+
+def import_target() -> str:
+    """Key of the target database in the import checkpoint, without its credentials"""
+    target = f"{os.environ['MONGO_URL']}/{os.environ['DB_NAME']}"
+    return hashlib.sha256(target.encode()).hexdigest()[:16]
+
+
+def read_json(path: Path, default):
+    if not path.exists():
+        return default
+    return json.loads(path.read_text())
+
+
+def write_json_atomic(path: Path, data):
+    """Write a JSON file so a crash never leaves a half written checkpoint"""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(data, indent=2))
+    os.replace(tmp_path, path)
+
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+def extract_image(doc: dict, out_dir: Path) -> dict:
+    """Move an inline base64 data URI image of a post to its own file"""
+    match = DATA_URI_PATTERN.match(doc.get("image") or "")
+    if not match:
+        return doc
+
+    try:
+        image_bytes = base64.b64decode(match.group("data"), validate=False)
+    except (binascii.Error, ValueError):
+        return doc
+
+    mime = match.group("mime")
+    relative_path = f"images/{doc['post_id']}.{IMAGE_EXTENSIONS.get(mime, 'bin')}"
+    (out_dir / relative_path).write_bytes(image_bytes)
+
+    doc = dict(doc)
+    del doc["image"]
+    doc["image_file"] = relative_path
+    doc["image_mime"] = mime
+    return doc
+
+
+async def export_collection(db, name: str, out_dir: Path, checkpoint: dict, batch_size: int):
+    """Stream one collection to part files in _id order, resuming from the checkpoint"""
+    state = checkpoint.setdefault(name, {"last_id": None, "parts": 0, "count": 0, "done": False})
+    if state["done"]:
+        print(f"  {name}: already exported ({state['count']} documents)")
+        return
+
+    collection_dir = out_dir / name
+    collection_dir.mkdir(parents=True, exist_ok=True)
+
+    while True:
+        query = {}
+        if state["last_id"] is not None:
+            query["_id"] = {"$gt": json_util.loads(state["last_id"])}
+
+        batch = await db[name].find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        if name == "posts":
+            batch = [extract_image(doc, out_dir) for doc in batch]
+
+        part_path = collection_dir / f"part-{state['parts']:05d}.ndjson.gz"
+        tmp_path = part_path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for doc in batch:
+                f.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS))
+                f.write("\n")
+        os.replace(tmp_path, part_path)
+
+        state["last_id"] = json_util.dumps(batch[-1]["_id"])
+        state["parts"] += 1
+        state["count"] += len(batch)
+        write_json_atomic(out_dir / CHECKPOINT_FILE, checkpoint)
+        print(f"  {name}: {state['count']} documents")
+
+    state["done"] = True
+    write_json_atomic(out_dir / CHECKPOINT_FILE, checkpoint)
+
+
+async def export_uploaded_images(db, out_dir: Path) -> int:
+    """Write every GridFS post image to a file named by its SHA-256"""
+    images_dir = out_dir / UPLOADED_IMAGES_DIR
+    images_dir.mkdir(exist_ok=True)
+    bucket = AsyncIOMotorGridFSBucket(db, bucket_name=POST_IMAGE_BUCKET)
+
+    exported = 0
+    async for file_doc in db[f"{POST_IMAGE_BUCKET}.files"].find({"metadata.sha256": {"$exists": True}}):
+        path = images_dir / file_doc["metadata"]["sha256"]
+        if not path.exists():
+            grid_out = await bucket.open_download_stream(file_doc["_id"])
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                while chunk := await grid_out.readchunk():
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+            path.with_suffix(".json").write_text(json.dumps({
+                "filename": file_doc["filename"],
+                "content_type": file_doc["metadata"]["content_type"],
+            }))
+        exported += 1
+    return exported
+
+
+def clear_finished_export(out_dir: Path):
+    """Remove a complete earlier export so the next run starts from scratch
+
+    Without this, the `done` checkpoints of the old run would make a new
+    export skip every collection and ship the old data. The checkpoint goes
+    first and the manifest last, so a run interrupted here clears again.
+    The import checkpoint goes too: the new parts reuse the old file names.
+    """
+    checkpoint = read_json(out_dir / CHECKPOINT_FILE, {})
+    (out_dir / CHECKPOINT_FILE).unlink(missing_ok=True)
+    (out_dir / IMPORT_CHECKPOINT_FILE).unlink(missing_ok=True)
+    for name in [*checkpoint, "images", UPLOADED_IMAGES_DIR]:
+        shutil.rmtree(out_dir / name, ignore_errors=True)
+    (out_dir / MANIFEST_FILE).unlink()
+
+
+async def export_database(out_dir: Path, collections: list, batch_size: int):
+    if (out_dir / MANIFEST_FILE).exists():
+        print(f"Replacing the complete export in {out_dir}")
+        clear_finished_export(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "images").mkdir(exist_ok=True)
+    checkpoint = read_json(out_dir / CHECKPOINT_FILE, {})
+
+    client, db = get_database()
+    try:
+        for name in collections:
+            await export_collection(db, name, out_dir, checkpoint, batch_size)
+        uploaded_images = await export_uploaded_images(db, out_dir)
+    finally:
+        client.close()
+
+    write_json_atomic(out_dir / MANIFEST_FILE, {
+        "uploaded_images": uploaded_images,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "database": os.environ['DB_NAME'],
+        "collections": {
+            name: {"count": checkpoint[name]["count"], "parts": checkpoint[name]["parts"]}
+            for name in collections
+        },
+    })
+    print(f"Export complete: {out_dir}")
+
+
+# ============================================================================
+# IMPORT
+# ============================================================================
+
+def restore_image(doc: dict, src_dir: Path) -> dict:
+    """Inline an extracted image file back into the post as a data URI"""
+    relative_path = doc.pop("image_file", None)
+    mime = doc.pop("image_mime", None)
+    if relative_path:
+        encoded = base64.b64encode((src_dir / relative_path).read_bytes()).decode()
+        doc["image"] = f"data:{mime};base64,{encoded}"
+    return doc
+
+
+async def insert_batch(collection, batch: list) -> int:
+    """Unordered bulk insert that skips documents which already exist"""
+    try:
+        result = await collection.insert_many(batch, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+async def import_collection(db, name: str, src_dir: Path, targets: dict, checkpoint: dict, batch_size: int):
+    """Bulk insert every part file of a collection that was not imported yet
+
+    `checkpoint` is this target database's entry in `targets`, the whole
+    import checkpoint file.
+    """
+    done_parts = set(checkpoint.setdefault(name, []))
+    inserted = 0
+
+    for part_path in sorted((src_dir / name).glob("part-*.ndjson.gz")):
+        if part_path.name in done_parts:
+            continue
+
+        batch = []
+        with gzip.open(part_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                doc = json_util.loads(line)
+                if name == "posts":
+                    doc = restore_image(doc, src_dir)
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    inserted += await insert_batch(db[name], batch)
+                    batch = []
+        if batch:
+            inserted += await insert_batch(db[name], batch)
+
+        checkpoint[name].append(part_path.name)
+        write_json_atomic(src_dir / IMPORT_CHECKPOINT_FILE, targets)
+
+    print(f"  {name}: {inserted} documents inserted")
+
+
+async def import_uploaded_images(db, src_dir: Path) -> int:
+    """Upload exported GridFS images that the target database does not have"""
+    images_dir = src_dir / UPLOADED_IMAGES_DIR
+    if not images_dir.exists():
+        return 0
+
+    bucket = AsyncIOMotorGridFSBucket(db, bucket_name=POST_IMAGE_BUCKET)
+    files = db[f"{POST_IMAGE_BUCKET}.files"]
+    imported = 0
+    for info_path in sorted(images_dir.glob("*.json")):
+        sha256 = info_path.stem
+        if await files.find_one({"metadata.sha256": sha256}, {"_id": 1}):
+            continue
+        info = json.loads(info_path.read_text())
+        with open(images_dir / sha256, "rb") as f:
+            await bucket.upload_from_stream(
+                info["filename"],
+                f,
+                metadata={"content_type": info["content_type"], "sha256": sha256}
+            )
+        imported += 1
+    return imported
+
+
+async def import_database(src_dir: Path, collections: list, batch_size: int):
+    manifest = read_json(src_dir / MANIFEST_FILE, None)
+    if manifest is None:
+        raise SystemExit(f"No {MANIFEST_FILE} in {src_dir}, the export is incomplete")
+
+    # Parts already imported, per target database, so an interrupted import
+    # resumes and the same export can still be imported elsewhere
+    targets = read_json(src_dir / IMPORT_CHECKPOINT_FILE, {})
+    target = import_target()
+    checkpoint = targets.setdefault(target, {})
+    client, db = get_database()
+    try:
+        for name in collections:
+            if name in manifest["collections"]:
+                await import_collection(db, name, src_dir, targets, checkpoint, batch_size)
+        print(f"  {POST_IMAGE_BUCKET}: {await import_uploaded_images(db, src_dir)} images uploaded")
+    finally:
+        client.close()
+
+    # Finished, so importing again starts over (inserts skip existing documents)
+    del targets[target]
+    if targets:
+        write_json_atomic(src_dir / IMPORT_CHECKPOINT_FILE, targets)
+    else:
+        (src_dir / IMPORT_CHECKPOINT_FILE).unlink(missing_ok=True)
+    print("Import complete")
+
+
+# ============================================================================
+# ORPHAN CLEANUP
+# ============================================================================
+
+async def gc_orphans(dry_run: bool):
+    """Delete attempts and other data left behind by posts deleted earlier"""
+    client, db = get_database()
+    try:
+        orphaned = await find_orphaned_post_ids(db)
+        print(f"Found {len(orphaned)} deleted posts with leftover data")
+        if dry_run:
+            return
+        for post_id in sorted(orphaned):
+            deleted = await cascade_post_delete(db, post_id)
+            print(f"  {post_id}: {deleted}")
+    finally:
+        client.close()
+
+
+# ============================================================================
+# ARCHIVAL
+# ============================================================================
+
+async def archive_posts(older_than_days: int):
+    """Move posts older than the cutoff and their attempts to the archive"""
+    client, db = get_database()
+    try:
+        while True:
+            archived = await archive_old_posts(db, timedelta(days=older_than_days))
+            print(f"  archived {archived['posts']} posts, {archived['attempts']} attempts")
+            if archived["posts"] == 0:
+                break
+    finally:
+        client.close()
+
+
+# ============================================================================
+# PGN IMPORT
+# ============================================================================
+
+async def import_pgn_file(path: Path, batch_size: int):
+    """Stream a PGN file into the game archive"""
+    client, db = get_database()
+
+    async def read_text():
+        with open(path, encoding="utf-8", errors="replace") as f:
+            while True:
+                text = f.read(PGN_READ_SIZE)
+                if not text:
+                    break
+                yield text
+
+    try:
+        import_id = f"import_{uuid.uuid4().hex[:12]}"
+        summary = await import_pgn(
+            read_text(), db.games, extra={"import_id": import_id, "source": path.name}, batch_size=batch_size
+        )
+        print(f"{import_id}: imported {summary['imported']} games, rejected {summary['rejected']}")
+        for error in summary["errors"]:
+            print(f"  {error['white']} - {error['black']}: {error['error']}")
+    finally:
+        client.close()
+
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Warje Chess Club database tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export collections to compressed NDJSON")
+    export_parser.add_argument("--out", type=Path, required=True, help="Export directory")
+    export_parser.add_argument("--collections", nargs="+", default=EXPORT_COLLECTIONS)
+    export_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    import_parser = subparsers.add_parser("import", help="Import an export directory")
+    import_parser.add_argument("--src", type=Path, required=True, help="Export directory")
+    import_parser.add_argument("--collections", nargs="+", default=EXPORT_COLLECTIONS)
+    import_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    gc_parser = subparsers.add_parser("gc-orphans", help="Remove data of posts that no longer exist")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+
+    archive_parser = subparsers.add_parser("archive", help="Move old posts and attempts to the archive")
+    archive_parser.add_argument("--older-than-days", type=int, default=90)
+
+    pgn_parser = subparsers.add_parser("import-pgn", help="Import the games of a PGN file")
+    pgn_parser.add_argument("path", type=Path, help="PGN file")
+    pgn_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        asyncio.run(export_database(args.out, args.collections, args.batch_size))
+    elif args.command == "import":
+        asyncio.run(import_database(args.src, args.collections, args.batch_size))
+    elif args.command == "gc-orphans":
+        asyncio.run(gc_orphans(args.dry_run))
+    elif args.command == "archive":
+        asyncio.run(archive_posts(args.older_than_days))
+    elif args.command == "import-pgn":
+        asyncio.run(import_pgn_file(args.path, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,557 @@
+"""Bitboard legal move generator and SAN/LAN/UCI move notation
+
+Squares are numbered 0 (a1) to 63 (h8). Moves are packed into small ints:
+from | to << 6 | promotion << 12, with the promotion as a piece type index.
+"""
+import random
+import re
+from typing import Dict, List, Optional, Tuple
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+EMPTY = -1
+PIECE_LETTERS = "PNBRQK"
+FILES = "abcdefgh"
+
+CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ = 1, 2, 4, 8
+CASTLING_LETTERS = {"K": CASTLE_WK, "Q": CASTLE_WQ, "k": CASTLE_BK, "q": CASTLE_BQ}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+SAN_RE = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+UCI_RE = re.compile(r"^([a-h][1-8])([a-h][1-8])([nbrq])?$")
+
+# Fixed seed, so hashes stored in the database stay valid across restarts
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+
+
+def square_name(sq: int) -> str:
+    return FILES[sq & 7] + str((sq >> 3) + 1)
+
+
+def parse_square(name: str) -> int:
+    return FILES.index(name[0]) + 8 * (int(name[1]) - 1)
+
+
+def encode_move(from_sq: int, to_sq: int, promotion: int = 0) -> int:
+    return from_sq | to_sq << 6 | promotion << 12
+
+
+def decode_move(move: int) -> Tuple[int, int, int]:
+    return move & 63, (move >> 6) & 63, move >> 12
+
+
+def _step_table(steps) -> List[int]:
+    table = []
+    for sq in range(64):
+        rank, file = sq >> 3, sq & 7
+        bb = 0
+        for dr, df in steps:
+            r, f = rank + dr, file + df
+            if 0 <= r < 8 and 0 <= f < 8:
+                bb |= 1 << (r * 8 + f)
+        table.append(bb)
+    return table
+
+
+def _ray_table(dr: int, df: int) -> List[int]:
+    table = []
+    for sq in range(64):
+        r, f = (sq >> 3) + dr, (sq & 7) + df
+        bb = 0
+        while 0 <= r < 8 and 0 <= f < 8:
+            bb |= 1 << (r * 8 + f)
+            r, f = r + dr, f + df
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_ATTACKS = _step_table([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+# Squares attacked by a pawn of the given colour standing on each square
+PAWN_ATTACKS = (_step_table([(1, -1), (1, 1)]), _step_table([(-1, -1), (-1, 1)]))
+
+# Rays towards higher square numbers stop at their lowest blocker, the others at their highest
+ROOK_RAYS_UP = (_ray_table(1, 0), _ray_table(0, 1))
+ROOK_RAYS_DOWN = (_ray_table(-1, 0), _ray_table(0, -1))
+BISHOP_RAYS_UP = (_ray_table(1, 1), _ray_table(1, -1))
+BISHOP_RAYS_DOWN = (_ray_table(-1, -1), _ray_table(-1, 1))
+
+# Castling rights kept when a move starts or ends on each square
+CASTLING_KEEP = [15] * 64
+CASTLING_KEEP[0] &= ~CASTLE_WQ
+CASTLING_KEEP[7] &= ~CASTLE_WK
+CASTLING_KEEP[4] &= ~(CASTLE_WK | CASTLE_WQ)
+CASTLING_KEEP[56] &= ~CASTLE_BQ
+CASTLING_KEEP[63] &= ~CASTLE_BK
+CASTLING_KEEP[60] &= ~(CASTLE_BK | CASTLE_BQ)
+
+
+def _slide(sq: int, occupied: int, rays_up, rays_down) -> int:
+    attacks = 0
+    for rays in rays_up:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[((blockers & -blockers).bit_length() - 1)]
+        attacks |= ray
+    for rays in rays_down:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return _slide(sq, occupied, ROOK_RAYS_UP, ROOK_RAYS_DOWN)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return _slide(sq, occupied, BISHOP_RAYS_UP, BISHOP_RAYS_DOWN)
+
+
+def iter_squares(bb: int):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+class Position:
+    """Board state with one bitboard per colour and piece type
+
+    `board` mirrors the bitboards as a square -> piece lookup, where a piece
+    is colour * 6 + type and EMPTY marks an empty square.
+    """
+
+    __slots__ = ("bitboards", "colors", "board", "side", "castling", "ep", "halfmove", "fullmove")
+
+    def __init__(self, bitboards, colors, board, side, castling, ep, halfmove, fullmove):
+        self.bitboards = bitboards
+        self.colors = colors
+        self.board = board
+        self.side = side
+        self.castling = castling
+        self.ep = ep
+        self.halfmove = halfmove
+        self.fullmove = fullmove
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "Position":
+        """Position from a FEN already checked by boards.normalize_fen"""
+        placement, side, castling, ep, halfmove, fullmove = fen.split()
+        bitboards = [[0] * 6, [0] * 6]
+        colors = [0, 0]
+        board = [EMPTY] * 64
+        for rank_index, rank in enumerate(placement.split("/")):
+            file = 0
+            for char in rank:
+                if char.isdigit():
+                    file += int(char)
+                    continue
+                sq = (7 - rank_index) * 8 + file
+                color = WHITE if char.isupper() else BLACK
+                piece_type = PIECE_LETTERS.index(char.upper())
+                bitboards[color][piece_type] |= 1 << sq
+                colors[color] |= 1 << sq
+                board[sq] = color * 6 + piece_type
+                file += 1
+
+        rights = 0
+        for char in castling:
+            rights |= CASTLING_LETTERS.get(char, 0)
+        return cls(
+            bitboards, colors, board,
+            WHITE if side == "w" else BLACK,
+            rights,
+            None if ep == "-" else parse_square(ep),
+            int(halfmove), int(fullmove)
+        )
+
+    def fen(self) -> str:
+        ranks = []
+        for rank in range(7, -1, -1):
+            row, empty = "", 0
+            for file in range(8):
+                piece = self.board[rank * 8 + file]
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row, empty = row + str(empty), 0
+                letter = PIECE_LETTERS[piece % 6]
+                row += letter if piece < 6 else letter.lower()
+            ranks.append(row + (str(empty) if empty else ""))
+        castling = "".join(c for c, bit in CASTLING_LETTERS.items() if self.castling & bit) or "-"
+        return " ".join([
+            "/".join(ranks),
+            "w" if self.side == WHITE else "b",
+            castling,
+            square_name(self.ep) if self.ep is not None else "-",
+            str(self.halfmove),
+            str(self.fullmove),
+        ])
+
+    def is_attacked(self, sq: int, by: int) -> bool:
+        pieces = self.bitboards[by]
+        if KNIGHT_ATTACKS[sq] & pieces[KNIGHT]:
+            return True
+        if KING_ATTACKS[sq] & pieces[KING]:
+            return True
+        if PAWN_ATTACKS[by ^ 1][sq] & pieces[PAWN]:
+            return True
+        occupied = self.colors[0] | self.colors[1]
+        if bishop_attacks(sq, occupied) & (pieces[BISHOP] | pieces[QUEEN]):
+            return True
+        return bool(rook_attacks(sq, occupied) & (pieces[ROOK] | pieces[QUEEN]))
+
+    def king_square(self, color: int) -> int:
+        return self.bitboards[color][KING].bit_length() - 1
+
+    def in_check(self, color: Optional[int] = None) -> bool:
+        color = self.side if color is None else color
+        return self.is_attacked(self.king_square(color), color ^ 1)
+
+    def pseudo_legal_moves(self) -> List[int]:
+        side, them = self.side, self.side ^ 1
+        own, enemy = self.colors[side], self.colors[them]
+        occupied = own | enemy
+        pieces = self.bitboards[side]
+        moves = []
+
+        forward = 8 if side == WHITE else -8
+        start_rank, last_rank = (1, 7) if side == WHITE else (6, 0)
+        ep_bb = 1 << self.ep if self.ep is not None else 0
+        for sq in iter_squares(pieces[PAWN]):
+            targets = PAWN_ATTACKS[side][sq] & (enemy | ep_bb)
+            one = sq + forward
+            if not occupied >> one & 1:
+                targets |= 1 << one
+                if sq >> 3 == start_rank and not occupied >> (one + forward) & 1:
+                    targets |= 1 << (one + forward)
+            for to in iter_squares(targets):
+                if to >> 3 == last_rank:
+                    moves.extend(encode_move(sq, to, promotion) for promotion in (QUEEN, ROOK, BISHOP, KNIGHT))
+                else:
+                    moves.append(sq | to << 6)
+
+        for sq in iter_squares(pieces[KNIGHT]):
+            moves.extend(sq | to << 6 for to in iter_squares(KNIGHT_ATTACKS[sq] & ~own))
+        for sq in iter_squares(pieces[BISHOP] | pieces[QUEEN]):
+            moves.extend(sq | to << 6 for to in iter_squares(bishop_attacks(sq, occupied) & ~own))
+        for sq in iter_squares(pieces[ROOK] | pieces[QUEEN]):
+            moves.extend(sq | to << 6 for to in iter_squares(rook_attacks(sq, occupied) & ~own))
+
+        king = self.king_square(side)
+        moves.extend(king | to << 6 for to in iter_squares(KING_ATTACKS[king] & ~own))
+
+        # Castling, with the king's start, path and destination not attacked
+        base = 0 if side == WHITE else 56
+        kingside, queenside = (CASTLE_WK, CASTLE_WQ) if side == WHITE else (CASTLE_BK, CASTLE_BQ)
+        if king == base + 4 and self.castling & (kingside | queenside) and not self.is_attacked(king, them):
+            rooks = pieces[ROOK]
+            if (self.castling & kingside and rooks >> (base + 7) & 1
+                    and not occupied & (0b11 << (base + 5))
+                    and not self.is_attacked(base + 5, them) and not self.is_attacked(base + 6, them)):
+                moves.append(king | (base + 6) << 6)
+            if (self.castling & queenside and rooks >> base & 1
+                    and not occupied & (0b111 << (base + 1))
+                    and not self.is_attacked(base + 3, them) and not self.is_attacked(base + 2, them)):
+                moves.append(king | (base + 2) << 6)
+        return moves
+
+    def make_move(self, move: int) -> "Position":
+        """New position after a pseudo-legal move; this one is left unchanged"""
+        from_sq, to_sq, promotion = move & 63, (move >> 6) & 63, move >> 12
+        side, them = self.side, self.side ^ 1
+        bitboards = [self.bitboards[0][:], self.bitboards[1][:]]
+        colors = self.colors[:]
+        board = self.board[:]
+
+        piece_type = board[from_sq] % 6
+        captured = board[to_sq]
+        from_bb, to_bb = 1 << from_sq, 1 << to_sq
+
+        if captured != EMPTY:
+            bitboards[them][captured % 6] ^= to_bb
+            colors[them] ^= to_bb
+        elif piece_type == PAWN and to_sq == self.ep:
+            victim = to_sq - 8 if side == WHITE else to_sq + 8
+            bitboards[them][PAWN] ^= 1 << victim
+            colors[them] ^= 1 << victim
+            board[victim] = EMPTY
+
+        bitboards[side][piece_type] ^= from_bb
+        placed = promotion or piece_type
+        bitboards[side][placed] |= to_bb
+        colors[side] ^= from_bb | to_bb
+        board[from_sq] = EMPTY
+        board[to_sq] = side * 6 + placed
+
+        if piece_type == KING and abs(to_sq - from_sq) == 2:
+            rook_from, rook_to = (from_sq + 3, from_sq + 1) if to_sq > from_sq else (from_sq - 4, from_sq - 1)
+            rook_bb = 1 << rook_from | 1 << rook_to
+            bitboards[side][ROOK] ^= rook_bb
+            colors[side] ^= rook_bb
+            board[rook_from] = EMPTY
+            board[rook_to] = side * 6 + ROOK
+
+        ep = None
+        if piece_type == PAWN and abs(to_sq - from_sq) == 16:
+            ep = (from_sq + to_sq) // 2
+
+        return Position(
+            bitboards, colors, board, them,
+            self.castling & CASTLING_KEEP[from_sq] & CASTLING_KEEP[to_sq],
+            ep,
+            0 if piece_type == PAWN or captured != EMPTY else self.halfmove + 1,
+            self.fullmove + (side == BLACK)
+        )
+
+    def legal_moves(self) -> List[int]:
+        side = self.side
+        return [move for move in self.pseudo_legal_moves() if not self.make_move(move).in_check(side)]
+
+    def is_legal(self) -> bool:
+        """False when the side that just moved is left in check"""
+        return not self.in_check(self.side ^ 1)
+
+
+def zobrist_hash(position: Position) -> int:
+    """64-bit hash of the placement, side to move and castling rights
+
+    The en passant square is left out so a position typed in by hand matches
+    the same position reached in a game.
+    """
+    h = ZOBRIST_CASTLING[position.castling]
+    if position.side == BLACK:
+        h ^= ZOBRIST_BLACK_TO_MOVE
+    for color in (WHITE, BLACK):
+        for piece_type, bb in enumerate(position.bitboards[color]):
+            keys = ZOBRIST_PIECES[color * 6 + piece_type]
+            while bb:
+                low = bb & -bb
+                h ^= keys[low.bit_length() - 1]
+                bb ^= low
+    return h
+
+
+def zobrist_update(value: int, before: Position, after: Position, move: int) -> int:
+    """Hash of `after` from the hash of `before`, looking only at squares the move can change"""
+    from_sq, to_sq = move & 63, (move >> 6) & 63
+    # Origin, destination, an en passant victim and castling rook squares
+    touched = {from_sq, to_sq, to_sq ^ 8, from_sq + 1, from_sq - 1, from_sq + 3, from_sq - 4}
+    for square in touched:
+        if not 0 <= square < 64:
+            continue
+        old, new = before.board[square], after.board[square]
+        if old != new:
+            if old != EMPTY:
+                value ^= ZOBRIST_PIECES[old][square]
+            if new != EMPTY:
+                value ^= ZOBRIST_PIECES[new][square]
+    return value ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_CASTLING[before.castling] ^ ZOBRIST_CASTLING[after.castling]
+
+
+def resolve_san(position: Position, text: str) -> int:
+    """Legal move for strict SAN (or UCI) text, found from the destination square
+
+    Much cheaper than NotationIndex, which spells out every legal move;
+    meant for bulk replay of recorded games.
+    """
+    token = normalize_notation(text)
+    side = position.side
+    if token in ("O-O", "O-O-O"):
+        king = position.king_square(side)
+        move = king | (king + (2 if token == "O-O" else -2)) << 6
+        if move not in position.pseudo_legal_moves():
+            raise ValueError(f"Illegal castling '{text}'")
+        candidates = [move]
+    elif UCI_RE.match(token):
+        from_name, to_name, promotion = UCI_RE.match(token).groups()
+        move = encode_move(parse_square(from_name), parse_square(to_name),
+                           PIECE_LETTERS.index(promotion.upper()) if promotion else 0)
+        candidates = [move] if move in position.pseudo_legal_moves() else []
+    else:
+        match = SAN_RE.match(token)
+        if not match:
+            raise ValueError(f"Unreadable move '{text}'")
+        letter, from_file, from_rank, destination, promotion = match.groups()
+        to_sq = parse_square(destination)
+        if position.colors[side] >> to_sq & 1:
+            raise ValueError(f"Illegal move '{text}'")
+        piece_type = PIECE_LETTERS.index(letter) if letter else PAWN
+        pieces = position.bitboards[side][piece_type]
+        occupied = position.colors[0] | position.colors[1]
+
+        if piece_type == PAWN:
+            forward = 8 if side == WHITE else -8
+            if from_file and FILES.index(from_file) != to_sq & 7:
+                if not (position.colors[side ^ 1] >> to_sq & 1 or to_sq == position.ep):
+                    raise ValueError(f"Illegal move '{text}'")
+                sources = PAWN_ATTACKS[side ^ 1][to_sq] & pieces
+            elif occupied >> to_sq & 1:
+                sources = 0
+            elif pieces >> (to_sq - forward) & 1:
+                sources = 1 << (to_sq - forward)
+            else:
+                double_from = to_sq - 2 * forward
+                start_rank = 1 if side == WHITE else 6
+                sources = 0
+                if (0 <= double_from < 64 and double_from >> 3 == start_rank and pieces >> double_from & 1
+                        and not occupied >> (to_sq - forward) & 1):
+                    sources = 1 << double_from
+            last_rank = 7 if side == WHITE else 0
+            if (to_sq >> 3 == last_rank) != bool(promotion):
+                raise ValueError(f"Illegal move '{text}'")
+        elif piece_type == KNIGHT:
+            sources = KNIGHT_ATTACKS[to_sq] & pieces
+        elif piece_type == BISHOP:
+            sources = bishop_attacks(to_sq, occupied) & pieces
+        elif piece_type == ROOK:
+            sources = rook_attacks(to_sq, occupied) & pieces
+        elif piece_type == QUEEN:
+            sources = (bishop_attacks(to_sq, occupied) | rook_attacks(to_sq, occupied)) & pieces
+        else:
+            sources = KING_ATTACKS[to_sq] & pieces
+
+        promotion_type = PIECE_LETTERS.index(promotion) if promotion else 0
+        candidates = [
+            encode_move(from_sq, to_sq, promotion_type)
+            for from_sq in iter_squares(sources)
+            if (not from_file or FILES[from_sq & 7] == from_file)
+            and (not from_rank or str((from_sq >> 3) + 1) == from_rank)
+        ]
+
+    legal = [move for move in candidates if not position.make_move(move).in_check(side)]
+    if len(legal) != 1:
+        raise ValueError(f"{'Ambiguous' if legal else 'Illegal'} move '{text}'")
+    return legal[0]
+
+
+def replay(fen: str, moves: List[int]) -> Position:
+    """Position reached by playing packed legal moves from a FEN"""
+    position = Position.from_fen(fen)
+    for move in moves:
+        position = position.make_move(move)
+    return position
+
+
+def perft(position: Position, depth: int) -> int:
+    """Number of leaf nodes of the legal move tree, for checking the generator"""
+    if depth == 0:
+        return 1
+    side = position.side
+    nodes = 0
+    for move in position.pseudo_legal_moves():
+        child = position.make_move(move)
+        if child.in_check(side):
+            continue
+        nodes += 1 if depth == 1 else perft(child, depth - 1)
+    return nodes
+
+
+def uci(move: int) -> str:
+    from_sq, to_sq, promotion = decode_move(move)
+    return square_name(from_sq) + square_name(to_sq) + (PIECE_LETTERS[promotion].lower() if promotion else "")
+
+
+def san(position: Position, move: int, legal: Optional[List[int]] = None) -> str:
+    """Standard algebraic notation of a legal move, with check and mate marks"""
+    legal = position.legal_moves() if legal is None else legal
+    from_sq, to_sq, promotion = decode_move(move)
+    piece_type = position.board[from_sq] % 6
+
+    if piece_type == KING and abs(to_sq - from_sq) == 2:
+        text = "O-O" if to_sq > from_sq else "O-O-O"
+    else:
+        capture = position.board[to_sq] != EMPTY or (piece_type == PAWN and to_sq == position.ep)
+        if piece_type == PAWN:
+            text = (FILES[from_sq & 7] + "x" if capture else "") + square_name(to_sq)
+            if promotion:
+                text += "=" + PIECE_LETTERS[promotion]
+        else:
+            rivals = [
+                other & 63 for other in legal
+                if (other >> 6) & 63 == to_sq and other & 63 != from_sq
+                and position.board[other & 63] % 6 == piece_type
+            ]
+            disambiguation = ""
+            if rivals:
+                if all(sq & 7 != from_sq & 7 for sq in rivals):
+                    disambiguation = FILES[from_sq & 7]
+                elif all(sq >> 3 != from_sq >> 3 for sq in rivals):
+                    disambiguation = str((from_sq >> 3) + 1)
+                else:
+                    disambiguation = square_name(from_sq)
+            text = PIECE_LETTERS[piece_type] + disambiguation + ("x" if capture else "") + square_name(to_sq)
+
+    after = position.make_move(move)
+    if after.in_check():
+        text += "#" if not after.legal_moves() else "+"
+    return text
+
+
+def normalize_notation(text: str) -> str:
+    """Drop annotations and spacing users add around a move"""
+    text = "".join(text.split()).rstrip("+#!?")
+    if text.endswith("e.p."):
+        text = text[:-4]
+    return text.replace("0-0-0", "O-O-O").replace("0-0", "O-O")
+
+
+def notations(position: Position, move: int, legal: List[int]) -> set:
+    """Every accepted spelling of a move: SAN and its common variants, LAN and UCI"""
+    from_sq, to_sq, promotion = decode_move(move)
+    core = normalize_notation(san(position, move, legal))
+    forms = {core, core.replace("x", ""), uci(move)}
+    if promotion:
+        forms |= {form.replace("=", "") for form in forms}
+
+    if not core.startswith("O-O"):
+        piece_type = position.board[from_sq] % 6
+        letter = "" if piece_type == PAWN else PIECE_LETTERS[piece_type]
+        capture = "x" if "x" in core else "-"
+        suffix = "=" + PIECE_LETTERS[promotion] if promotion else ""
+        for separator in {"-", capture, ""}:
+            forms.add(letter + square_name(from_sq) + separator + square_name(to_sq) + suffix)
+        if promotion:
+            forms |= {form.replace("=", "") for form in forms}
+    return forms
+
+
+class NotationIndex:
+    """Lookup from any accepted spelling to the legal move it names
+
+    Exact spellings always win. Case-folded spellings ("nf3") are only
+    accepted when they name a single move, so "bxc3" never means Bxc3 when a
+    pawn capture on c3 is also legal.
+    """
+
+    def __init__(self, position: Position):
+        self.position = position
+        self.legal = position.legal_moves()
+        self.exact: Dict[str, int] = {}
+        self.folded: Dict[str, set] = {}
+        for move in self.legal:
+            for form in notations(position, move, self.legal):
+                self.exact[form] = move
+                self.folded.setdefault(form.lower(), set()).add(move)
+
+    def lookup(self, text: str) -> Optional[int]:
+        key = normalize_notation(text)
+        if key in self.exact:
+            return self.exact[key]
+        moves = self.folded.get(key.lower(), ())
+        return next(iter(moves)) if len(moves) == 1 else None
+
+    def spellings(self, move: int) -> Tuple[List[str], List[str]]:
+        """Exact and unambiguous case-folded spellings of one move"""
+        exact = sorted(form for form, named in self.exact.items() if named == move)
+        folded = sorted(form for form, moves in self.folded.items() if moves == {move})
+        return exact, folded
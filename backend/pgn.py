@@ -0,0 +1,264 @@
+"""Streaming PGN import into compact game documents
+
+Games are split out of the text as it arrives, so an upload of any size is
+never held in memory at once. Moves are stored in the 16 bit packed form
+used by movegen (two bytes a ply instead of a SAN string), and every game
+lists the Zobrist hashes of the positions it passed through, which a
+multikey index turns into a "games containing this position" lookup.
+"""
+import asyncio
+import re
+import sys
+import uuid
+from array import array
+from datetime import datetime, timezone
+from typing import AsyncIterable, Iterator, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from boards import normalize_fen
+from movegen import (
+    BLACK, CASTLE_BK, CASTLE_BQ, CASTLE_WK, CASTLE_WQ, KING, ROOK, START_FEN, WHITE,
+    Position, resolve_san, zobrist_hash, zobrist_update,
+)
+
+TAG_RE = re.compile(r'^\s*\[(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]\s*$')
+# Comments, variations and NAGs are matched so they can be skipped;
+# only the last group (a move) is kept
+MOVETEXT_RE = re.compile(
+    r"\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|\d+\.(?:\.\.)?|(1-0|0-1|1/2-1/2|\*)|([^\s{}();.$]+)"
+)
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+# Stored as top level fields; any other tag goes into `tags`
+HEADER_FIELDS = ("Event", "Site", "Date", "Round", "White", "Black", "Result", "ECO")
+
+IMPORT_BATCH_SIZE = 500
+
+# Castling right -> (king square, rook square, colour) it needs on the board
+CASTLING_SQUARES = {
+    CASTLE_WK: (4, 7, WHITE),
+    CASTLE_WQ: (4, 0, WHITE),
+    CASTLE_BK: (60, 63, BLACK),
+    CASTLE_BQ: (60, 56, BLACK),
+}
+
+
+class PgnSplitter:
+    """Cut a stream of PGN text into the text of single games
+
+    A game ends where a tag line follows movetext, or at the end of the stream.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._lines: List[str] = []
+        self._in_movetext = False
+
+    def feed(self, text: str) -> Iterator[str]:
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            yield from self._add(line)
+
+    def close(self) -> Iterator[str]:
+        if self._partial:
+            yield from self._add(self._partial)
+            self._partial = ""
+        if any(line.strip() for line in self._lines):
+            yield "\n".join(self._lines)
+        self._lines = []
+        self._in_movetext = False
+
+    def _add(self, line: str) -> Iterator[str]:
+        stripped = line.strip()
+        if stripped.startswith("["):
+            if self._in_movetext:
+                yield "\n".join(self._lines)
+                self._lines = []
+                self._in_movetext = False
+        elif stripped and not stripped.startswith("%"):
+            self._in_movetext = True
+        self._lines.append(line.rstrip("\r"))
+
+
+def parse_game(text: str) -> Tuple[dict, List[str], Optional[str]]:
+    """Tags, main line move tokens and the result token of one game"""
+    headers = {}
+    movetext = []
+    for line in text.split("\n"):
+        match = TAG_RE.match(line)
+        if match:
+            headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+        elif not line.startswith("%"):
+            movetext.append(line)
+
+    tokens = []
+    result = None
+    depth = 0
+    for match in MOVETEXT_RE.finditer("\n".join(movetext)):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(depth - 1, 0)
+        elif depth:
+            continue
+        elif match.group(1):
+            result = token
+        elif match.group(2):
+            tokens.append(token.rstrip("!?"))
+    return headers, tokens, result
+
+
+def signed_hash(value: int) -> int:
+    """Zobrist hash as a signed 64 bit integer, the widest type BSON stores"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def search_hashes(fen: str) -> List[int]:
+    """Signed hashes of every position a search FEN stands for; raises ValueError
+
+    Side to move and castling rights are part of the stored hashes. When the
+    FEN leaves them out, every side and every castling combination the
+    placement allows is searched.
+    """
+    given = len(fen.split())
+    position = Position.from_fen(normalize_fen(fen))
+    sides = [position.side] if given >= 2 else [WHITE, BLACK]
+    if given >= 3:
+        castling_options = [position.castling]
+    else:
+        possible = 0
+        for right, (king_sq, rook_sq, color) in CASTLING_SQUARES.items():
+            if position.board[king_sq] == color * 6 + KING and position.board[rook_sq] == color * 6 + ROOK:
+                possible |= right
+        castling_options = [rights for rights in range(16) if not rights & ~possible]
+
+    hashes = []
+    for side in sides:
+        for rights in castling_options:
+            position.side, position.castling = side, rights
+            hashes.append(signed_hash(zobrist_hash(position)))
+    return hashes
+
+
+def game_document(text: str) -> dict:
+    """Replay one game and build its database document; raises ValueError"""
+    headers, tokens, result = parse_game(text)
+    if not tokens and not headers:
+        raise ValueError("Empty game")
+
+    fen = START_FEN
+    if headers.get("FEN"):
+        fen = normalize_fen(headers["FEN"])
+    position = Position.from_fen(fen)
+
+    moves = array("H")
+    position_hash = zobrist_hash(position)
+    hashes = {signed_hash(position_hash)}
+    for ply, token in enumerate(tokens, start=1):
+        try:
+            move = resolve_san(position, token)
+        except ValueError as e:
+            raise ValueError(f"Ply {ply}: {e}")
+        moves.append(move)
+        after = position.make_move(move)
+        position_hash = zobrist_update(position_hash, position, after, move)
+        hashes.add(signed_hash(position_hash))
+        position = after
+    if sys.byteorder == "big":
+        moves.byteswap()  # stored little endian
+
+    doc = {
+        "game_id": f"game_{uuid.uuid4().hex[:12]}",
+        "moves": moves.tobytes(),
+        "ply_count": len(moves),
+        "positions": sorted(hashes),
+    }
+    tags = {k: v for k, v in headers.items() if k not in HEADER_FIELDS and k not in ("FEN", "SetUp")}
+    if tags:
+        doc["tags"] = tags
+    for field in HEADER_FIELDS:
+        if field in headers:
+            doc[field.lower()] = headers[field]
+    doc["result"] = result if result in RESULTS else headers.get("Result", "*")
+    if fen != START_FEN:
+        doc["fen"] = fen
+    return doc
+
+
+def decode_moves(data: bytes) -> List[int]:
+    """Packed moves back into movegen integers"""
+    moves = array("H")
+    moves.frombytes(data)
+    if sys.byteorder == "big":
+        moves.byteswap()
+    return moves.tolist()
+
+
+def build_documents(texts: List[str]) -> Tuple[List[dict], List[dict]]:
+    """Documents for a batch of games, plus one error entry per rejected game"""
+    docs = []
+    errors = []
+    for text in texts:
+        try:
+            docs.append(game_document(text))
+        except ValueError as e:
+            headers = parse_game(text)[0]
+            errors.append({
+                "white": headers.get("White"),
+                "black": headers.get("Black"),
+                "error": str(e),
+            })
+    return docs, errors
+
+
+async def import_pgn(chunks: AsyncIterable[str], collection, extra: Optional[dict] = None,
+                     batch_size: int = IMPORT_BATCH_SIZE, max_errors: int = 50) -> dict:
+    """Parse a PGN stream and insert its games in batches
+
+    Parsing is CPU bound, so each batch is replayed in a worker thread while
+    the event loop stays free; the previous batch's insert overlaps with it.
+    `extra` fields (uploader, source) are added to every document.
+    """
+    splitter = PgnSplitter()
+    summary = {"imported": 0, "rejected": 0, "errors": []}
+    pending_insert = None
+
+    async def insert(docs: List[dict]):
+        try:
+            await collection.insert_many(docs, ordered=False)
+            summary["imported"] += len(docs)
+        except BulkWriteError as e:
+            summary["imported"] += e.details.get("nInserted", 0)
+            summary["rejected"] += len(e.details.get("writeErrors", []))
+
+    async def flush(texts: List[str]):
+        nonlocal pending_insert
+        docs, errors = await asyncio.to_thread(build_documents, texts)
+        summary["rejected"] += len(errors)
+        room = max_errors - len(summary["errors"])
+        summary["errors"].extend(errors[:max(room, 0)])
+        if pending_insert:
+            await pending_insert
+            pending_insert = None
+        if docs:
+            now = datetime.now(timezone.utc)
+            for doc in docs:
+                doc.update(extra or {})
+                doc["created_at"] = now
+            pending_insert = asyncio.ensure_future(insert(docs))
+
+    batch = []
+    async for chunk in chunks:
+        for text in splitter.feed(chunk):
+            batch.append(text)
+            if len(batch) >= batch_size:
+                await flush(batch)
+                batch = []
+    batch.extend(splitter.close())
+    if batch:
+        await flush(batch)
+    if pending_insert:
+        await pending_insert
+    return summary
@@ -0,0 +1,91 @@
+"""In-process rate limiting and load shedding, decided before any database work"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by (route, client), refilled continuously
+
+    Buckets are kept in an LRU bounded by `max_keys`. A bucket dropped from
+    it was idle long enough to be full again, so eviction only forgets
+    clients that are not currently limited.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = {}
+        self.limited = {}
+
+    def take(self, route: str, client: bytes, rate: float, burst: int) -> Tuple[bool, float]:
+        """Spend one token; returns (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        key = (route, client)
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            counters = self.allowed if allowed else self.limited
+            counters[route] = counters.get(route, 0) + 1
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "max_buckets": self.max_keys,
+                "allowed": dict(self.allowed),
+                "limited": dict(self.limited),
+            }
+
+
+class AdmissionControl:
+    """Caps concurrent requests and sheds load while the Mongo pool is backed up
+
+    `enter` is called with the current pool waiters and recent checkout
+    wait; it either admits the request (pair it with `leave`) or returns
+    why it was shed. Only used from the event loop, so no lock is needed.
+    """
+
+    def __init__(self, max_in_flight: int, max_pool_waiters: int, max_pool_wait_ms: float):
+        self.max_in_flight = max_in_flight
+        self.max_pool_waiters = max_pool_waiters
+        self.max_pool_wait_ms = max_pool_wait_ms
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.shed = {}
+
+    def enter(self, pool_waiters: int, pool_wait_ms: float) -> Optional[str]:
+        if self.in_flight >= self.max_in_flight:
+            reason = "in_flight"
+        elif pool_waiters > self.max_pool_waiters:
+            reason = "pool_waiters"
+        elif pool_wait_ms > self.max_pool_wait_ms:
+            reason = "pool_wait"
+        else:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return None
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        return reason
+
+    def leave(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_in_flight": self.max_in_flight,
+            "max_pool_waiters": self.max_pool_waiters,
+            "max_pool_wait_ms": self.max_pool_wait_ms,
+            "shed": dict(self.shed),
+        }
@@ -1,25 +1,202 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Response, Request, Cookie
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ReadPreference, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import DuplicateKeyError, ExecutionTimeout, ServerSelectionTimeoutError, WaitQueueTimeoutError
 import os
+import re
+import asyncio
+import json
+import time
+import base64
+import codecs
+import math
+import hashlib
 import logging
+import threading
+from collections import Counter
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, time as dt_time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import httpx
-from exponent_server_sdk import PushClient, PushMessage, PushServerError
+from exponent_server_sdk import PushClient, PushMessage, PushTicket
+
+from log_config import request_id_var, setup_logging
+from session_filter import CountingBloomFilter, NegativeCache, token_hash
+from ratelimit import AdmissionControl, TokenBucketLimiter
+from audit import AuditLog
+from cleanup import cascade_post_delete, delete_image_if_unreferenced
+from uploads import POST_IMAGE_BUCKET, stream_image_upload
+from archive import archive_old_posts
+from boards import ORIENTATIONS, PNG_SQUARE_SIZES, BoardImageCache, board_id, normalize_fen, render_png, render_svg
+from movegen import START_FEN, NotationIndex, Position, normalize_notation, replay, san, uci
+from pgn import decode_moves, import_pgn, search_hashes
+from swiss import RESULT_POINTS, PairingError, SwissPlayer, apply_round, pair_round
+from changes import CHANGE_RETENTION, current_sequence, oldest_sequence, read_changes, record_change
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# ============================================================================
+# MONGODB CONFIGURATION
+# ============================================================================
+
+# Pool sizes and timeouts are per worker process. Defaults fail fast instead of
+# letting a request hang on an unreachable or saturated server.
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "60000")),
+    "waitQueueTimeoutMS": int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+    "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "10000")),
+}
+
+# Server-side limit for individual read queries (maxTimeMS)
+MONGO_QUERY_TIMEOUT_MS = int(os.environ.get("MONGO_QUERY_TIMEOUT_MS", "5000"))
+
+READ_PREFERENCE_MODES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Read-heavy routes that tolerate slightly stale data can be sent to secondaries
+ROUTE_READ_PREFERENCES = {
+    "get_posts": os.environ.get("MONGO_READ_PREF_POSTS", "secondaryPreferred"),
+    "get_all_members": os.environ.get("MONGO_READ_PREF_MEMBERS", "secondaryPreferred"),
+}
+
+for _route, _mode in ROUTE_READ_PREFERENCES.items():
+    if _mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Invalid read preference '{_mode}' for route '{_route}'")
+
+
+# Weight of the newest checkout in the recent pool wait average, which also
+# halves every POOL_WAIT_HALF_LIFE seconds so it recovers once traffic is shed
+POOL_WAIT_SMOOTHING = 0.1
+POOL_WAIT_HALF_LIFE = 1.0
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool checkout wait times for diagnostics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.checkout_failures = {}
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.in_use = 0
+        self.open_connections = 0
+        self.pools_cleared = 0
+        # Checkouts currently queued, and a moving average of recent waits
+        # that admission control compares with its threshold
+        self.waiting = 0
+        self._recent_wait_ms = 0.0
+        self._recent_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "in_use": self.in_use,
+                "open_connections": self.open_connections,
+                "pools_cleared": self.pools_cleared,
+                "waiting": self.waiting,
+                "recent_wait_ms": round(self._decayed_wait_ms(), 3),
+            }
+
+    def _decayed_wait_ms(self) -> float:
+        elapsed = time.monotonic() - self._recent_at
+        return self._recent_wait_ms * 0.5 ** (elapsed / POOL_WAIT_HALF_LIFE)
+
+    def pressure(self) -> tuple:
+        """(queued checkouts, recent average wait in ms), cheap enough for every request"""
+        with self._lock:
+            return self.waiting, self._decayed_wait_ms()
+
+    # Checkout start and finish are reported on the same thread, so the start
+    # time is kept thread-locally.
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        wait_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.waiting = max(0, self.waiting - 1)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            recent = self._decayed_wait_ms()
+            self._recent_wait_ms = recent + (wait_ms - recent) * POOL_WAIT_SMOOTHING
+            self._recent_at = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            reason = str(event.reason)
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+pool_stats = PoolStatsListener()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_stats], **MONGO_CLIENT_OPTIONS)
 db = client[os.environ['DB_NAME']]
+image_bucket = AsyncIOMotorGridFSBucket(db, bucket_name=POST_IMAGE_BUCKET)
+
+
+def collection_for(route: str, name: str):
+    """Get a collection handle using the read preference configured for a route"""
+    mode = ROUTE_READ_PREFERENCES.get(route, "primary")
+    return db.get_collection(name, read_preference=READ_PREFERENCE_MODES[mode])
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -51,22 +228,42 @@ class Post(BaseModel):
     post_id: str
     title: str
     content: str
-    image: Optional[str] = None  # base64 encoded image
+    image: Optional[str] = None  # base64 encoded image (legacy uploads)
+    image_id: Optional[str] = None  # uploaded image, served from /api/images/{image_id}
+    fen: Optional[str] = None  # puzzle position, rendered at /api/boards/{board_id}.png|svg
+    orientation: Optional[str] = None  # "white" or "black" at the bottom
+    board_id: Optional[str] = None
     is_puzzle: bool = False
     puzzle_answer: Optional[str] = None  # Correct move in chess notation
+    line_moves: Optional[int] = None  # moves the solver plays in a multi-move puzzle
     success_message: Optional[str] = None
     failure_message: Optional[str] = None
     created_by: str  # user_id of the owner
-    created_at: datetime
+    created_at: datetime  # publication time for scheduled posts
+    publish_at: Optional[datetime] = None
+    published: bool = True
 
 class PostCreate(BaseModel):
     title: str
     content: str
     image: Optional[str] = None
+    image_id: Optional[str] = None  # from POST /api/posts/images
+    fen: Optional[str] = None  # full FEN or just the piece placement
+    side_to_move: Optional[str] = None  # "w" or "b", overrides the FEN
+    orientation: Optional[str] = None  # defaults to the side to move
     is_puzzle: bool = False
     puzzle_answer: Optional[str] = None
+    puzzle_line: Optional[List[str]] = None  # solver move, reply, solver move, ... (needs a FEN)
     success_message: Optional[str] = None
     failure_message: Optional[str] = None
+    publish_at: Optional[datetime] = None  # hidden until then, null publishes now
+
+    @field_validator("publish_at")
+    @classmethod
+    def validate_publish_at(cls, value):
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
 
 class PuzzleAttempt(BaseModel):
     attempt_id: str
@@ -75,6 +272,7 @@ class PuzzleAttempt(BaseModel):
     answer: str
     is_correct: bool
     attempt_number: int  # 1 or 2
+    ply: int = 0  # moves of the solution line played before this answer
     created_at: datetime
 
 class PuzzleSubmission(BaseModel):
@@ -88,39 +286,685 @@ class SessionData(BaseModel):
     picture: str
     session_token: str
 
+class ClubHours(BaseModel):
+    day: int  # 0 = Monday ... 6 = Sunday
+    opens: str  # "HH:MM" in the club's timezone
+    closes: str
+
+    @field_validator("day")
+    @classmethod
+    def validate_day(cls, value):
+        if not 0 <= value <= 6:
+            raise ValueError("day must be between 0 (Monday) and 6 (Sunday)")
+        return value
+
+    @field_validator("opens", "closes")
+    @classmethod
+    def validate_time(cls, value):
+        # Any ISO form ("1800", "18:00:00") is stored as HH:MM
+        parsed = dt_time.fromisoformat(value)
+        if parsed.second or parsed.microsecond or parsed.tzinfo:
+            raise ValueError("time must be HH:MM")
+        return parsed.strftime("%H:%M")
+
+class ClubInfoUpdate(BaseModel):
+    name: Optional[str] = None
+    timings: Optional[str] = None  # human readable summary shown in the app
+    timezone: Optional[str] = None
+    schedule: Optional[List[ClubHours]] = None
+    is_open_override: Optional[bool] = None  # force open/closed, null follows the schedule
+
+    @field_validator("name", "timezone")
+    @classmethod
+    def validate_not_null(cls, value):
+        # Only an explicit null reaches this, omitted fields keep their default
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+class TournamentCreate(BaseModel):
+    name: str
+    rounds: int
+    starts_at: Optional[datetime] = None
+
+    @field_validator("rounds")
+    @classmethod
+    def validate_rounds(cls, value):
+        if not 1 <= value <= 20:
+            raise ValueError("rounds must be between 1 and 20")
+        return value
+
+class TournamentRegistration(BaseModel):
+    rating: Optional[int] = None
+    user_id: Optional[str] = None  # owners may register another member
+
+class GameResult(BaseModel):
+    result: str  # "1-0", "0-1" or "1/2-1/2"
+
+    @field_validator("result")
+    @classmethod
+    def validate_result(cls, value):
+        if value not in RESULT_POINTS:
+            raise ValueError("result must be '1-0', '0-1' or '1/2-1/2'")
+        return value
+
 class PushTokenRequest(BaseModel):
     push_token: str
+    platform: Optional[str] = None  # "ios", "android" or "web"
+
+# ============================================================================
+# PAGINATION HELPERS
+# ============================================================================
+
+def encode_cursor(doc: dict, id_field: str) -> str:
+    """Encode the (created_at, id) sort key of the last document on a page"""
+    created_at = doc["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps({"c": created_at, "u": doc[id_field]})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str, id_field: str) -> dict:
+    """Decode a cursor into a keyset filter for the next page, newest first"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = datetime.fromisoformat(raw["c"])
+        last_id = raw["u"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, id_field: {"$lt": last_id}},
+    ]}
 
 # ============================================================================
 # NOTIFICATION HELPER
 # ============================================================================
 
+# Expo accepts up to 100 messages per request and keeps receipts for a day
+PUSH_PUBLISH_BATCH_SIZE = 100
+PUSH_RECEIPT_BATCH_SIZE = 1000
+PUSH_RECEIPT_DELAY = timedelta(minutes=int(os.environ.get("PUSH_RECEIPT_DELAY_MINUTES", "15")))
+PUSH_RECEIPT_POLL_SECONDS = int(os.environ.get("PUSH_RECEIPT_POLL_SECONDS", "60"))
+PUSH_RECEIPT_RETENTION = timedelta(days=1)
+
+# Process-wide delivery counters, reported by the push diagnostics endpoint
+push_stats = {"sent": 0, "delivered": 0, "failed": 0, "pruned": 0}
+
+def is_device_not_registered(response) -> bool:
+    """Whether a push ticket or receipt says the app was uninstalled"""
+    return bool(response.details) and response.details.get("error") == PushTicket.ERROR_DEVICE_NOT_REGISTERED
+
+async def prune_push_tokens(tokens: List[str]) -> int:
+    """Delete tokens of devices that no longer accept notifications"""
+    if not tokens:
+        return 0
+    result = await db.push_tokens.delete_many({"token": {"$in": tokens}})
+    push_stats["pruned"] += result.deleted_count
+    return result.deleted_count
+
 async def send_push_notification(tokens: List[str], title: str, body: str, data: dict = None):
-    """Send push notifications to multiple devices"""
+    """Send push notifications to multiple devices
+    Tickets are stored so their receipts can be polled later.
+    """
     successful = 0
     failed = 0
+    errors = Counter()  # logged once per fan-out rather than per token or batch
+    dead_tokens = []
+    pending_receipts = []
+    push_client = PushClient()
+    now = datetime.now(timezone.utc)
     
-    for token in tokens:
+    # The SDK rejects a whole request over one malformed token, so those
+    # are left out and pruned rather than sent
+    invalid_tokens = [token for token in tokens if not PushClient.is_exponent_push_token(token)]
+    if invalid_tokens:
+        errors["InvalidPushToken"] += len(invalid_tokens)
+        failed += len(invalid_tokens)
+        dead_tokens.extend(invalid_tokens)
+    
+    messages = [
+        PushMessage(to=token, title=title, body=body, sound="default", data=data or {})
+        for token in tokens if PushClient.is_exponent_push_token(token)
+    ]
+    
+    for start in range(0, len(messages), PUSH_PUBLISH_BATCH_SIZE):
+        batch = messages[start:start + PUSH_PUBLISH_BATCH_SIZE]
         try:
-            PushClient().publish(
-                PushMessage(
-                    to=token,
-                    title=title,
-                    body=body,
-                    sound="default",
-                    data=data or {}
-                )
-            )
-            successful += 1
-        except PushServerError as e:
-            logger.error(f"Failed to send notification to {token}: {e}")
-            failed += 1
-        except Exception as e:
-            logger.error(f"Unexpected error sending notification: {e}")
-            failed += 1
+            # The SDK is synchronous, keep it off the event loop
+            tickets = await asyncio.to_thread(push_client.publish_multiple, batch)
+        except Exception:
+            # Retry one message at a time so a single bad message only fails itself
+            tickets = []
+            for message in batch:
+                try:
+                    tickets.extend(await asyncio.to_thread(push_client.publish_multiple, [message]))
+                except Exception as e:
+                    errors[type(e).__name__] += 1
+                    failed += 1
+        
+        for ticket in tickets:
+            if ticket.is_success():
+                successful += 1
+                if ticket.id:
+                    pending_receipts.append({
+                        "ticket_id": ticket.id,
+                        "token": ticket.push_message.to,
+                        "created_at": now,
+                        "check_after": now + PUSH_RECEIPT_DELAY,
+                    })
+            else:
+                failed += 1
+                errors[(ticket.details or {}).get("error") or ticket.message or "unknown"] += 1
+                if is_device_not_registered(ticket):
+                    dead_tokens.append(ticket.push_message.to)
+    
+    if pending_receipts:
+        await db.push_receipts.insert_many(pending_receipts, ordered=False)
+    await prune_push_tokens(dead_tokens)
+    
+    if errors:
+        logger.warning(
+            "Push fan-out had failures",
+            extra={"sent": successful, "failed": failed, "errors": dict(errors)}
+        )
     
+    push_stats["sent"] += successful
+    push_stats["failed"] += failed
     return {"successful": successful, "failed": failed}
 
+async def check_push_receipts() -> int:
+    """Poll one batch of due receipts and prune tokens of uninstalled apps"""
+    due = await db.push_receipts.find(
+        {"check_after": {"$lte": datetime.now(timezone.utc)}},
+        {"_id": 0, "ticket_id": 1, "token": 1}
+    ).sort("check_after", 1).to_list(PUSH_RECEIPT_BATCH_SIZE)
+    
+    if not due:
+        return 0
+    
+    token_by_ticket = {doc["ticket_id"]: doc["token"] for doc in due}
+    tickets = [
+        PushTicket(push_message=None, status=PushTicket.SUCCESS_STATUS, message="", details=None, id=ticket_id)
+        for ticket_id in token_by_ticket
+    ]
+    receipts = await asyncio.to_thread(PushClient().check_receipts_multiple, tickets)
+    
+    dead_tokens = []
+    for receipt in receipts:
+        if receipt.is_success():
+            push_stats["delivered"] += 1
+        else:
+            push_stats["failed"] += 1
+            if is_device_not_registered(receipt) and receipt.id in token_by_ticket:
+                dead_tokens.append(token_by_ticket[receipt.id])
+    
+    await prune_push_tokens(dead_tokens)
+    
+    checked = {r.id for r in receipts}
+    await db.push_receipts.delete_many({"ticket_id": {"$in": list(checked)}})
+    
+    # Receipts that are not ready yet are retried later until they expire
+    await db.push_receipts.update_many(
+        {"ticket_id": {"$in": [t for t in token_by_ticket if t not in checked]}},
+        {"$set": {"check_after": datetime.now(timezone.utc) + PUSH_RECEIPT_DELAY}}
+    )
+    await db.push_receipts.delete_many(
+        {"created_at": {"$lt": datetime.now(timezone.utc) - PUSH_RECEIPT_RETENTION}}
+    )
+    return len(receipts)
+
+async def push_receipt_worker():
+    """Background loop that keeps polling push receipts"""
+    while True:
+        try:
+            # One worker polls, or every receipt would be checked and counted
+            # once per process; the lease is renewed for each batch drained
+            lease = timedelta(seconds=2 * PUSH_RECEIPT_POLL_SECONDS)
+            while await acquire_job_lease("push_receipts", lease):
+                # Drain everything that is due before sleeping again
+                if await check_push_receipts() < PUSH_RECEIPT_BATCH_SIZE:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Failed to check push receipts: %s", e)
+        await asyncio.sleep(PUSH_RECEIPT_POLL_SECONDS)
+
+# Skip rewriting an unchanged token more often than this
+PUSH_TOKEN_REFRESH_INTERVAL = timedelta(days=1)
+
+def is_push_audience(user_doc: dict) -> bool:
+    """Whether a user's devices should receive puzzle notifications"""
+    return user_doc.get("role") == "member" and user_doc.get("subscription_status") == "active"
+
+async def sync_push_audience(user_id: str):
+    """Copy a user's audience membership onto all of their push tokens"""
+    user_doc = await db.users.find_one(
+        {"user_id": user_id},
+        {"_id": 0, "role": 1, "subscription_status": 1}
+    )
+    if not user_doc:
+        return
+    await db.push_tokens.update_many(
+        {"user_id": user_id},
+        {"$set": {"is_audience": is_push_audience(user_doc)}}
+    )
+
+PUZZLE_NOTIFICATION_TITLE = "🧩 New Daily Puzzle!"
+
+async def get_puzzle_audience_tokens() -> List[str]:
+    """Tokens of every active member device, answered from the audience index"""
+    cursor = db.push_tokens.find(
+        {"is_audience": True},
+        {"_id": 0, "token": 1}
+    ).hint([("is_audience", 1), ("token", 1)])
+    return [doc["token"] async for doc in cursor]
+
+# ============================================================================
+# POST CLEANUP QUEUE
+# ============================================================================
+
+POST_CLEANUP_POLL_SECONDS = 30
+# A job claimed by a worker that died is picked up again after this long
+POST_CLEANUP_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+post_cleanup_wakeup = asyncio.Event()
+
+async def enqueue_post_cleanup(post_id: str, image_id: Optional[str] = None):
+    """Queue removal of a deleted post's attempts and other dependent data"""
+    await db.post_cleanup_jobs.update_one(
+        {"post_id": post_id},
+        {"$setOnInsert": {
+            "post_id": post_id,
+            "image_id": image_id,
+            "created_at": datetime.now(timezone.utc),
+            "claimed_at": None,
+        }},
+        upsert=True
+    )
+    post_cleanup_wakeup.set()
+
+async def run_post_cleanup_jobs() -> int:
+    """Claim and run queued cleanup jobs one at a time"""
+    processed = 0
+    while True:
+        now = datetime.now(timezone.utc)
+        job = await db.post_cleanup_jobs.find_one_and_update(
+            {"$or": [
+                {"claimed_at": None},
+                {"claimed_at": {"$lt": now - POST_CLEANUP_CLAIM_TIMEOUT}},
+            ]},
+            {"$set": {"claimed_at": now}},
+            sort=[("created_at", 1)]
+        )
+        if not job:
+            return processed
+        
+        deleted = await cascade_post_delete(db, job["post_id"])
+        if job.get("image_id"):
+            deleted["image"] = await delete_image_if_unreferenced(db, job["image_id"])
+        await db.post_cleanup_jobs.delete_one({"_id": job["_id"]})
+        logger.info("Cleaned up deleted post", extra={"post_id": job["post_id"], "deleted": deleted})
+        processed += 1
+
+async def post_cleanup_worker():
+    """Background loop that runs cleanup jobs as they are queued"""
+    while True:
+        post_cleanup_wakeup.clear()
+        try:
+            await run_post_cleanup_jobs()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Post cleanup failed: %s", e)
+        
+        try:
+            await asyncio.wait_for(post_cleanup_wakeup.wait(), POST_CLEANUP_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+# ============================================================================
+# BACKGROUND JOB LEASES
+# ============================================================================
+
+# Identifies this process when holding a lease on a periodic job
+WORKER_ID = f"worker_{uuid.uuid4().hex[:12]}"
+
+async def acquire_job_lease(name: str, duration: timedelta) -> bool:
+    """Take or renew a lease so only one worker runs a periodic job"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_leases.update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"holder": WORKER_ID}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + duration}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and is held by another worker
+        return False
+
+# ============================================================================
+# POST ARCHIVAL
+# ============================================================================
+
+POST_ARCHIVE_AFTER = timedelta(days=int(os.environ.get("POST_ARCHIVE_AFTER_DAYS", "90")))
+POST_ARCHIVE_INTERVAL_SECONDS = int(os.environ.get("POST_ARCHIVE_INTERVAL_SECONDS", "21600"))
+POST_ARCHIVE_BATCH_SIZE = 100
+ARCHIVE_PAGE_SIZE = 20
+ARCHIVE_PAGE_SIZE_MAX = 50
+
+async def post_archive_worker():
+    """Background loop that moves old posts and attempts to the archive"""
+    while True:
+        try:
+            if await acquire_job_lease("post_archive", timedelta(seconds=POST_ARCHIVE_INTERVAL_SECONDS)):
+                while True:
+                    archived = await archive_old_posts(db, POST_ARCHIVE_AFTER, POST_ARCHIVE_BATCH_SIZE)
+                    if archived["posts"]:
+                        logger.info("Archived old posts", extra={"archived": archived})
+                    if archived["posts"] < POST_ARCHIVE_BATCH_SIZE:
+                        break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Post archival failed: %s", e)
+        await asyncio.sleep(POST_ARCHIVE_INTERVAL_SECONDS)
+
+# ============================================================================
+# SCHEDULED PUBLISHING
+# ============================================================================
+
+POST_PUBLISH_POLL_SECONDS = 15
+POST_PUBLISH_LEASE = timedelta(seconds=60)
+# Audiences are resolved this long before publish_at, so the notification
+# can go out the moment the post is published
+POST_AUDIENCE_LEAD = timedelta(minutes=int(os.environ.get("POST_AUDIENCE_LEAD_MINUTES", "5")))
+POST_AUDIENCE_CHUNK_SIZE = 1000
+POST_PUSH_CONCURRENCY = 4
+
+post_publish_wakeup = asyncio.Event()
+
+async def prepare_post_audience(post: dict, tokens: List[str]):
+    """Store the push audience of a scheduled puzzle as ready to send chunks"""
+    await db.scheduled_pushes.delete_many({"post_id": post["post_id"]})
+    chunks = [
+        {
+            "post_id": post["post_id"],
+            "title": post["title"],
+            "release_at": post["publish_at"],
+            "tokens": tokens[start:start + POST_AUDIENCE_CHUNK_SIZE],
+        }
+        for start in range(0, len(tokens), POST_AUDIENCE_CHUNK_SIZE)
+    ]
+    if chunks:
+        await db.scheduled_pushes.insert_many(chunks)
+    await db.posts.update_one({"post_id": post["post_id"]}, {"$set": {"audience_ready": True}})
+
+async def prepare_due_audiences(now: datetime) -> int:
+    """Resolve the audience of puzzles publishing within the lead time"""
+    posts = await db.posts.find(
+        {"published": False, "publish_at": {"$lte": now + POST_AUDIENCE_LEAD}, "audience_ready": {"$ne": True}},
+        {"_id": 0, "post_id": 1, "title": 1, "publish_at": 1, "is_puzzle": 1}
+    ).to_list(100)
+    
+    tokens = None
+    for post in posts:
+        if not post.get("is_puzzle"):
+            await db.posts.update_one({"post_id": post["post_id"]}, {"$set": {"audience_ready": True}})
+            continue
+        if tokens is None:
+            tokens = await get_puzzle_audience_tokens()
+        await prepare_post_audience(post, tokens)
+    return len(posts)
+
+async def publish_due_posts(now: datetime) -> int:
+    """Make scheduled posts whose time has come visible"""
+    published = 0
+    while True:
+        post = await db.posts.find_one_and_update(
+            {"published": False, "publish_at": {"$lte": now}},
+            {"$set": {"published": True, "created_at": datetime.now(timezone.utc)}},
+            sort=[("publish_at", 1)],
+            projection={"_id": 0, "post_id": 1}
+        )
+        if not post:
+            break
+        await record_change(db, "post", "upsert", post["post_id"])
+        published += 1
+    
+    if published:
+        invalidate_admin_summary()
+    return published
+
+async def send_scheduled_pushes(now: datetime) -> int:
+    """Send the stored audience chunks of published puzzles
+    Each chunk is removed before it is sent, so a crash never notifies twice.
+    """
+    sent = 0
+    
+    async def drain():
+        nonlocal sent
+        while True:
+            chunk = await db.scheduled_pushes.find_one_and_delete({"release_at": {"$lte": now}})
+            if not chunk:
+                return
+            await send_push_notification(
+                tokens=chunk["tokens"],
+                title=PUZZLE_NOTIFICATION_TITLE,
+                body=chunk["title"],
+                data={"type": "puzzle", "post_id": chunk["post_id"]}
+            )
+            sent += len(chunk["tokens"])
+    
+    await asyncio.gather(*(drain() for _ in range(POST_PUSH_CONCURRENCY)))
+    return sent
+
+async def next_publish_wakeup(now: datetime) -> float:
+    """Seconds until the scheduler has something to do, capped at the poll interval"""
+    post = await db.posts.find_one(
+        {"published": False},
+        {"_id": 0, "publish_at": 1, "audience_ready": 1},
+        sort=[("publish_at", 1)]
+    )
+    if not post:
+        return POST_PUBLISH_POLL_SECONDS
+    due = post["publish_at"].replace(tzinfo=timezone.utc)
+    if not post.get("audience_ready"):
+        due -= POST_AUDIENCE_LEAD
+    return max(0.0, min(POST_PUBLISH_POLL_SECONDS, (due - now).total_seconds()))
+
+async def post_publish_worker():
+    """Background loop that publishes scheduled posts and notifies members"""
+    while True:
+        post_publish_wakeup.clear()
+        delay = POST_PUBLISH_POLL_SECONDS
+        try:
+            if await acquire_job_lease("post_publish", POST_PUBLISH_LEASE):
+                now = datetime.now(timezone.utc)
+                await prepare_due_audiences(now)
+                published = await publish_due_posts(now)
+                sent = await send_scheduled_pushes(now)
+                if published or sent:
+                    logger.info("Published scheduled posts", extra={"posts": published, "devices": sent})
+                delay = await next_publish_wakeup(datetime.now(timezone.utc))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Scheduled publishing failed: %s", e)
+        
+        try:
+            await asyncio.wait_for(post_publish_wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+# ============================================================================
+# SESSION TOKEN FILTER
+# ============================================================================
+
+SESSION_FILTER_CAPACITY = int(os.environ.get("SESSION_FILTER_CAPACITY", "100000"))
+SESSION_FILTER_ERROR_RATE = float(os.environ.get("SESSION_FILTER_ERROR_RATE", "0.01"))
+SESSION_FILTER_SYNC_SECONDS = float(os.environ.get("SESSION_FILTER_SYNC_SECONDS", "1"))
+SESSION_FILTER_REBUILD_SECONDS = int(os.environ.get("SESSION_FILTER_REBUILD_SECONDS", "3600"))
+REJECTED_TOKEN_CACHE_SIZE = int(os.environ.get("REJECTED_TOKEN_CACHE_SIZE", "10000"))
+REJECTED_TOKEN_TTL_SECONDS = float(os.environ.get("REJECTED_TOKEN_TTL_SECONDS", "60"))
+
+# Sessions written by other workers are picked up with this clock skew margin
+SESSION_FILTER_SKEW = timedelta(seconds=5)
+
+
+def utc_naive(value: datetime) -> datetime:
+    """Normalize to a naive UTC datetime, the form MongoDB returns"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class SessionTokenIndex:
+    """Process-local filter of valid session token hashes
+
+    Each worker keeps its own filter. Logins on this worker are added directly,
+    logins on other workers are picked up by an incremental sync that runs at
+    most once per SESSION_FILTER_SYNC_SECONDS, however many unknown tokens
+    arrive. A full rebuild periodically drops logged out and expired sessions.
+    Until then a logout only goes into the rejected cache: the token may never
+    have been added here, and lowering counters it did not raise could hide
+    live sessions sharing them.
+    """
+
+    def __init__(self):
+        self.bloom = None  # None until built, lookups then go to MongoDB
+        self.rejected = NegativeCache(REJECTED_TOKEN_CACHE_SIZE, REJECTED_TOKEN_TTL_SECONDS)
+        self.lock = asyncio.Lock()
+        self.synced_until = None  # newest session created_at seen
+        self.recent = {}  # hashes inside the skew window, so syncs don't re-add them
+        self.last_sync = 0.0
+        self.rejected_without_db = 0
+        self.false_positives = 0
+
+    def _remember(self, digest: bytes, created_at: datetime):
+        if digest not in self.recent:
+            self.bloom.add(digest)
+            self.recent[digest] = created_at
+        if self.synced_until is None or created_at > self.synced_until:
+            self.synced_until = created_at
+
+    def _prune_recent(self):
+        horizon = self.synced_until - SESSION_FILTER_SKEW
+        self.recent = {d: c for d, c in self.recent.items() if c >= horizon}
+
+    async def rebuild(self):
+        """Build a fresh filter from every unexpired session and swap it in"""
+        async with self.lock:
+            started = time.monotonic()
+            bloom = CountingBloomFilter(SESSION_FILTER_CAPACITY, SESSION_FILTER_ERROR_RATE)
+            recent = {}
+            newest = None
+            recent_horizon = utc_naive(datetime.now(timezone.utc)) - 2 * SESSION_FILTER_SKEW
+            
+            async for doc in db.user_sessions.find(
+                {"expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"_id": 0, "session_token": 1, "created_at": 1}
+            ):
+                digest = token_hash(doc["session_token"])
+                created_at = utc_naive(doc["created_at"])
+                bloom.add(digest)
+                if created_at >= recent_horizon:
+                    recent[digest] = created_at
+                if newest is None or created_at > newest:
+                    newest = created_at
+            
+            # Lookups keep using the old filter until the new one is complete
+            self.bloom, self.recent, self.synced_until = bloom, recent, newest
+            self.last_sync = started
+            if newest is not None:
+                self._prune_recent()
+            if bloom.count > bloom.capacity:
+                logger.warning(
+                    "Session filter over capacity",
+                    extra={"entries": bloom.count, "capacity": bloom.capacity}
+                )
+
+    async def sync(self, missed_at: float):
+        """Add sessions created since the last sync, coalescing concurrent callers"""
+        async with self.lock:
+            if self.last_sync >= missed_at:
+                return  # a sync started after this miss already ran
+            
+            wait = self.last_sync + SESSION_FILTER_SYNC_SECONDS - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.last_sync = time.monotonic()
+            
+            query = {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+            if self.synced_until is not None:
+                query["created_at"] = {"$gte": self.synced_until - SESSION_FILTER_SKEW}
+            
+            async for doc in db.user_sessions.find(
+                query,
+                {"_id": 0, "session_token": 1, "created_at": 1}
+            ):
+                self._remember(token_hash(doc["session_token"]), utc_naive(doc["created_at"]))
+            
+            if self.synced_until is not None:
+                self._prune_recent()
+
+    async def might_be_valid(self, digest: bytes) -> bool:
+        """False only when the token is certainly not a valid session"""
+        if digest in self.rejected:
+            self.rejected_without_db += 1
+            return False
+        if self.bloom is None or digest in self.bloom:
+            return True
+        
+        # The session may have just been created by another worker
+        await self.sync(time.monotonic())
+        if digest in self.bloom:
+            return True
+        
+        self.rejected.add(digest)
+        self.rejected_without_db += 1
+        return False
+
+    def add(self, token: str, created_at: datetime):
+        digest = token_hash(token)
+        self.rejected.discard(digest)
+        if self.bloom is not None:
+            self._remember(digest, utc_naive(created_at))
+
+    def remove(self, token: str):
+        self.rejected.add(token_hash(token))
+
+    def reject(self, digest: bytes, false_positive: bool = False):
+        """Remember a token the database turned down"""
+        self.rejected.add(digest)
+        if false_positive:
+            self.false_positives += 1
+
+    def stats(self) -> dict:
+        return {
+            "filter": self.bloom.stats() if self.bloom is not None else None,
+            "rejected_cache": self.rejected.stats(),
+            "rejected_without_db": self.rejected_without_db,
+            "false_positives": self.false_positives,
+        }
+
+
+session_index = SessionTokenIndex()
+
+async def session_filter_rebuild_worker():
+    """Background loop that periodically rebuilds the session filter"""
+    while True:
+        await asyncio.sleep(SESSION_FILTER_REBUILD_SECONDS)
+        try:
+            await session_index.rebuild()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Failed to rebuild session filter: %s", e)
+
 # ============================================================================
 # AUTHENTICATION HELPER
 # ============================================================================
@@ -139,6 +983,11 @@ async def get_current_user(request: Request, session_token: Optional[str] = Cook
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    # Reject tokens that are certainly unknown without touching the database
+    digest = token_hash(token)
+    if not await session_index.might_be_valid(digest):
+        raise HTTPException(status_code=401, detail="Invalid session")
+    
     # Find session in database
     session_doc = await db.user_sessions.find_one(
         {"session_token": token},
@@ -146,6 +995,7 @@ async def get_current_user(request: Request, session_token: Optional[str] = Cook
     )
     
     if not session_doc:
+        session_index.reject(digest, false_positive=True)
         raise HTTPException(status_code=401, detail="Invalid session")
     
     # Check expiry
@@ -155,6 +1005,7 @@ async def get_current_user(request: Request, session_token: Optional[str] = Cook
     if expires_at.tzinfo is None:
         expires_at = expires_at.replace(tzinfo=timezone.utc)
     if expires_at < datetime.now(timezone.utc):
+        session_index.reject(digest)
         raise HTTPException(status_code=401, detail="Session expired")
     
     # Get user
@@ -205,6 +1056,7 @@ async def create_session(request: Request, response: Response):
             {"email": session_data.email},
             {"$set": {
                 "name": session_data.name,
+                "name_lower": session_data.name.lower(),
                 "picture": session_data.picture
             }}
         )
@@ -222,7 +1074,7 @@ async def create_session(request: Request, response: Response):
             subscription_expires_at=None,  # No expiry until activated
             created_at=datetime.now(timezone.utc)
         )
-        await db.users.insert_one(new_user.dict())
+        await db.users.insert_one({**new_user.dict(), "name_lower": new_user.name.lower()})
     
     # Create session
     new_session = UserSession(
@@ -232,6 +1084,7 @@ async def create_session(request: Request, response: Response):
         created_at=datetime.now(timezone.utc)
     )
     await db.user_sessions.insert_one(new_session.dict())
+    session_index.add(new_session.session_token, new_session.created_at)
     
     # Set cookie
     response.set_cookie(
@@ -268,7 +1121,10 @@ async def logout(request: Request, response: Response, session_token: Optional[s
             token = auth_header.split(" ")[1]
     
     if token:
-        await db.user_sessions.delete_one({"session_token": token})
+        result = await db.user_sessions.delete_one({"session_token": token})
+        # Unknown tokens would only push real logouts out of the rejected cache
+        if result.deleted_count == 1:
+            session_index.remove(token)
     
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Logged out successfully"}
@@ -279,12 +1135,42 @@ async def save_push_token(
     request: Request,
     session_token: Optional[str] = Cookie(None)
 ):
-    """Save user's push notification token"""
+    """Register one of the user's devices for push notifications"""
     user = await get_current_user(request, session_token)
+    if not PushClient.is_exponent_push_token(token_data.push_token):
+        raise HTTPException(status_code=400, detail="Invalid push token")
+    now = datetime.now(timezone.utc)
+    is_audience = is_push_audience(user.dict())
     
-    await db.users.update_one(
-        {"user_id": user.user_id},
-        {"$set": {"push_token": token_data.push_token}}
+    existing = await db.push_tokens.find_one(
+        {"token": token_data.push_token},
+        {"_id": 0}
+    )
+    if existing:
+        last_seen = existing["last_seen"]
+        if last_seen.tzinfo is None:
+            last_seen = last_seen.replace(tzinfo=timezone.utc)
+        unchanged = (
+            existing["user_id"] == user.user_id
+            and existing.get("platform") == token_data.platform
+            and existing.get("is_audience") == is_audience
+        )
+        if unchanged and now - last_seen < PUSH_TOKEN_REFRESH_INTERVAL:
+            return {"message": "Push token saved successfully"}
+    
+    # A token moves with the device, so it is re-assigned if another user logs in
+    await db.push_tokens.update_one(
+        {"token": token_data.push_token},
+        {
+            "$set": {
+                "user_id": user.user_id,
+                "platform": token_data.platform,
+                "is_audience": is_audience,
+                "last_seen": now,
+            },
+            "$setOnInsert": {"created_at": now},
+        },
+        upsert=True
     )
     
     return {"message": "Push token saved successfully"}
@@ -305,9 +1191,49 @@ async def get_posts(request: Request, session_token: Optional[str] = Cookie(None
             detail="Your subscription is inactive. Please contact the club owner to activate your membership."
         )
     
-    posts = await db.posts.find().sort("created_at", -1).to_list(100)
+    posts = await collection_for("get_posts", "posts").find({"published": True}).sort(
+        "created_at", -1
+    ).max_time_ms(MONGO_QUERY_TIMEOUT_MS).to_list(100)
+    return [Post(**post) for post in posts]
+
+@api_router.get("/posts/scheduled")
+async def get_scheduled_posts(request: Request, session_token: Optional[str] = Cookie(None)):
+    """Get posts waiting to be published (only for owners)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view scheduled posts")
+    
+    posts = await db.posts.find(
+        {"published": False},
+        {"_id": 0}
+    ).sort("publish_at", 1).to_list(100)
     return [Post(**post) for post in posts]
 
+def build_puzzle_solution(position: Position, line: List[str]) -> dict:
+    """Resolve a solution line to packed moves, with every accepted spelling
+    of each solver move worked out once so grading is a lookup
+    """
+    if len(line) % 2 == 0:
+        raise HTTPException(status_code=400, detail="A puzzle line must end with the solver's move")
+    
+    moves = []
+    sans = []
+    accepted = []
+    for ply, text in enumerate(line):
+        index = NotationIndex(position)
+        move = index.lookup(text)
+        if move is None:
+            raise HTTPException(status_code=400, detail=f"Move {ply + 1} of the puzzle line, '{text}', is not legal")
+        if ply % 2 == 0:
+            exact, folded = index.spellings(move)
+            accepted.append({"exact": exact, "folded": folded})
+        moves.append(move)
+        sans.append(san(position, move, index.legal))
+        position = position.make_move(move)
+    
+    return {"solution_moves": moves, "solution_san": sans, "accepted_answers": accepted}
+
 @api_router.post("/posts", response_model=Post)
 async def create_post(
     post_data: PostCreate,
@@ -320,43 +1246,90 @@ async def create_post(
     if user.role != "owner":
         raise HTTPException(status_code=403, detail="Only owners can create posts")
     
+    if post_data.image_id and not await db[f"{POST_IMAGE_BUCKET}.files"].find_one(
+        {"metadata.sha256": post_data.image_id}, {"_id": 1}
+    ):
+        raise HTTPException(status_code=400, detail="Unknown image_id")
+    
+    fen = orientation = None
+    if post_data.fen:
+        try:
+            fen = normalize_fen(post_data.fen, post_data.side_to_move)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid FEN: {e}")
+        orientation = post_data.orientation or ("white" if fen.split()[1] == "w" else "black")
+        if orientation not in ORIENTATIONS:
+            raise HTTPException(status_code=400, detail="orientation must be 'white' or 'black'")
+    
+    puzzle_answer = post_data.puzzle_answer
+    solution = None
+    if post_data.puzzle_line and not fen:
+        raise HTTPException(status_code=400, detail="A puzzle line needs a FEN position")
+    if fen:
+        position = Position.from_fen(fen)
+        if not position.is_legal():
+            raise HTTPException(status_code=400, detail="Invalid FEN: the side not to move is in check")
+        line = post_data.puzzle_line or ([puzzle_answer] if puzzle_answer else None)
+        if post_data.is_puzzle and line:
+            solution = build_puzzle_solution(position, line)
+            puzzle_answer = solution["solution_san"][0]
+    
+    now = datetime.now(timezone.utc)
+    scheduled = post_data.publish_at is not None and post_data.publish_at > now
+    
     new_post = Post(
         post_id=f"post_{uuid.uuid4().hex[:12]}",
         title=post_data.title,
         content=post_data.content,
         image=post_data.image,
+        image_id=post_data.image_id,
+        fen=fen,
+        orientation=orientation,
+        board_id=board_id(fen, orientation) if fen else None,
         is_puzzle=post_data.is_puzzle,
-        puzzle_answer=post_data.puzzle_answer,
+        puzzle_answer=puzzle_answer,
+        line_moves=len(solution["accepted_answers"]) if solution and len(solution["solution_moves"]) > 1 else None,
         success_message=post_data.success_message,
         failure_message=post_data.failure_message,
         created_by=user.user_id,
-        created_at=datetime.now(timezone.utc)
+        created_at=now,
+        publish_at=post_data.publish_at if scheduled else None,
+        published=not scheduled
+    )
+    
+    await db.posts.insert_one({**new_post.dict(), **(solution or {})})
+    audit_log.record(
+        user.user_id, "create_post", "post", new_post.post_id,
+        after={"title": new_post.title, "is_puzzle": new_post.is_puzzle, "publish_at": new_post.publish_at},
+        client=client_address(request)
     )
+    if scheduled:
+        # Published and announced by the scheduler
+        post_publish_wakeup.set()
+        return new_post
     
-    await db.posts.insert_one(new_post.dict())
+    await record_change(db, "post", "upsert", new_post.post_id)
+    invalidate_admin_summary()
     
     # Send push notifications if it's a puzzle
     if new_post.is_puzzle:
         try:
-            # Get all active members with push tokens
-            members = await db.users.find({
-                "subscription_status": "active",
-                "role": "member",
-                "push_token": {"$exists": True, "$ne": None}
-            }).to_list(1000)
-            
-            tokens = [m["push_token"] for m in members if m.get("push_token")]
+            # Get every device of every active member
+            tokens = await get_puzzle_audience_tokens()
             
             if tokens:
                 await send_push_notification(
                     tokens=tokens,
-                    title="🧩 New Daily Puzzle!",
+                    title=PUZZLE_NOTIFICATION_TITLE,
                     body=post_data.title,
                     data={"type": "puzzle", "post_id": new_post.post_id}
                 )
-                logger.info(f"Sent puzzle notification to {len(tokens)} members")
+                logger.info(
+                    "Sent puzzle notification",
+                    extra={"post_id": new_post.post_id, "devices": len(tokens)}
+                )
         except Exception as e:
-            logger.error(f"Failed to send notifications: {e}")
+            logger.error("Failed to send notifications: %s", e)
             # Don't fail the post creation if notification fails
     
     return new_post
@@ -373,17 +1346,171 @@ async def delete_post(
     if user.role != "owner":
         raise HTTPException(status_code=403, detail="Only owners can delete posts")
     
-    result = await db.posts.delete_one({"post_id": post_id})
+    deleted_post = await db.posts.find_one_and_delete(
+        {"post_id": post_id},
+        projection={"_id": 0, "image_id": 1, "title": 1, "is_puzzle": 1, "created_by": 1, "created_at": 1}
+    )
     
-    if result.deleted_count == 0:
+    if not deleted_post:
         raise HTTPException(status_code=404, detail="Post not found")
     
+    audit_log.record(
+        user.user_id, "delete_post", "post", post_id,
+        before={k: v for k, v in deleted_post.items() if k != "image_id"},
+        client=client_address(request)
+    )
+    await db.scheduled_pushes.delete_many({"post_id": post_id})
+    await enqueue_post_cleanup(post_id, deleted_post.get("image_id"))
+    await record_change(db, "post", "delete", post_id)
+    invalidate_admin_summary()
+    
     return {"message": "Post deleted successfully"}
 
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", str(5 * 1024 * 1024)))
+IMAGE_STREAM_CHUNK_SIZE = 256 * 1024
+
+@api_router.post("/posts/images")
+async def upload_post_image(request: Request, session_token: Optional[str] = Cookie(None)):
+    """Upload a post image as multipart/form-data field 'image' (only for owners)
+    Returns the image_id to pass to POST /api/posts.
+    """
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can upload images")
+    
+    return await stream_image_upload(
+        request,
+        image_bucket,
+        db[f"{POST_IMAGE_BUCKET}.files"],
+        field_name="image",
+        max_bytes=MAX_IMAGE_BYTES,
+        metadata={"uploaded_by": user.user_id}
+    )
+
+@api_router.get("/images/{image_id}")
+async def get_post_image(image_id: str, request: Request):
+    """Serve an uploaded image, addressed by its SHA-256 so it never changes"""
+    file_doc = await db[f"{POST_IMAGE_BUCKET}.files"].find_one({"metadata.sha256": image_id})
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = f'"{image_id}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    grid_out = await image_bucket.open_download_stream(file_doc["_id"])
+    
+    async def read_chunks():
+        while True:
+            chunk = await grid_out.read(IMAGE_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    
+    headers["Content-Length"] = str(file_doc["length"])
+    return StreamingResponse(
+        read_chunks(),
+        media_type=file_doc["metadata"]["content_type"],
+        headers=headers
+    )
+
+BOARD_CACHE_DIR = Path(os.environ.get("BOARD_CACHE_DIR", str(ROOT_DIR / "board_cache")))
+BOARD_CACHE_ENTRIES = int(os.environ.get("BOARD_CACHE_ENTRIES", "512"))
+BOARD_MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+board_cache = BoardImageCache(BOARD_CACHE_DIR, BOARD_CACHE_ENTRIES)
+
+@api_router.get("/boards/{board_id}.{fmt}")
+async def get_board_image(board_id: str, fmt: str, request: Request, size: int = 32):
+    """Serve a puzzle board rendered from its FEN; `size` is the PNG square size in pixels"""
+    if fmt not in BOARD_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Board not found")
+    if fmt == "png" and size not in PNG_SQUARE_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(PNG_SQUARE_SIZES)}")
+    
+    # The id is a hash of the position, so the image for a key never changes
+    key = f"{board_id}.svg" if fmt == "svg" else f"{board_id}-{size}.png"
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    data = board_cache.get(key)
+    if data is None:
+        post = None
+        if not (BOARD_CACHE_DIR / key).exists():
+            # Only positions used by a post are rendered
+            for name in ("posts", "posts_archive"):
+                post = await db[name].find_one({"board_id": board_id}, {"_id": 0, "fen": 1, "orientation": 1})
+                if post:
+                    break
+            if not post:
+                raise HTTPException(status_code=404, detail="Board not found")
+        
+        def render():
+            if fmt == "svg":
+                return render_svg(post["fen"], post["orientation"])
+            return render_png(post["fen"], post["orientation"], size)
+        
+        data = await asyncio.to_thread(board_cache.load, key, render)
+    
+    return Response(content=data, media_type=BOARD_MEDIA_TYPES[fmt], headers=headers)
+
+@api_router.get("/archive/posts")
+async def get_archived_posts(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = ARCHIVE_PAGE_SIZE,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Get archived posts with their attempt summaries, newest first
+    The next page cursor is returned in the X-Next-Cursor header.
+    """
+    user = await get_current_user(request, session_token)
+    
+    if user.role == "member" and user.subscription_status != "active":
+        raise HTTPException(
+            status_code=403, 
+            detail="Your subscription is inactive. Please contact the club owner to activate your membership."
+        )
+    
+    limit = max(1, min(limit, ARCHIVE_PAGE_SIZE_MAX))
+    query = decode_cursor(cursor, "post_id") if cursor else {}
+    
+    posts = await db.posts_archive.find(query, {"_id": 0}).sort(
+        [("created_at", -1), ("post_id", -1)]
+    ).limit(limit + 1).max_time_ms(MONGO_QUERY_TIMEOUT_MS).to_list(limit + 1)
+    
+    if len(posts) > limit:
+        posts = posts[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(posts[-1], "post_id")
+    
+    summaries = {
+        summary["post_id"]: summary
+        async for summary in db.post_summaries.find(
+            {"post_id": {"$in": [p["post_id"] for p in posts]}},
+            {"_id": 0, "post_id": 1, "attempt_count": 1, "player_count": 1, "solved_count": 1}
+        )
+    }
+    
+    return [
+        {
+            **Post(**post).dict(),
+            "stats": {k: v for k, v in summaries.get(post["post_id"], {}).items() if k != "post_id"},
+        }
+        for post in posts
+    ]
+
 # ============================================================================
 # PUZZLE ROUTES
 # ============================================================================
 
+# Unfinished multi-move attempts are dropped after this long
+PUZZLE_PROGRESS_RETENTION = timedelta(days=30)
+
 @api_router.post("/puzzles/submit")
 async def submit_puzzle_answer(
     submission: PuzzleSubmission,
@@ -394,7 +1521,7 @@ async def submit_puzzle_answer(
     user = await get_current_user(request, session_token)
     
     # Get the post
-    post_doc = await db.posts.find_one({"post_id": submission.post_id}, {"_id": 0})
+    post_doc = await db.posts.find_one({"post_id": submission.post_id, "published": True}, {"_id": 0})
     if not post_doc:
         raise HTTPException(status_code=404, detail="Post not found")
     
@@ -403,10 +1530,19 @@ async def submit_puzzle_answer(
         raise HTTPException(status_code=400, detail="This post is not a puzzle")
     
     # Check how many attempts the user has made
-    attempts_count = await db.puzzle_attempts.count_documents({
-        "user_id": user.user_id,
-        "post_id": submission.post_id
-    })
+    previous_attempts = await db.puzzle_attempts.find(
+        {"user_id": user.user_id, "post_id": submission.post_id},
+        {"_id": 0, "is_correct": 1}
+    ).to_list(2)
+    attempts_count = len(previous_attempts)
+    
+    if any(a["is_correct"] for a in previous_attempts):
+        return {
+            "success": True,
+            "message": "You have already solved this puzzle",
+            "attempts_remaining": 0,
+            "is_correct": True
+        }
     
     if attempts_count >= 2:
         return {
@@ -416,8 +1552,53 @@ async def submit_puzzle_answer(
             "is_correct": False
         }
     
+    attempt_number = attempts_count + 1
+    solution_moves = post_doc.get("solution_moves") or []
+    
+    # Progress through a multi-move line is one small document per attempt
+    ply = 0
+    if len(solution_moves) > 1:
+        progress = await db.puzzle_progress.find_one(
+            {"user_id": user.user_id, "post_id": submission.post_id, "attempt_number": attempt_number},
+            {"_id": 0, "ply": 1}
+        )
+        ply = progress["ply"] if progress else 0
+    
     # Check if answer is correct
-    is_correct = submission.answer.strip().lower() == post.puzzle_answer.strip().lower()
+    answer = normalize_notation(submission.answer)
+    if solution_moves:
+        accepted = post_doc["accepted_answers"][ply // 2]
+        is_correct = answer in accepted["exact"] or answer.lower() in accepted["folded"]
+    else:
+        # Photo puzzles without a position can only be compared as text
+        is_correct = answer.lower() == normalize_notation(post.puzzle_answer or "").lower()
+    
+    if not is_correct and post.fen and NotationIndex(replay(post.fen, solution_moves[:ply])).lookup(answer) is None:
+        # Not counted as an attempt, it is most likely a typo
+        raise HTTPException(status_code=400, detail=f"'{submission.answer.strip()}' is not a legal move in this position")
+    
+    if is_correct and ply + 1 < len(solution_moves):
+        # Advance past the solver's move and the reply in one conditional write;
+        # a concurrent submit of the same step fails the ply match
+        try:
+            await db.puzzle_progress.update_one(
+                {"user_id": user.user_id, "post_id": submission.post_id, "attempt_number": attempt_number, "ply": ply},
+                {"$set": {"ply": ply + 2, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            raise HTTPException(status_code=409, detail="This move was already submitted")
+        
+        reply = post_doc["solution_san"][ply + 1]
+        return {
+            "success": True,
+            "message": f"Correct! Your opponent replies {reply}. Find the next move.",
+            "attempts_remaining": 2 - attempts_count,
+            "is_correct": True,
+            "complete": False,
+            "reply": reply,
+            "ply": ply + 2
+        }
     
     # Save attempt
     attempt = PuzzleAttempt(
@@ -426,12 +1607,16 @@ async def submit_puzzle_answer(
         post_id=submission.post_id,
         answer=submission.answer,
         is_correct=is_correct,
-        attempt_number=attempts_count + 1,
+        attempt_number=attempt_number,
+        ply=ply,
         created_at=datetime.now(timezone.utc)
     )
     await db.puzzle_attempts.insert_one(attempt.dict())
+    await record_change(db, "attempt", "upsert", submission.post_id, user_id=user.user_id)
     
     attempts_remaining = 2 - (attempts_count + 1)
+    if is_correct or attempts_remaining == 0:
+        await record_puzzle_result(user.user_id, solved=is_correct)
     
     if is_correct:
         message = post.success_message or "Correct! Well done!"
@@ -445,7 +1630,108 @@ async def submit_puzzle_answer(
         "success": is_correct,
         "message": message,
         "attempts_remaining": attempts_remaining,
-        "is_correct": is_correct
+        "is_correct": is_correct,
+        "complete": True
+    }
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_PAGE_SIZE_MAX = 100
+
+# Every field the history reads is in this index, so pages are index-only scans
+HISTORY_INDEX = [
+    ("user_id", 1), ("created_at", -1), ("post_id", -1), ("is_correct", 1), ("attempt_number", 1),
+]
+
+async def record_puzzle_result(user_id: str, solved: bool):
+    """Update a member's streak counters in one atomic write"""
+    if solved:
+        pipeline = [
+            {"$set": {
+                "current_streak": {"$add": [{"$ifNull": ["$current_streak", 0]}, 1]},
+                "solved": {"$add": [{"$ifNull": ["$solved", 0]}, 1]},
+            }},
+            {"$set": {"best_streak": {"$max": [{"$ifNull": ["$best_streak", 0]}, "$current_streak"]}}},
+        ]
+    else:
+        pipeline = [
+            {"$set": {
+                "current_streak": 0,
+                "best_streak": {"$ifNull": ["$best_streak", 0]},
+                "failed": {"$add": [{"$ifNull": ["$failed", 0]}, 1]},
+            }},
+        ]
+    pipeline[0]["$set"]["updated_at"] = datetime.now(timezone.utc)
+    await db.puzzle_streaks.update_one({"user_id": user_id}, pipeline, upsert=True)
+
+def attempt_result(attempt: dict) -> str:
+    if attempt["is_correct"]:
+        return "solved"
+    return "failed" if attempt["attempt_number"] >= 2 else "retry"
+
+@api_router.get("/puzzles/history")
+async def get_puzzle_history(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = HISTORY_PAGE_SIZE,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Get the user's own puzzle attempts, newest first
+    Attempts on archived posts are included. The next page cursor is returned
+    in the X-Next-Cursor header.
+    """
+    user = await get_current_user(request, session_token)
+    
+    limit = max(1, min(limit, HISTORY_PAGE_SIZE_MAX))
+    query = {"user_id": user.user_id}
+    if cursor:
+        query.update(decode_cursor(cursor, "post_id"))
+    
+    # One page from each collection, merged; an attempt caught halfway through
+    # archival is in both and only kept once
+    pages = await asyncio.gather(*(
+        collection.find(
+            query,
+            {"_id": 0, "post_id": 1, "is_correct": 1, "attempt_number": 1, "created_at": 1}
+        ).sort([("created_at", -1), ("post_id", -1)]).hint(HISTORY_INDEX).limit(limit + 1).to_list(limit + 1)
+        for collection in (db.puzzle_attempts, db.puzzle_attempts_archive)
+    ))
+    merged = {
+        (a["post_id"], a["attempt_number"]): a
+        for a in pages[0] + pages[1]
+    }
+    attempts = sorted(merged.values(), key=lambda a: (a["created_at"], a["post_id"]), reverse=True)[:limit + 1]
+    
+    if len(attempts) > limit:
+        attempts = attempts[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(attempts[-1], "post_id")
+    
+    post_ids = list({a["post_id"] for a in attempts})
+    titles = {}
+    for collection in (db.posts, db.posts_archive):
+        async for post in collection.find(
+            {"post_id": {"$in": [p for p in post_ids if p not in titles]}},
+            {"_id": 0, "post_id": 1, "title": 1}
+        ):
+            titles[post["post_id"]] = post["title"]
+    
+    return [
+        {**attempt, "title": titles.get(attempt["post_id"]), "result": attempt_result(attempt)}
+        for attempt in attempts
+    ]
+
+@api_router.get("/puzzles/streak")
+async def get_puzzle_streak(request: Request, session_token: Optional[str] = Cookie(None)):
+    """Get the user's current and best solving streaks"""
+    user = await get_current_user(request, session_token)
+    
+    streak = await db.puzzle_streaks.find_one({"user_id": user.user_id}, {"_id": 0, "user_id": 0})
+    return {
+        "current_streak": 0,
+        "best_streak": 0,
+        "solved": 0,
+        "failed": 0,
+        **(streak or {}),
     }
 
 @api_router.get("/puzzles/{post_id}/status")
@@ -462,6 +1748,9 @@ async def get_puzzle_status(
         {"_id": 0}
     ).to_list(10)
     
+    return puzzle_status(attempts)
+
+def puzzle_status(attempts: list) -> dict:
     attempts_count = len(attempts)
     has_solved = any(a["is_correct"] for a in attempts)
     
@@ -471,6 +1760,104 @@ async def get_puzzle_status(
         "has_solved": has_solved
     }
 
+async def puzzle_statuses(user_id: str, post_ids: list) -> dict:
+    """Attempt status of several puzzles for one member in a single query"""
+    attempts = {post_id: [] for post_id in post_ids}
+    async for attempt in db.puzzle_attempts.find(
+        {"user_id": user_id, "post_id": {"$in": list(post_ids)}},
+        {"_id": 0, "post_id": 1, "is_correct": 1}
+    ):
+        attempts[attempt["post_id"]].append(attempt)
+    return {post_id: puzzle_status(post_attempts) for post_id, post_attempts in attempts.items()}
+
+# ============================================================================
+# DELTA SYNC
+# ============================================================================
+
+SYNC_PAGE_SIZE = 1000
+SYNC_FULL_POST_LIMIT = 100
+
+@api_router.get("/sync")
+async def sync_changes(
+    request: Request,
+    since: Optional[int] = None,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Get what changed since the client's last sync token
+    Without a token, or with one older than the change journal, a full
+    snapshot is returned (full = true). Pass `next` as `since` next time and
+    repeat while `has_more` is true.
+    """
+    user = await get_current_user(request, session_token)
+    can_read_posts = user.role == "owner" or user.subscription_status == "active"
+    subscription = {
+        "status": user.subscription_status,
+        "expires_at": user.subscription_expires_at,
+        "is_active": user.subscription_status == "active"
+    }
+    
+    current = await current_sequence(db)
+    oldest = await oldest_sequence(db)
+    full = (
+        since is None
+        or since > current
+        or (since < current and (oldest is None or since < oldest - 1))
+    )
+    
+    if full:
+        posts = []
+        if can_read_posts:
+            posts = await db.posts.find({"published": True}, {"_id": 0}).sort("created_at", -1).to_list(SYNC_FULL_POST_LIMIT)
+        puzzle_post_ids = [p["post_id"] for p in posts if p.get("is_puzzle")]
+        return {
+            "full": True,
+            "next": current,
+            "has_more": False,
+            "posts": [Post(**post) for post in posts],
+            "deleted_post_ids": [],
+            "puzzle_statuses": await puzzle_statuses(user.user_id, puzzle_post_ids),
+            "subscription": subscription,
+        }
+    
+    entries, has_more = await read_changes(db, since, SYNC_PAGE_SIZE)
+    next_token = entries[-1]["seq"] if entries else since
+    
+    changed_posts = set()
+    deleted_posts = set()
+    attempted_posts = set()
+    subscription_changed = False
+    for entry in entries:
+        if entry["user_id"] not in (None, user.user_id):
+            continue
+        if entry["kind"] == "post":
+            if entry["op"] == "upsert":
+                changed_posts.add(entry["entity_id"])
+                deleted_posts.discard(entry["entity_id"])
+            else:
+                deleted_posts.add(entry["entity_id"])
+                changed_posts.discard(entry["entity_id"])
+        elif entry["kind"] == "attempt":
+            attempted_posts.add(entry["entity_id"])
+        elif entry["kind"] == "subscription":
+            subscription_changed = True
+    
+    posts = []
+    if can_read_posts and changed_posts:
+        posts = await db.posts.find(
+            {"post_id": {"$in": list(changed_posts)}, "published": True},
+            {"_id": 0}
+        ).to_list(len(changed_posts))
+    
+    return {
+        "full": False,
+        "next": next_token,
+        "has_more": has_more,
+        "posts": [Post(**post) for post in posts],
+        "deleted_post_ids": sorted(deleted_posts),
+        "puzzle_statuses": await puzzle_statuses(user.user_id, attempted_posts) if attempted_posts else {},
+        "subscription": subscription if subscription_changed else None,
+    }
+
 # ============================================================================
 # SUBSCRIPTION ROUTES
 # ============================================================================
@@ -486,35 +1873,553 @@ async def get_subscription(request: Request, session_token: Optional[str] = Cook
         "is_active": user.subscription_status == "active"
     }
 
+# ============================================================================
+# CLUB INFO
+# ============================================================================
+
+# Each worker re-reads the settings at least this often, so edits made through
+# another worker show up without a restart
+CLUB_INFO_CACHE_SECONDS = 60
+CLUB_INFO_MAX_AGE = 300
+
+DEFAULT_CLUB_INFO = {
+    "name": "Warje Chess Club",
+    "timings": "Mon-Sat: 6:00 PM - 9:00 PM, Sun: 10:00 AM - 1:00 PM",
+    "timezone": "Asia/Kolkata",
+    "schedule": [
+        *({"day": day, "opens": "18:00", "closes": "21:00"} for day in range(6)),
+        {"day": 6, "opens": "10:00", "closes": "13:00"},
+    ],
+    "is_open_override": None,
+}
+
+club_info_cache = {"info": None, "loaded_at": 0.0}
+
+async def load_club_info() -> dict:
+    """Club settings from MongoDB, served from memory between reloads"""
+    if club_info_cache["info"] is None or time.monotonic() - club_info_cache["loaded_at"] > CLUB_INFO_CACHE_SECONDS:
+        doc = await db.club_settings.find_one({"_id": "club_info"}, {"_id": 0})
+        club_info_cache["info"] = {**DEFAULT_CLUB_INFO, **(doc or {})}
+        club_info_cache["loaded_at"] = time.monotonic()
+    return club_info_cache["info"]
+
+def club_open_status(info: dict, now: datetime):
+    """Whether the club is open at `now` and seconds until that can change"""
+    if info.get("is_open_override") is not None:
+        return info["is_open_override"], None
+    
+    local_now = now.astimezone(ZoneInfo(info["timezone"]))
+    
+    # Every opening and closing moment from yesterday through next week
+    boundaries = []
+    for offset in range(-1, 8):
+        date = (local_now + timedelta(days=offset)).date()
+        for hours in info["schedule"]:
+            if hours["day"] == date.weekday():
+                opens = datetime.combine(date, dt_time.fromisoformat(hours["opens"]), local_now.tzinfo)
+                closes = datetime.combine(date, dt_time.fromisoformat(hours["closes"]), local_now.tzinfo)
+                boundaries.append((opens, closes))
+    
+    is_open = any(opens <= local_now < closes for opens, closes in boundaries)
+    upcoming = [t for pair in boundaries for t in pair if t > local_now]
+    seconds_to_change = int((min(upcoming) - local_now).total_seconds()) if upcoming else None
+    return is_open, seconds_to_change
+
 @api_router.get("/club-info")
-async def get_club_info():
+async def get_club_info(request: Request):
     """Get Warje Chess Club information - open status and timings"""
-    # In a real app, this would be configurable from admin panel
-    # For now, returning static data
-    return {
-        "name": "Warje Chess Club",
-        "is_open": True,
-        "timings": "Mon-Sat: 6:00 PM - 9:00 PM, Sun: 10:00 AM - 1:00 PM"
+    info = await load_club_info()
+    is_open, seconds_to_change = club_open_status(info, datetime.now(timezone.utc))
+    
+    body = {
+        "name": info["name"],
+        "is_open": is_open,
+        "timings": info["timings"],
+        "timezone": info["timezone"],
+        "schedule": info["schedule"],
     }
+    etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+    
+    # Clients may reuse the response until the club next opens or closes
+    max_age = CLUB_INFO_MAX_AGE
+    if seconds_to_change is not None:
+        max_age = max(0, min(max_age, seconds_to_change))
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=body, headers=headers)
+
+@api_router.put("/admin/club-info")
+async def update_club_info(
+    update: ClubInfoUpdate,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Update club name, timings, schedule or open status (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can update club info")
+    
+    update_data = update.dict(exclude_unset=True)
+    
+    if "timezone" in update_data:
+        try:
+            ZoneInfo(update_data["timezone"])
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid timezone")
+    
+    for hours in update_data.get("schedule") or []:
+        if dt_time.fromisoformat(hours["opens"]) >= dt_time.fromisoformat(hours["closes"]):
+            raise HTTPException(status_code=400, detail="Opening time must be before closing time")
+    
+    if update_data:
+        await db.club_settings.update_one(
+            {"_id": "club_info"},
+            {"$set": update_data},
+            upsert=True
+        )
+    club_info_cache["info"] = None
+    
+    info = await load_club_info()
+    is_open, _ = club_open_status(info, datetime.now(timezone.utc))
+    return {**info, "is_open": is_open}
+
+# ============================================================================
+# AUDIT LOG
+# ============================================================================
+
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.environ.get("AUDIT_FLUSH_INTERVAL_SECONDS", "5"))
+AUDIT_MAX_BUFFERED = 10000
+AUDIT_PAGE_SIZE = 50
+AUDIT_PAGE_SIZE_MAX = 500
+AUDIT_SORT = [("created_at", -1), ("audit_id", -1)]
+
+audit_log = AuditLog(db.audit_log, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_SECONDS, AUDIT_MAX_BUFFERED)
+
+async def audit_flush_worker():
+    """Background loop that writes buffered audit entries"""
+    while True:
+        await audit_log.wait()
+        try:
+            await audit_log.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Audit log flush failed: %s", e)
+
+@api_router.get("/admin/audit")
+async def get_audit_log(
+    request: Request,
+    response: Response,
+    member: Optional[str] = None,
+    actor: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = AUDIT_PAGE_SIZE,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Audit entries, newest first (owner only)
+    member: entries targeting this user_id; actor: entries made by this user_id.
+    since/until bound the time range. The next page cursor is returned in the
+    X-Next-Cursor header. Entries still buffered in memory are not included.
+    """
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view the audit log")
+    
+    limit = max(1, min(limit, AUDIT_PAGE_SIZE_MAX))
+    query = {}
+    if member:
+        query["target_id"] = member
+    if actor:
+        query["actor_id"] = actor
+    if action:
+        query["action"] = action
+    time_range = {}
+    if since:
+        time_range["$gte"] = since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+    if until:
+        time_range["$lt"] = until if until.tzinfo else until.replace(tzinfo=timezone.utc)
+    if time_range:
+        query["created_at"] = time_range
+    if cursor:
+        query = {"$and": [query, decode_cursor(cursor, "audit_id")]}
+    
+    entries = await db.audit_log.find(query, {"_id": 0}).sort(AUDIT_SORT).limit(
+        limit + 1
+    ).max_time_ms(MONGO_QUERY_TIMEOUT_MS).to_list(limit + 1)
+    
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(entries[-1], "audit_id")
+    
+    return entries
 
 # ============================================================================
 # ADMIN ROUTES
 # ============================================================================
 
+MEMBER_PAGE_SIZE = 100
+MEMBER_PAGE_SIZE_MAX = 500
+MEMBER_STREAM_BATCH_SIZE = 500
+
+# Fields the admin member list may return. Push tokens and other internal
+# fields are never sent to the client.
+MEMBER_FIELDS = (
+    "user_id", "email", "name", "picture", "role",
+    "subscription_status", "subscription_expires_at", "created_at",
+)
+
+MEMBER_SORT = [("created_at", -1), ("user_id", -1)]
+
+
+def build_member_filter(
+    status: Optional[str],
+    role: Optional[str],
+    expiring_within_days: Optional[int],
+    name_prefix: Optional[str],
+) -> dict:
+    """Translate admin list filters into an index-backed query"""
+    query = {}
+    
+    if status:
+        if status not in ("active", "inactive"):
+            raise HTTPException(status_code=400, detail="Invalid status filter")
+        query["subscription_status"] = status
+    
+    if role:
+        if role not in ("owner", "member"):
+            raise HTTPException(status_code=400, detail="Invalid role filter")
+        query["role"] = role
+    
+    if expiring_within_days is not None:
+        if expiring_within_days < 0:
+            raise HTTPException(status_code=400, detail="expiring_within_days must not be negative")
+        now = datetime.now(timezone.utc)
+        # Combined with any status filter, so status=inactive matches nothing
+        query["$and"] = [
+            {"subscription_status": "active"},
+            {"subscription_expires_at": {"$gte": now, "$lte": now + timedelta(days=expiring_within_days)}},
+        ]
+    
+    if name_prefix:
+        # Anchored, case-sensitive regex on the lowercased copy can use the index
+        query["name_lower"] = {"$regex": f"^{re.escape(name_prefix.lower())}"}
+    
+    return query
+
+
+def member_projection(fields: Optional[str]) -> dict:
+    """Build an inclusion projection from a comma separated field list"""
+    selected = MEMBER_FIELDS
+    if fields:
+        selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+        unknown = [f for f in selected if f not in MEMBER_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    projection = {"_id": 0, "user_id": 1, "created_at": 1}  # needed for the cursor
+    projection.update({f: 1 for f in selected})
+    return projection
+
+
+async def stream_members_ndjson(query: dict, projection: dict):
+    """Yield matching members one JSON document per line"""
+    cursor = collection_for("get_all_members", "users").find(
+        query, projection
+    ).sort(MEMBER_SORT).batch_size(MEMBER_STREAM_BATCH_SIZE)
+    
+    async for member in cursor:
+        yield json.dumps(jsonable_encoder(member)) + "\n"
+
+
 @api_router.get("/admin/members")
 async def get_all_members(
     request: Request,
+    response: Response,
+    status: Optional[str] = None,
+    role: Optional[str] = None,
+    expiring_within_days: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = MEMBER_PAGE_SIZE,
+    format: str = "json",
     session_token: Optional[str] = Cookie(None)
 ):
-    """Get all members (owner only)"""
+    """Get members page by page (owner only)
+    Filters: status, role, expiring_within_days, name_prefix
+    The next page cursor is returned in the X-Next-Cursor header.
+    format=ndjson streams every matching member for exports.
+    """
     user = await get_current_user(request, session_token)
     
     if user.role != "owner":
         raise HTTPException(status_code=403, detail="Only owners can view members")
     
-    members = await db.users.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    query = build_member_filter(status, role, expiring_within_days, name_prefix)
+    projection = member_projection(fields)
+    
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_members_ndjson(query, projection),
+            media_type="application/x-ndjson"
+        )
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Invalid format")
+    
+    limit = max(1, min(limit, MEMBER_PAGE_SIZE_MAX))
+    if cursor:
+        keyset = decode_cursor(cursor, "user_id")
+        query = {"$and": [query, keyset]} if query else keyset
+    
+    # Fetch one extra document to know whether another page exists
+    members = await collection_for("get_all_members", "users").find(
+        query, projection
+    ).sort(MEMBER_SORT).limit(limit + 1).max_time_ms(MONGO_QUERY_TIMEOUT_MS).to_list(limit + 1)
+    
+    if len(members) > limit:
+        members = members[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(members[-1], "user_id")
+    
     return members
 
+ADMIN_SUMMARY_TTL_SECONDS = 30
+
+admin_summary_cache = {"summary": None, "computed_at": 0.0}
+
+def invalidate_admin_summary():
+    admin_summary_cache["summary"] = None
+
+def facet_count(result: list, name: str) -> int:
+    """Read a {$count: "n"} facet, which is empty when nothing matched"""
+    return result[0][name][0]["n"] if result and result[0][name] else 0
+
+async def compute_admin_summary() -> dict:
+    """Dashboard counters, one $facet aggregation per collection"""
+    now = datetime.now(timezone.utc)
+    info = await load_club_info()
+    local_now = now.astimezone(ZoneInfo(info["timezone"]))
+    month_start = local_now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    
+    # Only indexed fields are projected, so the scan is covered by the index
+    members = await db.users.aggregate([
+        {"$project": {"_id": 0, "subscription_status": 1, "subscription_expires_at": 1, "role": 1}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "active": [{"$match": {"subscription_status": "active"}}, {"$count": "n"}],
+            "inactive": [{"$match": {"subscription_status": "inactive"}}, {"$count": "n"}],
+            "expiring_this_week": [
+                {"$match": {
+                    "subscription_status": "active",
+                    "subscription_expires_at": {"$gte": now, "$lte": now + timedelta(days=7)},
+                }},
+                {"$count": "n"},
+            ],
+            "owners": [{"$match": {"role": "owner"}}, {"$count": "n"}],
+        }},
+    ], hint=[("subscription_status", 1), ("subscription_expires_at", 1), ("role", 1)]).to_list(1)
+    
+    push = await db.push_tokens.aggregate([
+        {"$match": {"is_audience": True}},
+        {"$project": {"_id": 0, "user_id": 1}},
+        {"$facet": {
+            "devices": [{"$count": "n"}],
+            "members": [{"$group": {"_id": "$user_id"}}, {"$count": "n"}],
+        }},
+    ]).to_list(1)
+    
+    puzzles = await db.posts.aggregate([
+        {"$match": {"is_puzzle": True, "published": True}},
+        {"$project": {"_id": 0, "created_at": 1}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "this_month": [{"$match": {"created_at": {"$gte": month_start}}}, {"$count": "n"}],
+        }},
+    ]).to_list(1)
+    
+    # Every (member, puzzle) pair has exactly one first attempt and at most one correct one
+    attempts = await db.puzzle_attempts.aggregate([
+        {"$project": {"_id": 0, "is_correct": 1, "attempt_number": 1}},
+        {"$facet": {
+            "played": [{"$match": {"attempt_number": 1}}, {"$count": "n"}],
+            "solved": [{"$match": {"is_correct": True}}, {"$count": "n"}],
+        }},
+    ]).to_list(1)
+    
+    archived = await db.post_summaries.aggregate([
+        {"$group": {"_id": None, "played": {"$sum": "$player_count"}, "solved": {"$sum": "$solved_count"}}},
+    ]).to_list(1)
+    
+    played = facet_count(attempts, "played") + (archived[0]["played"] if archived else 0)
+    solved = facet_count(attempts, "solved") + (archived[0]["solved"] if archived else 0)
+    
+    return {
+        "members": {
+            name: facet_count(members, name)
+            for name in ("total", "active", "inactive", "expiring_this_week", "owners")
+        },
+        "members_with_push_tokens": facet_count(push, "members"),
+        "push_devices": facet_count(push, "devices"),
+        "puzzles": {
+            "total": facet_count(puzzles, "total"),
+            "this_month": facet_count(puzzles, "this_month"),
+        },
+        "attempts": {
+            "played": played,
+            "solved": solved,
+            "solve_rate": round(solved / played, 4) if played else 0.0,
+        },
+        "generated_at": now,
+    }
+
+@api_router.get("/admin/summary")
+async def get_admin_summary(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Member, puzzle and solve rate counters for the admin dashboard (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view the summary")
+    
+    if (
+        admin_summary_cache["summary"] is None
+        or time.monotonic() - admin_summary_cache["computed_at"] > ADMIN_SUMMARY_TTL_SECONDS
+    ):
+        admin_summary_cache["summary"] = await compute_admin_summary()
+        admin_summary_cache["computed_at"] = time.monotonic()
+    
+    return admin_summary_cache["summary"]
+
+@api_router.get("/admin/diagnostics/mongo")
+async def get_mongo_diagnostics(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Connection pool statistics and effective MongoDB settings (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view diagnostics")
+    
+    return {
+        "pool": pool_stats.snapshot(),
+        "client_options": MONGO_CLIENT_OPTIONS,
+        "query_timeout_ms": MONGO_QUERY_TIMEOUT_MS,
+        "read_preferences": ROUTE_READ_PREFERENCES,
+    }
+
+@api_router.get("/admin/diagnostics/push")
+async def get_push_diagnostics(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Push delivery counters and receipt queue size (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view diagnostics")
+    
+    return {
+        **push_stats,
+        "pending_receipts": await db.push_receipts.estimated_document_count(),
+        "registered_tokens": await db.push_tokens.estimated_document_count(),
+    }
+
+@api_router.get("/admin/diagnostics/sessions")
+async def get_session_diagnostics(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Session token filter size and hit counters (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view diagnostics")
+    
+    return session_index.stats()
+
+@api_router.get("/admin/diagnostics/boards")
+async def get_board_cache_diagnostics(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Rendered board cache counters (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view diagnostics")
+    
+    return board_cache.stats()
+
+@api_router.get("/admin/diagnostics/limits")
+async def get_limit_diagnostics(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Rate limiter and load shedding counters (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view diagnostics")
+    
+    waiting, recent_wait_ms = pool_stats.pressure()
+    return {
+        "rate_limits": {
+            "enabled": RATE_LIMIT_ENABLED,
+            "routes": {
+                f"{method} {path}": {"rate": rate, "burst": burst}
+                for (method, path), (rate, burst) in RATE_LIMITS.items()
+            },
+            "prefixes": {
+                f"{method} {prefix}*": {"rate": rate, "burst": burst}
+                for (method, prefix), (rate, burst) in RATE_LIMIT_PREFIXES.items()
+            },
+            "trusted_proxy_count": TRUSTED_PROXY_COUNT,
+            "default": {"rate": DEFAULT_RATE_LIMIT[0], "burst": DEFAULT_RATE_LIMIT[1]},
+            **rate_limiter.stats(),
+        },
+        "admission": {
+            **admission.stats(),
+            "pool_waiters": waiting,
+            "pool_recent_wait_ms": round(recent_wait_ms, 3),
+        },
+    }
+
+@api_router.get("/admin/diagnostics/audit")
+async def get_audit_diagnostics(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Audit log buffer and flush counters (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view diagnostics")
+    
+    return audit_log.stats()
+
+@api_router.get("/admin/diagnostics/logging")
+async def get_logging_diagnostics(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Log queue depth and records dropped while it was full (owner only)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can view diagnostics")
+    
+    return log_queue_handler.stats()
+
 @api_router.post("/admin/members/{user_id}/subscription")
 async def update_member_subscription(
     user_id: str,
@@ -565,6 +2470,15 @@ async def update_member_subscription(
         {"user_id": user_id},
         {"$set": update_data}
     )
+    audit_log.record(
+        user.user_id, f"subscription_{action}", "user", user_id,
+        before={k: member.get(k) for k in ("subscription_status", "subscription_expires_at")},
+        after=update_data,
+        client=client_address(request)
+    )
+    await sync_push_audience(user_id)
+    await record_change(db, "subscription", "upsert", user_id, user_id=user_id)
+    invalidate_admin_summary()
     
     return {"message": "Subscription updated successfully", "action": action}
 
@@ -576,16 +2490,510 @@ async def make_owner(
 ):
     """Make a user an owner (for testing purposes)"""
     # In production, you might want to restrict this
-    result = await db.users.update_one(
+    # The document from before the update feeds the audit entry
+    owner_doc = await db.users.find_one_and_update(
         {"email": user_email},
-        {"$set": {"role": "owner"}}
+        {"$set": {"role": "owner"}},
+        projection={"_id": 0, "user_id": 1, "role": 1},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.modified_count == 0:
+    if not owner_doc or owner_doc.get("role") == "owner":
         raise HTTPException(status_code=404, detail="User not found")
     
+    # This route is not authenticated, so the entry has no actor
+    audit_log.record(
+        None, "make_owner", "user", owner_doc["user_id"],
+        before={"role": owner_doc.get("role")},
+        after={"role": "owner"},
+        client=client_address(request)
+    )
+    await sync_push_audience(owner_doc["user_id"])
+    invalidate_admin_summary()
+    
     return {"message": f"User {user_email} is now an owner"}
 
+# ============================================================================
+# GAME ARCHIVE
+# ============================================================================
+
+MAX_PGN_BYTES = int(os.environ.get("MAX_PGN_BYTES", str(50 * 1024 * 1024)))
+GAME_PAGE_SIZE = 20
+GAME_PAGE_SIZE_MAX = 100
+# Everything a result list shows; moves and position hashes stay in the database
+GAME_LIST_PROJECTION = {"_id": 0, "moves": 0, "positions": 0}
+GAME_SEARCH_SORT = [("created_at", -1), ("game_id", -1)]
+
+def require_game_access(user: User):
+    if user.role == "member" and user.subscription_status != "active":
+        raise HTTPException(
+            status_code=403,
+            detail="Your subscription is inactive. Please contact the club owner to activate your membership."
+        )
+
+@api_router.post("/games/import")
+async def import_games(request: Request, session_token: Optional[str] = Cookie(None)):
+    """Import a PGN file sent as the raw request body
+    Games are parsed and inserted as the upload streams in; games that fail
+    to replay are counted and reported, the rest are kept.
+    """
+    user = await get_current_user(request, session_token)
+    
+    require_game_access(user)
+    
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_PGN_BYTES:
+        raise HTTPException(status_code=413, detail="PGN file is too large")
+    
+    async def read_text():
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_PGN_BYTES:
+                raise HTTPException(status_code=413, detail="PGN file is too large")
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+    
+    import_id = f"import_{uuid.uuid4().hex[:12]}"
+    summary = await import_pgn(read_text(), db.games, extra={"imported_by": user.user_id, "import_id": import_id})
+    logger.info(
+        "PGN import %s by %s: %d imported, %d rejected",
+        import_id, user.user_id, summary["imported"], summary["rejected"]
+    )
+    return {"import_id": import_id, **summary}
+
+@api_router.get("/games/search")
+async def search_games(
+    fen: str,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = GAME_PAGE_SIZE,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Games that reached a position, newest first
+    Looked up by the position's Zobrist hash; the en passant square is ignored.
+    A FEN with only the piece placement (or no castling field) matches any side
+    to move (or castling rights). The next page cursor is returned in the
+    X-Next-Cursor header.
+    """
+    user = await get_current_user(request, session_token)
+    
+    require_game_access(user)
+    
+    try:
+        hashes = search_hashes(fen)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    limit = max(1, min(limit, GAME_PAGE_SIZE_MAX))
+    query = {"positions": hashes[0] if len(hashes) == 1 else {"$in": hashes}}
+    if cursor:
+        query.update(decode_cursor(cursor, "game_id"))
+    
+    games = await db.games.find(query, GAME_LIST_PROJECTION).sort(GAME_SEARCH_SORT).limit(
+        limit + 1
+    ).max_time_ms(MONGO_QUERY_TIMEOUT_MS).to_list(limit + 1)
+    
+    if len(games) > limit:
+        games = games[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(games[-1], "game_id")
+    
+    return games
+
+@api_router.get("/games/{game_id}")
+async def get_game(game_id: str, request: Request, session_token: Optional[str] = Cookie(None)):
+    """One game with its moves in SAN and UCI"""
+    user = await get_current_user(request, session_token)
+    
+    require_game_access(user)
+    
+    game = await db.games.find_one({"game_id": game_id}, {"_id": 0, "positions": 0})
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found")
+    
+    position = Position.from_fen(game.get("fen", START_FEN))
+    moves_san = []
+    moves_uci = []
+    for move in decode_moves(game.pop("moves")):
+        moves_san.append(san(position, move))
+        moves_uci.append(uci(move))
+        position = position.make_move(move)
+    
+    return {**game, "moves_san": moves_san, "moves_uci": moves_uci}
+
+# ============================================================================
+# TOURNAMENTS
+# ============================================================================
+
+TOURNAMENT_DEFAULT_RATING = 1200
+# A pairing claimed by a request that died is released after this long
+TOURNAMENT_CLAIM_TIMEOUT = timedelta(minutes=1)
+TOURNAMENT_STANDINGS_SORT = [("tournament_id", 1), ("score", -1), ("buchholz", -1), ("sonneborn_berger", -1), ("rating", -1)]
+
+def swiss_player(doc: dict) -> SwissPlayer:
+    return SwissPlayer(
+        doc["user_id"],
+        rating=doc["rating"],
+        score=doc["score"],
+        colors=doc["colors"],
+        results=doc["results"],
+        had_bye=doc["had_bye"],
+        buchholz=doc["buchholz"],
+        sonneborn_berger=doc["sonneborn_berger"]
+    )
+
+def player_standing(doc: dict) -> dict:
+    """Player row with scores converted from half and quarter points"""
+    return {
+        "user_id": doc["user_id"],
+        "name": doc["name"],
+        "rating": doc["rating"],
+        "points": doc["score"] / 2,
+        "buchholz": doc["buchholz"] / 2,
+        "sonneborn_berger": doc["sonneborn_berger"] / 4,
+        "colors": doc["colors"],
+        "withdrawn": doc["withdrawn"],
+    }
+
+async def get_tournament_or_404(tournament_id: str) -> dict:
+    tournament = await db.tournaments.find_one({"tournament_id": tournament_id}, {"_id": 0})
+    if not tournament:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return tournament
+
+async def claim_tournament(tournament_id: str) -> dict:
+    """Take the tournament for one round change at a time"""
+    now = datetime.now(timezone.utc)
+    tournament = await db.tournaments.find_one_and_update(
+        {"tournament_id": tournament_id, "$or": [
+            {"claimed_at": None},
+            {"claimed_at": {"$lt": now - TOURNAMENT_CLAIM_TIMEOUT}},
+        ]},
+        {"$set": {"claimed_at": now}},
+        projection={"_id": 0}
+    )
+    if not tournament:
+        await get_tournament_or_404(tournament_id)
+        raise HTTPException(status_code=409, detail="Another round change is in progress")
+    return tournament
+
+async def close_tournament_round(tournament: dict):
+    """Fold the results of the current round into scores and tie-breaks"""
+    round_number = tournament["current_round"]
+    if round_number == 0 or tournament["closed_round"] >= round_number:
+        return
+    
+    games = await db.tournament_games.find(
+        {"tournament_id": tournament["tournament_id"], "round": round_number},
+        {"_id": 0, "white_id": 1, "black_id": 1, "result": 1}
+    ).to_list(None)
+    if any(game["result"] is None for game in games):
+        raise HTTPException(status_code=400, detail=f"Round {round_number} still has games without a result")
+    
+    players = {
+        doc["user_id"]: swiss_player(doc)
+        async for doc in db.tournament_players.find({"tournament_id": tournament["tournament_id"]}, {"_id": 0})
+    }
+    apply_round(players, [(game["white_id"], game["black_id"], game["result"]) for game in games])
+    
+    await db.tournament_players.bulk_write([
+        UpdateOne(
+            {"tournament_id": tournament["tournament_id"], "user_id": player_id},
+            {"$set": {
+                "score": player.score,
+                "colors": player.colors,
+                "results": player.results,
+                "had_bye": player.had_bye,
+                "buchholz": player.buchholz,
+                "sonneborn_berger": player.sonneborn_berger,
+            }}
+        )
+        for player_id, player in players.items()
+    ], ordered=False)
+    await db.tournaments.update_one(
+        {"tournament_id": tournament["tournament_id"]},
+        {"$set": {"closed_round": round_number}}
+    )
+
+@api_router.post("/tournaments")
+async def create_tournament(
+    tournament_data: TournamentCreate,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Create a Swiss tournament (only for owners)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can create tournaments")
+    
+    tournament = {
+        "tournament_id": f"tournament_{uuid.uuid4().hex[:12]}",
+        "name": tournament_data.name,
+        "rounds": tournament_data.rounds,
+        "starts_at": tournament_data.starts_at,
+        "status": "registration",  # then "running" and "finished"
+        "current_round": 0,
+        "closed_round": 0,
+        "claimed_at": None,
+        "created_by": user.user_id,
+        "created_at": datetime.now(timezone.utc),
+    }
+    await db.tournaments.insert_one(tournament)
+    tournament.pop("_id")
+    return tournament
+
+@api_router.get("/tournaments")
+async def get_tournaments(request: Request, session_token: Optional[str] = Cookie(None)):
+    """Get the most recent tournaments"""
+    await get_current_user(request, session_token)
+    
+    return await db.tournaments.find(
+        {},
+        {"_id": 0, "claimed_at": 0}
+    ).sort("created_at", -1).to_list(50)
+
+@api_router.get("/tournaments/{tournament_id}")
+async def get_tournament(
+    tournament_id: str,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Get a tournament with its standings"""
+    await get_current_user(request, session_token)
+    
+    tournament = await get_tournament_or_404(tournament_id)
+    tournament.pop("claimed_at", None)
+    players = await db.tournament_players.find(
+        {"tournament_id": tournament_id},
+        {"_id": 0}
+    ).sort(TOURNAMENT_STANDINGS_SORT[1:]).to_list(None)
+    
+    return {**tournament, "standings": [player_standing(p) for p in players]}
+
+@api_router.post("/tournaments/{tournament_id}/players")
+async def register_for_tournament(
+    tournament_id: str,
+    registration: TournamentRegistration,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Register for a tournament; owners may register any member"""
+    user = await get_current_user(request, session_token)
+    
+    if registration.user_id and registration.user_id != user.user_id and user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can register other members")
+    if user.role == "member" and user.subscription_status != "active":
+        raise HTTPException(status_code=403, detail="Your subscription is inactive")
+    
+    tournament = await get_tournament_or_404(tournament_id)
+    if tournament["status"] == "finished":
+        raise HTTPException(status_code=400, detail="This tournament has finished")
+    
+    player_user = await db.users.find_one(
+        {"user_id": registration.user_id or user.user_id},
+        {"_id": 0, "user_id": 1, "name": 1}
+    )
+    if not player_user:
+        raise HTTPException(status_code=404, detail="Member not found")
+    
+    # Late entries simply start on zero points
+    player = {
+        "tournament_id": tournament_id,
+        "user_id": player_user["user_id"],
+        "name": player_user["name"],
+        "rating": registration.rating or TOURNAMENT_DEFAULT_RATING,
+        "score": 0,
+        "colors": "-" * tournament["current_round"],
+        "results": {},
+        "had_bye": False,
+        "buchholz": 0,
+        "sonneborn_berger": 0,
+        "withdrawn": False,
+        "registered_at": datetime.now(timezone.utc),
+    }
+    try:
+        await db.tournament_players.insert_one(player)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already registered")
+    
+    return player_standing(player)
+
+@api_router.delete("/tournaments/{tournament_id}/players/{user_id}")
+async def withdraw_from_tournament(
+    tournament_id: str,
+    user_id: str,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Withdraw from a tournament; played games stay in the standings"""
+    user = await get_current_user(request, session_token)
+    
+    if user_id != user.user_id and user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can withdraw other members")
+    
+    tournament = await get_tournament_or_404(tournament_id)
+    if tournament["status"] == "registration":
+        result = await db.tournament_players.delete_one({"tournament_id": tournament_id, "user_id": user_id})
+        matched = result.deleted_count
+    else:
+        result = await db.tournament_players.update_one(
+            {"tournament_id": tournament_id, "user_id": user_id},
+            {"$set": {"withdrawn": True}}
+        )
+        matched = result.matched_count
+    
+    if not matched:
+        raise HTTPException(status_code=404, detail="Player not registered")
+    return {"message": "Withdrawn from the tournament"}
+
+@api_router.post("/tournaments/{tournament_id}/rounds")
+async def pair_next_round(
+    tournament_id: str,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Close the current round and pair the next one (only for owners)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can pair rounds")
+    
+    tournament = await claim_tournament(tournament_id)
+    try:
+        if tournament["status"] == "finished" or tournament["current_round"] >= tournament["rounds"]:
+            raise HTTPException(status_code=400, detail="All rounds have been played")
+        
+        await close_tournament_round(tournament)
+        
+        players = [
+            swiss_player(doc)
+            async for doc in db.tournament_players.find(
+                {"tournament_id": tournament_id, "withdrawn": False},
+                {"_id": 0}
+            )
+        ]
+        if len(players) < 2:
+            raise HTTPException(status_code=400, detail="At least two players are needed")
+        
+        try:
+            boards, bye = await asyncio.to_thread(pair_round, players)
+        except PairingError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        round_number = tournament["current_round"] + 1
+        games = [
+            {
+                "game_id": f"game_{uuid.uuid4().hex[:12]}",
+                "tournament_id": tournament_id,
+                "round": round_number,
+                "board": board,
+                "white_id": white_id,
+                "black_id": black_id,
+                "result": None,
+            }
+            for board, (white_id, black_id) in enumerate(boards, start=1)
+        ]
+        if bye:
+            games.append({
+                "game_id": f"game_{uuid.uuid4().hex[:12]}",
+                "tournament_id": tournament_id,
+                "round": round_number,
+                "board": len(boards) + 1,
+                "white_id": bye,
+                "black_id": None,
+                "result": "bye",
+            })
+        await db.tournament_games.insert_many(games)
+        await db.tournaments.update_one(
+            {"tournament_id": tournament_id},
+            {"$set": {"current_round": round_number, "status": "running"}}
+        )
+    finally:
+        await db.tournaments.update_one({"tournament_id": tournament_id}, {"$set": {"claimed_at": None}})
+    
+    for game in games:
+        game.pop("_id", None)
+    return {"round": round_number, "games": games}
+
+@api_router.get("/tournaments/{tournament_id}/rounds/{round_number}")
+async def get_tournament_round(
+    tournament_id: str,
+    round_number: int,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Get the pairings and results of one round"""
+    await get_current_user(request, session_token)
+    
+    return await db.tournament_games.find(
+        {"tournament_id": tournament_id, "round": round_number},
+        {"_id": 0}
+    ).sort("board", 1).to_list(None)
+
+@api_router.put("/tournaments/{tournament_id}/games/{game_id}")
+async def set_game_result(
+    tournament_id: str,
+    game_id: str,
+    game_result: GameResult,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Record or correct a result of the current round (only for owners)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can record results")
+    
+    # Claimed like a round change, so the round cannot be closed halfway through
+    tournament = await claim_tournament(tournament_id)
+    try:
+        # A closed round is already in the scores and tie-breaks
+        if tournament["status"] == "finished" or tournament["closed_round"] >= tournament["current_round"]:
+            raise HTTPException(status_code=400, detail="This round is closed, its results can no longer be changed")
+        
+        result = await db.tournament_games.update_one(
+            {
+                "tournament_id": tournament_id,
+                "game_id": game_id,
+                "round": tournament["current_round"],
+                "black_id": {"$ne": None},
+            },
+            {"$set": {"result": game_result.result}}
+        )
+        if not result.matched_count:
+            raise HTTPException(status_code=400, detail="Only games of the current round can be changed")
+    finally:
+        await db.tournaments.update_one({"tournament_id": tournament_id}, {"$set": {"claimed_at": None}})
+    
+    return {"message": "Result recorded"}
+
+@api_router.post("/tournaments/{tournament_id}/finish")
+async def finish_tournament(
+    tournament_id: str,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Close the last round and fix the final standings (only for owners)"""
+    user = await get_current_user(request, session_token)
+    
+    if user.role != "owner":
+        raise HTTPException(status_code=403, detail="Only owners can finish tournaments")
+    
+    tournament = await claim_tournament(tournament_id)
+    try:
+        await close_tournament_round(tournament)
+        await db.tournaments.update_one(
+            {"tournament_id": tournament_id},
+            {"$set": {"status": "finished"}}
+        )
+    finally:
+        await db.tournaments.update_one({"tournament_id": tournament_id}, {"$set": {"claimed_at": None}})
+    
+    return {"message": "Tournament finished"}
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -594,21 +3002,320 @@ async def root():
     """Root endpoint for health checks"""
     return {"message": "Warje Chess Club API", "status": "running"}
 
+@app.exception_handler(ServerSelectionTimeoutError)
+@app.exception_handler(WaitQueueTimeoutError)
+@app.exception_handler(ExecutionTimeout)
+async def database_timeout_handler(request: Request, exc: Exception):
+    """Fail fast with 503 when MongoDB is unreachable, saturated or too slow"""
+    logger.warning(
+        "Database timeout",
+        extra={"path": request.url.path, "error": type(exc).__name__}
+    )
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database temporarily unavailable, please retry"}
+    )
+
+# ============================================================================
+# RATE LIMITING AND LOAD SHEDDING
+# ============================================================================
+
+# (tokens per second, burst) per client for the hot routes; every other API
+# route shares DEFAULT_RATE_LIMIT
+RATE_LIMITS = {
+    ("POST", "/api/puzzles/submit"): (1.0, 10),
+    ("GET", "/api/posts"): (1.0, 20),
+    ("GET", "/api/sync"): (1.0, 10),
+    ("GET", "/api/games/search"): (2.0, 20),
+    ("POST", "/api/games/import"): (1 / 60, 3),
+    # Keyed by address, which a whole club network may share
+    ("POST", "/api/auth/session"): (1.0, 30),
+    ("POST", "/api/auth/logout"): (1.0, 30),
+}
+# Immutable images, fetched without a session by every screen of the feed
+RATE_LIMIT_PREFIXES = {
+    ("GET", "/api/boards/"): (50.0, 500),
+    ("GET", "/api/images/"): (50.0, 500),
+}
+DEFAULT_RATE_LIMIT = (10.0, 100)
+# Routes that take an unverified token are keyed by address, or rotating
+# made-up tokens would get a fresh bucket every time
+ADDRESS_KEYED_ROUTES = {("POST", "/api/auth/session"), ("POST", "/api/auth/logout")}
+# Number of reverse proxies in front of the app whose X-Forwarded-For entries
+# can be trusted; 0 uses the socket address
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", "0"))
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# Diagnostics stay reachable while the server is shedding load
+SHEDDING_EXEMPT_PREFIX = "/api/admin/diagnostics/"
+
+rate_limiter = TokenBucketLimiter(max_keys=int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000")))
+admission = AdmissionControl(
+    max_in_flight=int(os.environ.get("MAX_IN_FLIGHT_REQUESTS", "200")),
+    max_pool_waiters=int(os.environ.get("MAX_POOL_WAITERS", str(MONGO_CLIENT_OPTIONS["maxPoolSize"]))),
+    max_pool_wait_ms=float(os.environ.get(
+        "MAX_POOL_WAIT_MS", str(MONGO_CLIENT_OPTIONS["waitQueueTimeoutMS"] / 2)
+    )),
+)
+
+def client_address(request: Request) -> Optional[str]:
+    """Client IP, read from X-Forwarded-For as written by the trusted proxies"""
+    if TRUSTED_PROXY_COUNT:
+        # Each proxy appends the address it received from; earlier entries can be forged
+        forwarded = [a.strip() for a in request.headers.get("X-Forwarded-For", "").split(",") if a.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_COUNT:
+            return forwarded[-TRUSTED_PROXY_COUNT]
+    return request.client.host if request.client else None
+
+async def rate_limit_client(request: Request, by_address: bool = False) -> bytes:
+    """Session token hash when the token passes the session filter, the client address otherwise
+
+    Made-up tokens must not buy a fresh bucket each, nor push the buckets of
+    limited clients out of the limiter.
+    """
+    token = request.cookies.get("session_token")
+    auth_header = request.headers.get("Authorization")
+    if not token and auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+    if token and not by_address:
+        digest = token_hash(token)
+        if await session_index.might_be_valid(digest):
+            return digest
+    return f"ip:{client_address(request) or '-'}".encode()
+
+def rate_limit_for(method: str, path: str) -> tuple:
+    """(bucket name, rate, burst) of a request"""
+    if (method, path) in RATE_LIMITS:
+        return f"{method} {path}", *RATE_LIMITS[(method, path)]
+    for (prefix_method, prefix), (rate, burst) in RATE_LIMIT_PREFIXES.items():
+        if method == prefix_method and path.startswith(prefix):
+            return f"{method} {prefix}*", rate, burst
+    return "default", *DEFAULT_RATE_LIMIT
+
+def overload_response(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    """Per-client token buckets, then global load shedding, before any route runs"""
+    path = request.url.path
+    if not path.startswith("/api/") or request.method == "OPTIONS":
+        return await call_next(request)
+    
+    if RATE_LIMIT_ENABLED:
+        route, rate, burst = rate_limit_for(request.method, path)
+        client_key = await rate_limit_client(request, by_address=(request.method, path) in ADDRESS_KEYED_ROUTES)
+        allowed, retry_after = rate_limiter.take(route, client_key, rate, burst)
+        if not allowed:
+            return overload_response(429, "Too many requests, please slow down", retry_after)
+    
+    if path.startswith(SHEDDING_EXEMPT_PREFIX):
+        return await call_next(request)
+    
+    reason = admission.enter(*pool_stats.pressure())
+    if reason:
+        logger.warning("Request shed", extra={"path": path, "reason": reason})
+        return overload_response(503, "Server is busy, please retry", 1)
+    try:
+        return await call_next(request)
+    finally:
+        admission.leave()
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID", "Retry-After"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag every log record of a request with its request ID"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# Configure logging: records are queued and written by a background thread
+log_queue_handler, log_listener = setup_logging(
+    getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
 )
 logger = logging.getLogger(__name__)
 
+async def migrate_legacy_push_tokens():
+    """Move the old single users.push_token field into push_tokens
+
+    Malformed tokens are dropped instead of moved.
+    """
+    now = datetime.now(timezone.utc)
+    async for user_doc in db.users.find(
+        {"push_token": {"$exists": True}},
+        {"_id": 0, "user_id": 1, "push_token": 1, "role": 1, "subscription_status": 1}
+    ):
+        if PushClient.is_exponent_push_token(user_doc.get("push_token")):
+            await db.push_tokens.update_one(
+                {"token": user_doc["push_token"]},
+                {
+                    "$set": {"user_id": user_doc["user_id"], "is_audience": is_push_audience(user_doc)},
+                    "$setOnInsert": {"platform": None, "last_seen": now, "created_at": now},
+                },
+                upsert=True
+            )
+        await db.users.update_one(
+            {"user_id": user_doc["user_id"]},
+            {"$unset": {"push_token": ""}}
+        )
+
+@app.on_event("startup")
+async def create_indexes():
+    """Ensure the indexes used by hot queries exist"""
+    try:
+        await db.users.create_index("user_id")
+        await db.users.create_index("email")
+        await db.users.create_index(MEMBER_SORT)
+        await db.users.create_index([("subscription_status", 1), *MEMBER_SORT])
+        await db.users.create_index([("role", 1), *MEMBER_SORT])
+        await db.users.create_index([("subscription_status", 1), ("subscription_expires_at", 1), ("role", 1)])
+        await db.users.create_index("name_lower")
+        await db.user_sessions.create_index("session_token")
+        await db.user_sessions.create_index("created_at")
+        await db.push_tokens.create_index("token", unique=True)
+        await db.push_tokens.create_index("user_id")
+        await db.push_tokens.create_index([("is_audience", 1), ("token", 1)])
+        await db.push_receipts.create_index("check_after")
+        await db.puzzle_attempts.create_index([("user_id", 1), ("post_id", 1)])
+        await db.puzzle_attempts.create_index("post_id")
+        await db.puzzle_attempts.create_index(HISTORY_INDEX)
+        await db.puzzle_streaks.create_index("user_id", unique=True)
+        await db.puzzle_progress.create_index(
+            [("user_id", 1), ("post_id", 1), ("attempt_number", 1)],
+            unique=True
+        )
+        await db.puzzle_progress.create_index("post_id")
+        await db.puzzle_progress.create_index("updated_at", expireAfterSeconds=int(PUZZLE_PROGRESS_RETENTION.total_seconds()))
+        await db.games.create_index("game_id", unique=True)
+        await db.games.create_index([("positions", 1), *GAME_SEARCH_SORT])
+        await db.games.create_index("import_id")
+        await db.audit_log.create_index("audit_id", unique=True)
+        await db.audit_log.create_index(AUDIT_SORT)
+        await db.audit_log.create_index([("target_id", 1), *AUDIT_SORT])
+        await db.audit_log.create_index([("actor_id", 1), *AUDIT_SORT])
+        await db.tournaments.create_index("tournament_id", unique=True)
+        await db.tournaments.create_index([("created_at", -1)])
+        await db.tournament_players.create_index([("tournament_id", 1), ("user_id", 1)], unique=True)
+        await db.tournament_players.create_index(TOURNAMENT_STANDINGS_SORT)
+        await db.tournament_games.create_index([("tournament_id", 1), ("round", 1), ("board", 1)])
+        await db.tournament_games.create_index("game_id", unique=True)
+        await db.changes.create_index("seq", unique=True)
+        await db.changes.create_index("at", expireAfterSeconds=int(CHANGE_RETENTION.total_seconds()))
+        await db.post_cleanup_jobs.create_index("post_id", unique=True)
+        await db.posts.create_index([("created_at", -1)])
+        await db.posts.create_index([("published", 1), ("created_at", -1)])
+        await db.posts.create_index(
+            [("publish_at", 1)],
+            partialFilterExpression={"published": False}
+        )
+        await db.scheduled_pushes.create_index([("release_at", 1)])
+        await db.scheduled_pushes.create_index("post_id")
+        await db.posts.create_index([("is_puzzle", 1), ("created_at", 1)])
+        await db.posts_archive.create_index("post_id", unique=True)
+        await db.posts_archive.create_index([("created_at", -1), ("post_id", -1)])
+        await db.puzzle_attempts_archive.create_index("post_id")
+        await db.puzzle_attempts_archive.create_index([("user_id", 1), ("post_id", 1)])
+        await db.puzzle_attempts_archive.create_index(HISTORY_INDEX)
+        await db.post_summaries.create_index("post_id", unique=True)
+        await db[f"{POST_IMAGE_BUCKET}.files"].create_index(
+            "metadata.sha256",
+            unique=True,
+            partialFilterExpression={"metadata.sha256": {"$exists": True}}
+        )
+        await db.posts.create_index("image_id", sparse=True)
+        await db.posts_archive.create_index("image_id", sparse=True)
+        await db.posts.create_index("board_id", sparse=True)
+        await db.posts_archive.create_index("board_id", sparse=True)
+        await db.post_cleanup_jobs.create_index([("claimed_at", 1), ("created_at", 1)])
+        await db.push_receipts.create_index("ticket_id")
+    except Exception as e:
+        logger.error("Failed to create indexes: %s", e)
+
+async def backfill_name_lower():
+    """Add the lowercased name used for prefix search"""
+    await db.users.update_many(
+        {"name_lower": {"$exists": False}},
+        [{"$set": {"name_lower": {"$toLower": "$name"}}}]
+    )
+
+async def backfill_published():
+    """Posts from before scheduling are all published"""
+    await db.posts.update_many(
+        {"published": {"$exists": False}},
+        {"$set": {"published": True}}
+    )
+
+# Idempotent, and each run on its own: a failed index or another migration
+# must not leave legacy data invisible to queries that expect the new fields
+DATA_MIGRATIONS = [backfill_name_lower, backfill_published, migrate_legacy_push_tokens]
+
+@app.on_event("startup")
+async def run_data_migrations():
+    for migration in DATA_MIGRATIONS:
+        try:
+            await migration()
+        except Exception as e:
+            logger.error("Data migration %s failed: %s", migration.__name__, e)
+
+# Background tasks started with the app and cancelled on shutdown
+background_tasks = []
+
+@app.on_event("startup")
+async def start_background_tasks():
+    try:
+        await session_index.rebuild()
+    except Exception as e:
+        # Without a filter every lookup simply goes to MongoDB
+        logger.error("Failed to build session filter: %s", e)
+    
+    background_tasks.append(asyncio.create_task(push_receipt_worker()))
+    background_tasks.append(asyncio.create_task(session_filter_rebuild_worker()))
+    background_tasks.append(asyncio.create_task(post_cleanup_worker()))
+    background_tasks.append(asyncio.create_task(post_archive_worker()))
+    background_tasks.append(asyncio.create_task(post_publish_worker()))
+    background_tasks.append(asyncio.create_task(audit_flush_worker()))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+@app.on_event("shutdown")
+async def flush_audit_log():
+    """Write entries still buffered; runs before the client is closed"""
+    try:
+        await audit_log.flush()
+    except Exception as e:
+        logger.error(
+            "Audit log flush at shutdown failed, %d entries lost: %s",
+            audit_log.stats()["buffered"], e
+        )
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+
+@app.on_event("shutdown")
+async def flush_logs():
+    if log_queue_handler.dropped:
+        logger.warning("%d log records were dropped while the log queue was full", log_queue_handler.dropped)
+    log_listener.stop()
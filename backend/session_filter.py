@@ -0,0 +1,97 @@
+"""In-memory filters used to reject unknown session tokens without a database lookup"""
+import hashlib
+import math
+import time
+from collections import OrderedDict
+
+
+def token_hash(token: str) -> bytes:
+    """Hash a session token so raw tokens are never kept in memory"""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class CountingBloomFilter:
+    """Bloom filter with 8-bit counters so entries can be removed again
+
+    A negative answer is always correct. A positive answer may be a false
+    positive, in which case the caller falls back to the database.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.counters = bytearray(self.size)
+        self.count = 0
+
+    def _indexes(self, digest: bytes):
+        # Double hashing: k indexes from two 64-bit halves of the digest
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, digest: bytes):
+        for i in self._indexes(digest):
+            if self.counters[i] < 255:
+                self.counters[i] += 1
+        self.count += 1
+
+    def remove(self, digest: bytes):
+        indexes = self._indexes(digest)
+        if not all(self.counters[i] for i in indexes):
+            return
+        for i in indexes:
+            # Saturated counters are left alone, they can no longer be trusted
+            if 0 < self.counters[i] < 255:
+                self.counters[i] -= 1
+        self.count = max(0, self.count - 1)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self.counters[i] for i in self._indexes(digest))
+
+    def estimated_error_rate(self) -> float:
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "entries": self.count,
+            "hash_count": self.hash_count,
+            "memory_bytes": len(self.counters),
+            "estimated_error_rate": round(self.estimated_error_rate(), 6),
+        }
+
+
+class NegativeCache:
+    """Bounded LRU of recently rejected token hashes with a short TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def add(self, digest: bytes):
+        self._entries[digest] = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, digest: bytes):
+        self._entries.pop(digest, None)
+
+    def __contains__(self, digest: bytes) -> bool:
+        expires = self._entries.get(digest)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._entries[digest]
+            return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
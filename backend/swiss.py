@@ -0,0 +1,256 @@
+"""Swiss system pairing and incrementally maintained tie-breaks
+
+Scores are kept in half points (win 2, draw 1, loss 0) so everything stays
+an integer; Sonneborn-Berger, a product of two scores, is in quarter points.
+"""
+from typing import Dict, List, Optional, Tuple
+
+RESULT_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}
+BYE_POINTS = 2
+
+# Colour preference strengths, following the usual Swiss rules
+NO_PREFERENCE, MILD, STRONG, ABSOLUTE = range(4)
+
+# Tentative pairings tried before falling back to a relaxed search
+PAIRING_SEARCH_BUDGET = 5000
+
+
+class PairingError(Exception):
+    pass
+
+
+class SwissPlayer:
+    """Tournament state of one player
+
+    `results` maps each opponent played to the points scored against them,
+    `colors` has one letter per round: "W", "B" or "-" for a bye.
+    """
+
+    __slots__ = ("player_id", "rating", "score", "colors", "results", "had_bye",
+                 "buchholz", "sonneborn_berger")
+
+    def __init__(self, player_id: str, rating: int = 0, score: int = 0, colors: str = "",
+                 results: Optional[Dict[str, int]] = None, had_bye: bool = False,
+                 buchholz: int = 0, sonneborn_berger: int = 0):
+        self.player_id = player_id
+        self.rating = rating
+        self.score = score
+        self.colors = colors
+        self.results = results or {}
+        self.had_bye = had_bye
+        self.buchholz = buchholz
+        self.sonneborn_berger = sonneborn_berger
+
+    def color_preference(self) -> Tuple[Optional[str], int]:
+        played = self.colors.replace("-", "")
+        if not played:
+            return None, NO_PREFERENCE
+        balance = played.count("W") - played.count("B")
+        other = "B" if played[-1] == "W" else "W"
+        if abs(balance) > 1 or played[-2:] in ("WW", "BB"):
+            return ("B" if balance > 0 else "W") if balance else other, ABSOLUTE
+        if balance:
+            return "B" if balance > 0 else "W", STRONG
+        return other, MILD
+
+
+def ranking_key(player: SwissPlayer):
+    return (-player.score, -player.rating, player.player_id)
+
+
+def colors_compatible(preference_a: tuple, preference_b: tuple) -> bool:
+    """False when both players must have the same colour"""
+    return not (preference_a[1] == preference_b[1] == ABSOLUTE and preference_a[0] == preference_b[0])
+
+
+def assign_colors(higher: SwissPlayer, lower: SwissPlayer, board: int) -> Tuple[str, str]:
+    """(white, black) ids; the stronger preference wins, then the higher ranked player"""
+    color_h, strength_h = higher.color_preference()
+    color_l, strength_l = lower.color_preference()
+    if color_h is None and color_l is None:
+        # First round: the top seed alternates colours board by board
+        color_h = "W" if board % 2 else "B"
+    elif color_h is None or (color_l is not None and strength_l > strength_h):
+        color_h = "B" if color_l == "W" else "W"
+    if color_h == "W":
+        return higher.player_id, lower.player_id
+    return lower.player_id, higher.player_id
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+def _match(players: List[SwissPlayer], strict_colors: bool, budget: int) -> Optional[List[tuple]]:
+    """Depth-first pairing of ranked players, trying the natural Swiss partner first
+
+    Each player's ideal opponent sits half a score group below them (top
+    half against bottom half). Candidates are tried by score difference,
+    colour compatibility and distance from that ideal, so the first branch
+    almost always succeeds and backtracking only happens around conflicts.
+    Without `strict_colors` incompatible colours are allowed, but only
+    where no compatible opponent in the same score group works out.
+    """
+    count = len(players)
+    preferences = [player.color_preference() for player in players]
+    group_size = {}
+    for player in players:
+        group_size[player.score] = group_size.get(player.score, 0) + 1
+
+    paired = [False] * count
+    pairs = []
+    steps = 0
+
+    def candidates(rank: int):
+        player = players[rank]
+        preference = preferences[rank]
+        ideal = rank + group_size[player.score] // 2
+        return sorted(
+            (other for other in range(rank + 1, count)
+             if not paired[other] and players[other].player_id not in player.results),
+            key=lambda other: (
+                player.score - players[other].score,
+                not colors_compatible(preference, preferences[other]),
+                abs(other - ideal)
+            )
+        )
+
+    def search(rank: int) -> bool:
+        nonlocal steps
+        while rank < count and paired[rank]:
+            rank += 1
+        if rank == count:
+            return True
+        player = players[rank]
+        paired[rank] = True
+        for other in candidates(rank):
+            if strict_colors and not colors_compatible(preferences[rank], preferences[other]):
+                continue
+            steps += 1
+            if steps > budget:
+                raise _BudgetExceeded()
+            paired[other] = True
+            pairs.append((player, players[other]))
+            if search(rank + 1):
+                return True
+            pairs.pop()
+            paired[other] = False
+        paired[rank] = False
+        return False
+
+    try:
+        return pairs if search(0) else None
+    except _BudgetExceeded:
+        return None
+
+
+def _repair_colors(pairs: List[tuple]) -> Optional[List[tuple]]:
+    """Swap partners between boards to remove colour conflicts left by a relaxed search
+
+    For every conflicting board, the exchange with another board that keeps
+    both new games legal and moves the fewest points is applied. None when a
+    conflict cannot be swapped away.
+    """
+    pairs = list(pairs)
+
+    def legal(a: SwissPlayer, b: SwissPlayer) -> bool:
+        return b.player_id not in a.results and colors_compatible(a.color_preference(), b.color_preference())
+
+    for i in range(len(pairs)):
+        a, b = pairs[i]
+        if legal(a, b):
+            continue
+        best = None
+        for j, (c, d) in enumerate(pairs):
+            if j == i:
+                continue
+            for first, second in (((a, c), (b, d)), ((a, d), (b, c))):
+                if legal(*first) and legal(*second):
+                    cost = abs(first[0].score - first[1].score) + abs(second[0].score - second[1].score)
+                    if best is None or cost < best[0]:
+                        best = (cost, j, first, second)
+        if best is None:
+            return None
+        _, j, first, second = best
+        pairs[i] = tuple(sorted(first, key=ranking_key))
+        pairs[j] = tuple(sorted(second, key=ranking_key))
+
+    return sorted(pairs, key=lambda pair: ranking_key(pair[0]))
+
+
+def pair_round(players: List[SwissPlayer], budget: int = PAIRING_SEARCH_BUDGET):
+    """Pair the next round
+
+    Returns a list of (white_id, black_id) by board and the id of the player
+    getting a bye (None when the count is even). No pairing ever repeats.
+    When the search budget runs out under the colour rules, a relaxed search
+    is repaired by swapping partners between boards; if that fails too the
+    next bye candidate is tried.
+    """
+    ranked = sorted(players, key=ranking_key)
+    bye_candidates = [None]
+    if len(ranked) % 2:
+        # Lowest ranked player who has not had a bye yet, then the next one up
+        bye_candidates = [p for p in reversed(ranked) if not p.had_bye] or list(reversed(ranked))
+
+    for bye in bye_candidates:
+        field = [p for p in ranked if p is not bye]
+        pairs = _match(field, True, budget)
+        if pairs is None:
+            pairs = _match(field, False, budget)
+            if pairs is not None:
+                pairs = _repair_colors(pairs)
+        if pairs is not None:
+            boards = [
+                assign_colors(higher, lower, board)
+                for board, (higher, lower) in enumerate(pairs, start=1)
+            ]
+            return boards, bye.player_id if bye else None
+    raise PairingError("No pairing is possible without repeating a game or breaking a colour rule")
+
+
+def apply_round(players: Dict[str, SwissPlayer], games: List[tuple]):
+    """Add one round's results, updating scores and tie-breaks in place
+
+    `games` holds (white_id, black_id, result) with black_id None for a bye.
+    Only the players of this round and their earlier opponents are touched;
+    nothing is recomputed from the full game history.
+    """
+    gained = {}
+    for white_id, black_id, result in games:
+        if black_id is None:
+            gained[white_id] = BYE_POINTS
+            continue
+        white_points, black_points = RESULT_POINTS[result]
+        gained[white_id] = white_points
+        gained[black_id] = black_points
+
+    # Earlier opponents of anyone who scored see their Buchholz and SB grow
+    for player_id, points in gained.items():
+        if not points:
+            continue
+        player = players[player_id]
+        for opponent_id, player_points in player.results.items():
+            opponent = players[opponent_id]
+            opponent.buchholz += points
+            opponent.sonneborn_berger += points * (2 - player_points)
+
+    for player_id, points in gained.items():
+        players[player_id].score += points
+
+    for white_id, black_id, result in games:
+        white = players[white_id]
+        if black_id is None:
+            white.colors += "-"
+            white.had_bye = True
+            continue
+        black = players[black_id]
+        white_points, black_points = RESULT_POINTS[result]
+        white.colors += "W"
+        black.colors += "B"
+        white.results[black_id] = white_points
+        black.results[white_id] = black_points
+        white.buchholz += black.score
+        black.buchholz += white.score
+        white.sonneborn_berger += black.score * white_points
+        black.sonneborn_berger += white.score * black_points
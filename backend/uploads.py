@@ -0,0 +1,172 @@
+"""Streaming multipart image uploads into GridFS"""
+import hashlib
+
+from fastapi import HTTPException, Request
+from pymongo.errors import DuplicateKeyError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Leading bytes that identify each accepted image format
+IMAGE_SIGNATURES = {
+    "image/jpeg": (b"\xff\xd8\xff",),
+    "image/png": (b"\x89PNG\r\n\x1a\n",),
+    "image/gif": (b"GIF87a", b"GIF89a"),
+    "image/webp": (b"RIFF",),
+}
+SIGNATURE_BYTES = 12
+
+POST_IMAGE_BUCKET = "post_images"
+
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+
+class FilePartCollector:
+    """Parser callbacks that keep only the data of one file field
+
+    The parser is fed synchronously, the collected chunks are drained and
+    written to storage asynchronously between feeds.
+    """
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+        self.headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self.in_file = False
+        self.seen_file = False
+        self.filename = None
+        self.content_type = None
+        self.chunks = []
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self._header_field.decode("latin-1").lower()] = self._header_value.decode("latin-1")
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get("content-disposition", ""))
+        name = options.get(b"name", b"").decode("latin-1")
+        if name == self.field_name and not self.seen_file:
+            self.in_file = True
+            self.seen_file = True
+            self.filename = options.get(b"filename", b"upload").decode("utf-8", "replace")
+            content_type, _ = parse_options_header(self.headers.get("content-type", ""))
+            self.content_type = content_type.decode("latin-1").lower()
+
+    def on_part_data(self, data, start, end):
+        if self.in_file:
+            self.chunks.append(bytes(data[start:end]))
+
+    def on_part_end(self):
+        self.in_file = False
+
+    def drain(self) -> list:
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def check_signature(content_type: str, head: bytes):
+    signatures = IMAGE_SIGNATURES[content_type]
+    if not any(head.startswith(sig) for sig in signatures):
+        raise HTTPException(status_code=415, detail="File content does not match its image type")
+    if content_type == "image/webp" and head[8:12] != b"WEBP":
+        raise HTTPException(status_code=415, detail="File content does not match its image type")
+
+
+async def stream_image_upload(request: Request, bucket, files_collection, field_name: str,
+                              max_bytes: int, metadata: dict) -> dict:
+    """Stream one image field of a multipart request into GridFS
+
+    Size and type are checked as the data arrives, and the SHA-256 is computed
+    on the fly. Identical images are stored once and share one id.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image must be at most {max_bytes} bytes")
+
+    collector = FilePartCollector(field_name)
+    parser = MultipartParser(options[b"boundary"], collector.callbacks())
+    hasher = hashlib.sha256()
+    head = b""
+    size = 0
+    grid_in = None
+
+    try:
+        async for body_chunk in request.stream():
+            parser.write(body_chunk)
+            for data in collector.drain():
+                if grid_in is None:
+                    if collector.content_type not in IMAGE_SIGNATURES:
+                        raise HTTPException(status_code=415, detail="Only JPEG, PNG, GIF and WebP images are allowed")
+                    # Hold back the first bytes until the signature can be checked
+                    head += data
+                    if len(head) < SIGNATURE_BYTES:
+                        continue
+                    check_signature(collector.content_type, head)
+                    grid_in = bucket.open_upload_stream(
+                        collector.filename,
+                        metadata={**metadata, "content_type": collector.content_type}
+                    )
+                    data, head = head, b""
+
+                size += len(data)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Image must be at most {max_bytes} bytes")
+                hasher.update(data)
+                await grid_in.write(data)
+        parser.finalize()
+
+        if grid_in is None:
+            if not collector.seen_file or not head:
+                raise HTTPException(status_code=400, detail=f"Missing '{field_name}' file field")
+            # Tiny file that never filled the signature buffer
+            check_signature(collector.content_type, head)
+            grid_in = bucket.open_upload_stream(
+                collector.filename,
+                metadata={**metadata, "content_type": collector.content_type}
+            )
+            size = len(head)
+            hasher.update(head)
+            await grid_in.write(head)
+        await grid_in.close()
+    except BaseException:
+        if grid_in is not None and not grid_in.closed:
+            await grid_in.abort()
+        raise
+
+    sha256 = hasher.hexdigest()
+    try:
+        await files_collection.update_one({"_id": grid_in._id}, {"$set": {"metadata.sha256": sha256}})
+    except DuplicateKeyError:
+        # Same image uploaded before, keep the existing copy
+        await bucket.delete(grid_in._id)
+
+    return {
+        "image_id": sha256,
+        "size": size,
+        "content_type": collector.content_type,
+    }
@@ -24,9 +24,10 @@ export default function AdminScreen() {
   const [content, setContent] = useState('');
   const [isPuzzle, setIsPuzzle] = useState(false);
   const [puzzleAnswer, setPuzzleAnswer] = useState('');
+  const [fen, setFen] = useState('');
   const [successMessage, setSuccessMessage] = useState('');
   const [failureMessage, setFailureMessage] = useState('');
-  const [imageBase64, setImageBase64] = useState<string | null>(null);
+  const [imageUri, setImageUri] = useState<string | null>(null);
   const [submitting, setSubmitting] = useState(false);
 
   const pickImage = async () => {
@@ -41,14 +42,37 @@ export default function AdminScreen() {
       mediaTypes: ImagePicker.MediaTypeOptions.Images,
       allowsEditing: true,
       quality: 0.7,
-      base64: true,
     });
 
-    if (!result.canceled && result.assets[0].base64) {
-      setImageBase64(`data:image/jpeg;base64,${result.assets[0].base64}`);
+    if (!result.canceled && result.assets[0].uri) {
+      setImageUri(result.assets[0].uri);
     }
   };
 
+  // Streams the picked image to the backend and returns its image_id
+  const uploadImage = async (token: string | null): Promise<string> => {
+    const formData = new FormData();
+    formData.append('image', {
+      uri: imageUri,
+      name: 'puzzle.jpg',
+      type: 'image/jpeg',
+    } as any);
+
+    const response = await fetch(`${BACKEND_URL}/api/posts/images`, {
+      method: 'POST',
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+      body: formData,
+    });
+
+    const data = await response.json();
+    if (!response.ok) {
+      throw new Error(data.detail || 'Failed to upload image');
+    }
+    return data.image_id;
+  };
+
   const handleSubmit = async () => {
     if (!title.trim() || !content.trim()) {
       Alert.alert('Error', 'Please fill in title and content');
@@ -63,6 +87,7 @@ export default function AdminScreen() {
     setSubmitting(true);
     try {
       const token = await AsyncStorage.getItem('session_token');
+      const imageId = imageUri ? await uploadImage(token) : null;
       const response = await fetch(`${BACKEND_URL}/api/posts`, {
         method: 'POST',
         headers: {
@@ -72,7 +97,8 @@ export default function AdminScreen() {
         body: JSON.stringify({
           title,
           content,
-          image: imageBase64,
+          image_id: imageId,
+          fen: isPuzzle && fen.trim() ? fen.trim() : null,
           is_puzzle: isPuzzle,
           puzzle_answer: isPuzzle ? puzzleAnswer : null,
           success_message: isPuzzle && successMessage ? successMessage : null,
@@ -88,9 +114,10 @@ export default function AdminScreen() {
               // Reset form
               setTitle('');
               setContent('');
-              setImageBase64(null);
+              setImageUri(null);
               setIsPuzzle(false);
               setPuzzleAnswer('');
+              setFen('');
               setSuccessMessage('');
               setFailureMessage('');
               router.replace('/(tabs)/feed');
@@ -146,15 +173,15 @@ export default function AdminScreen() {
           <TouchableOpacity style={styles.imageButton} onPress={pickImage}>
             <Ionicons name="image" size={24} color="#8B4513" />
             <Text style={styles.imageButtonText}>
-              {imageBase64 ? 'Change Image' : 'Select Image'}
+              {imageUri ? 'Change Image' : 'Select Image'}
             </Text>
           </TouchableOpacity>
-          {imageBase64 && (
+          {imageUri && (
             <View style={styles.imagePreviewContainer}>
-              <Image source={{ uri: imageBase64 }} style={styles.imagePreview} />
+              <Image source={{ uri: imageUri }} style={styles.imagePreview} />
               <TouchableOpacity
                 style={styles.removeImageButton}
-                onPress={() => setImageBase64(null)}
+                onPress={() => setImageUri(null)}
               >
                 <Ionicons name="close-circle" size={32} color="#DC143C" />
               </TouchableOpacity>
@@ -177,6 +204,18 @@ export default function AdminScreen() {
 
         {isPuzzle && (
           <View style={styles.puzzleFields}>
+            <View style={styles.inputGroup}>
+              <Text style={styles.label}>Position (FEN)</Text>
+              <TextInput
+                style={styles.input}
+                placeholder="Board drawn from the FEN instead of a photo (optional)"
+                value={fen}
+                onChangeText={setFen}
+                autoCapitalize="none"
+                autoCorrect={false}
+              />
+            </View>
+
             <View style={styles.inputGroup}>
               <Text style={styles.label}>Puzzle Answer * (e.g., Nf3)</Text>
               <TextInput
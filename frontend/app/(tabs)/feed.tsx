@@ -23,6 +23,8 @@ interface Post {
   title: string;
   content: string;
   image?: string;
+  image_id?: string;
+  board_id?: string;
   is_puzzle: boolean;
   puzzle_answer?: string;
   success_message?: string;
@@ -31,6 +33,12 @@ interface Post {
   created_at: string;
 }
 
+// Boards and uploaded images are served by the backend, older posts carry a data URI
+const postImageUri = (post: Post) => {
+  if (post.board_id) return `${BACKEND_URL}/api/boards/${post.board_id}.png?size=48`;
+  return post.image_id ? `${BACKEND_URL}/api/images/${post.image_id}` : post.image;
+};
+
 interface PuzzleStatus {
   attempts_used: number;
   attempts_remaining: number;
@@ -124,6 +132,12 @@ export default function Feed() {
 
       if (response.ok) {
         const result = await response.json();
+        if (result.complete === false) {
+          // Multi-move puzzle: the opponent replied, keep the puzzle open for the next move
+          Alert.alert('Correct!', result.message, [{ text: 'OK' }]);
+          setPuzzleAnswer('');
+          return;
+        }
         Alert.alert(
           result.is_correct ? 'Success!' : 'Incorrect',
           result.message,
@@ -134,6 +148,15 @@ export default function Feed() {
         await loadPuzzleStatus(selectedPuzzle.post_id);
         setSelectedPuzzle(null);
         setPuzzleAnswer('');
+      } else {
+        const error = await response.json().catch(() => ({}));
+        const detail = typeof error.detail === 'string' ? error.detail : null;
+        if (response.status === 400 || response.status === 422) {
+          // Illegal moves are rejected without using up an attempt
+          Alert.alert('Invalid move', detail || 'That move could not be read');
+        } else {
+          Alert.alert('Error', detail || 'Failed to submit answer');
+        }
       }
     } catch (error) {
       console.error('Failed to submit puzzle:', error);
@@ -148,9 +171,9 @@ export default function Feed() {
       <Text style={styles.postTitle}>{item.title}</Text>
       <Text style={styles.postContent}>{item.content}</Text>
       
-      {item.image && (
+      {postImageUri(item) && (
         <Image
-          source={{ uri: item.image }}
+          source={{ uri: postImageUri(item) }}
           style={styles.postImage}
           resizeMode="contain"
         />
@@ -177,9 +200,9 @@ export default function Feed() {
         <Text style={styles.puzzleTitle}>{activePuzzle.title}</Text>
         <Text style={styles.puzzleContent}>{activePuzzle.content}</Text>
         
-        {activePuzzle.image && (
+        {postImageUri(activePuzzle) && (
           <Image
-            source={{ uri: activePuzzle.image }}
+            source={{ uri: postImageUri(activePuzzle) }}
             style={styles.puzzleImage}
             resizeMode="contain"
           />
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   View,
   Text,
@@ -28,23 +28,38 @@ export default function MembersScreen() {
   const [members, setMembers] = useState<Member[]>([]);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const pageRequest = useRef(0);
 
   useEffect(() => {
     loadMembers();
   }, []);
 
+  const fetchPage = async (cursor: string | null) => {
+    const token = await AsyncStorage.getItem('session_token');
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(`${BACKEND_URL}/api/admin/members${query}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}`);
+    }
+    const data: Member[] = await response.json();
+    return { data, next: response.headers.get('X-Next-Cursor') };
+  };
+
   const loadMembers = async () => {
+    // A reload supersedes any page still loading from the previous list
+    const request = ++pageRequest.current;
     try {
-      const token = await AsyncStorage.getItem('session_token');
-      const response = await fetch(`${BACKEND_URL}/api/admin/members`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      });
-
-      if (response.ok) {
-        const data = await response.json();
-        setMembers(data);
+      const page = await fetchPage(null);
+      if (request === pageRequest.current) {
+        setMembers(page.data);
+        setNextCursor(page.next);
       }
     } catch (error) {
       console.error('Failed to load members:', error);
@@ -54,6 +69,28 @@ export default function MembersScreen() {
     }
   };
 
+  const loadMoreMembers = async () => {
+    if (!nextCursor || loadingMore) {
+      return;
+    }
+    const request = pageRequest.current;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      if (request === pageRequest.current) {
+        setMembers((current) => {
+          const seen = new Set(current.map((member) => member.user_id));
+          return [...current, ...page.data.filter((member) => !seen.has(member.user_id))];
+        });
+        setNextCursor(page.next);
+      }
+    } catch (error) {
+      console.error('Failed to load more members:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSubscriptionAction = async (
     userId: string,
     action: string,
@@ -247,7 +284,10 @@ export default function MembersScreen() {
   return (
     <View style={styles.container}>
       <View style={styles.header}>
-        <Text style={styles.headerText}>Total Members: {members.length}</Text>
+        <Text style={styles.headerText}>
+          Total Members: {members.length}
+          {nextCursor ? '+' : ''}
+        </Text>
         <TouchableOpacity onPress={() => setRefreshing(true) || loadMembers()}>
           <Ionicons name="refresh" size={24} color="#1877F2" />
         </TouchableOpacity>
@@ -258,6 +298,13 @@ export default function MembersScreen() {
         renderItem={renderMember}
         keyExtractor={(item) => item.user_id}
         contentContainerStyle={styles.listContent}
+        onEndReached={loadMoreMembers}
+        onEndReachedThreshold={0.5}
+        ListFooterComponent={
+          loadingMore ? (
+            <ActivityIndicator style={styles.footer} color="#1877F2" />
+          ) : null
+        }
         refreshControl={
           <RefreshControl
             refreshing={refreshing}
@@ -300,6 +347,9 @@ const styles = StyleSheet.create({
   listContent: {
     padding: 16,
   },
+  footer: {
+    paddingVertical: 16,
+  },
   memberCard: {
     backgroundColor: '#fff',
     borderRadius: 12,
@@ -74,7 +74,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
             'Content-Type': 'application/json',
             'Authorization': `Bearer ${sessionToken}`,
           },
-          body: JSON.stringify({ push_token: token }),
+          body: JSON.stringify({ push_token: token, platform: Platform.OS }),
         });
         console.log('Push token saved to backend');
       }
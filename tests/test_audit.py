@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from audit import AuditLog
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+        self.fail_with = None
+        self.started = asyncio.Event()
+        self.block = False
+
+    async def insert_many(self, docs, ordered=True):
+        self.started.set()
+        if self.block:
+            await asyncio.sleep(3600)
+        if self.fail_with:
+            error, self.fail_with = self.fail_with, None
+            raise error(docs) if callable(error) else error
+        self.docs.extend(docs)
+
+
+def make_log(collection, max_buffered=100):
+    return AuditLog(collection, batch_size=10, flush_interval=0.01, max_buffered=max_buffered)
+
+
+def record(log, count):
+    for i in range(count):
+        log.record("owner", "make_owner", "user", f"user_{i}")
+
+
+def test_flush_writes_everything_buffered():
+    collection = FakeCollection()
+    log = make_log(collection)
+    record(log, 3)
+    assert asyncio.run(log.flush()) == 3
+    assert len(collection.docs) == 3
+    assert log.stats()["buffered"] == 0
+
+
+def test_failed_flush_keeps_entries():
+    collection = FakeCollection()
+    collection.fail_with = RuntimeError("down")
+    log = make_log(collection)
+    record(log, 3)
+    with pytest.raises(RuntimeError):
+        asyncio.run(log.flush())
+    assert log.stats()["buffered"] == 3
+    assert asyncio.run(log.flush()) == 3
+
+
+def test_cancelled_flush_keeps_entries():
+    async def scenario():
+        collection = FakeCollection()
+        collection.block = True
+        log = make_log(collection)
+        record(log, 4)
+        task = asyncio.create_task(log.flush())
+        await collection.started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert log.stats()["buffered"] == 4
+        collection.block = False
+        assert await log.flush() == 4
+
+    asyncio.run(scenario())
+
+
+def test_bulk_write_error_requeues_all_but_duplicates():
+    def partial_failure(docs):
+        return BulkWriteError({
+            "nInserted": 1,
+            "writeErrors": [
+                {"index": 1, "code": 11000, "errmsg": "duplicate"},
+                {"index": 2, "code": 121, "errmsg": "validation"},
+            ],
+        })
+
+    collection = FakeCollection()
+    collection.fail_with = partial_failure
+    log = make_log(collection)
+    record(log, 3)
+    assert asyncio.run(log.flush()) == 1
+    assert log.stats()["buffered"] == 1
+    assert log.stats()["failed_flushes"] == 1
+
+
+def test_overflow_drops_oldest_and_counts_them():
+    log = make_log(FakeCollection(), max_buffered=5)
+    record(log, 8)
+    stats = log.stats()
+    assert stats["buffered"] == 5 and stats["dropped"] == 3 and stats["recorded"] == 8
+
+
+def test_full_batch_wakes_the_worker():
+    async def scenario():
+        log = AuditLog(FakeCollection(), batch_size=2, flush_interval=3600, max_buffered=10)
+        waiter = asyncio.create_task(log.wait())
+        record(log, 2)
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(scenario())
@@ -0,0 +1,21 @@
+import pytest
+from pydantic import ValidationError
+
+import server
+
+
+def test_hours_are_stored_as_hh_mm():
+    hours = server.ClubHours(day=0, opens="0930", closes="18:00:00")
+    assert (hours.opens, hours.closes) == ("09:30", "18:00")
+
+
+@pytest.mark.parametrize("value", ["18:00:30", "18:00+05:30", "25:00", "six"])
+def test_hours_reject_other_times(value):
+    with pytest.raises(ValidationError):
+        server.ClubHours(day=0, opens=value, closes="23:00")
+
+
+def test_update_rejects_null_name_but_allows_omitting_it():
+    assert server.ClubInfoUpdate(timings="Evenings").dict(exclude_unset=True) == {"timings": "Evenings"}
+    with pytest.raises(ValidationError):
+        server.ClubInfoUpdate(name=None)
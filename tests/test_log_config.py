@@ -0,0 +1,11 @@
+import logging
+import queue
+
+from log_config import DroppingQueueHandler
+
+
+def test_full_queue_drops_and_counts_records():
+    handler = DroppingQueueHandler(queue.Queue(2))
+    for number in range(5):
+        handler.emit(logging.makeLogRecord({"msg": f"record {number}"}))
+    assert handler.stats() == {"queued": 2, "queue_size": 2, "dropped": 3}
@@ -0,0 +1,120 @@
+import asyncio
+import json
+
+import manage
+
+
+def test_export_into_a_finished_export_starts_over(tmp_path):
+    (tmp_path / "users").mkdir()
+    (tmp_path / "users" / "part-00000.ndjson.gz").write_bytes(b"old")
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images" / "post_1.png").write_bytes(b"old")
+    (tmp_path / manage.CHECKPOINT_FILE).write_text(json.dumps(
+        {"users": {"last_id": None, "parts": 1, "count": 1, "done": True}}
+    ))
+    (tmp_path / manage.MANIFEST_FILE).write_text("{}")
+
+    manage.clear_finished_export(tmp_path)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == []
+
+
+def test_unfinished_export_is_resumed(tmp_path, monkeypatch):
+    checkpoint = {"users": {"last_id": None, "parts": 1, "count": 1, "done": True}}
+    (tmp_path / manage.CHECKPOINT_FILE).write_text(json.dumps(checkpoint))
+    cleared = []
+    monkeypatch.setattr(manage, "clear_finished_export", cleared.append)
+
+    class Stop(Exception):
+        pass
+
+    def no_database():
+        raise Stop()
+
+    monkeypatch.setattr(manage, "get_database", no_database)
+    try:
+        asyncio.run(manage.export_database(tmp_path, ["users"], 10))
+    except Stop:
+        pass
+    assert cleared == []
+    assert json.loads((tmp_path / manage.CHECKPOINT_FILE).read_text()) == checkpoint
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query):
+        after = query.get("_id", {}).get("$gt")
+        return FakeCursor([doc for doc in self.docs if after is None or doc["_id"] > after])
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+        class Result:
+            inserted_ids = [doc["_id"] for doc in docs]
+
+        return Result()
+
+
+class FakeClient:
+    def __init__(self):
+        self.databases = {}
+
+    def close(self):
+        pass
+
+
+def test_reexported_directory_imports_again_and_into_other_databases(tmp_path, monkeypatch):
+    client = FakeClient()
+
+    def get_database():
+        name = manage.os.environ["DB_NAME"]
+        return client, client.databases.setdefault(name, {"users": FakeCollection()})
+
+    async def no_uploaded_images(db, directory):
+        return 0
+
+    monkeypatch.setattr(manage, "get_database", get_database)
+    monkeypatch.setattr(manage, "export_uploaded_images", no_uploaded_images)
+    monkeypatch.setattr(manage, "import_uploaded_images", no_uploaded_images)
+
+    def run(command, database, *args):
+        monkeypatch.setenv("DB_NAME", database)
+        asyncio.run(command(tmp_path, ["users"], 2, *args))
+        return [doc["name"] for doc in client.databases[database]["users"].docs]
+
+    client.databases["source"] = {"users": FakeCollection()}
+    client.databases["source"]["users"].docs = [{"_id": i, "name": f"old{i}"} for i in range(3)]
+    run(manage.export_database, "source")
+    assert run(manage.import_database, "first") == ["old0", "old1", "old2"]
+    assert not (tmp_path / manage.IMPORT_CHECKPOINT_FILE).exists()
+
+    client.databases["source"]["users"].docs = [{"_id": i, "name": f"new{i}"} for i in range(10, 13)]
+    run(manage.export_database, "source")
+    assert run(manage.import_database, "second") == ["new10", "new11", "new12"]
+    assert run(manage.import_database, "first")[3:] == ["new10", "new11", "new12"]
+
+
+def test_import_checkpoint_is_keyed_by_target_without_the_url(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_NAME", "first")
+    first = manage.import_target()
+    monkeypatch.setenv("DB_NAME", "second")
+    assert manage.import_target() != first
+    assert "mongodb" not in first
@@ -0,0 +1,16 @@
+import pytest
+
+import server
+
+
+def test_expiring_filter_keeps_the_status_filter():
+    query = server.build_member_filter("inactive", None, 7, None)
+    assert query["subscription_status"] == "inactive"
+    assert {"subscription_status": "active"} in query["$and"]
+
+
+def test_expiring_filter_accepts_zero_but_not_negative_days():
+    assert "$and" in server.build_member_filter(None, None, 0, None)
+    with pytest.raises(server.HTTPException) as error:
+        server.build_member_filter(None, None, -1, None)
+    assert error.value.detail == "expiring_within_days must not be negative"
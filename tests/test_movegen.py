@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from bench_perft import PERFT_POSITIONS
+from movegen import START_FEN, NotationIndex, Position, perft, resolve_san, san, uci, zobrist_hash, zobrist_update
+
+# Depths beyond this many leaf nodes are left to bench_perft.py
+MAX_TEST_NODES = 10_000
+
+PERFT_CASES = [
+    pytest.param(fen, depth, nodes, id=f"{name}-{depth}")
+    for name, fen, counts in PERFT_POSITIONS
+    for depth, nodes in enumerate(counts, start=1)
+    if nodes <= MAX_TEST_NODES
+]
+
+
+@pytest.mark.parametrize("fen,depth,nodes", PERFT_CASES)
+def test_perft_matches_published_counts(fen, depth, nodes):
+    assert perft(Position.from_fen(fen), depth) == nodes
+
+
+def random_games(count: int, plies: int):
+    rng = random.Random(7)
+    for _ in range(count):
+        position = Position.from_fen(START_FEN)
+        for _ in range(plies):
+            legal = position.legal_moves()
+            if not legal:
+                break
+            move = rng.choice(legal)
+            yield position, move, legal
+            position = position.make_move(move)
+
+
+def test_resolve_san_reads_back_generated_notation():
+    for position, move, legal in random_games(20, 80):
+        assert resolve_san(position, san(position, move, legal)) == move
+        assert resolve_san(position, uci(move)) == move
+
+
+def test_zobrist_update_matches_full_hash():
+    for position, move, _ in random_games(20, 80):
+        after = position.make_move(move)
+        assert zobrist_update(zobrist_hash(position), position, after, move) == zobrist_hash(after)
+
+
+def test_notation_index_accepts_common_spellings():
+    index = NotationIndex(Position.from_fen(START_FEN))
+    assert index.lookup("Nf3") == index.lookup("g1f3") == index.lookup("Ng1-f3") == index.lookup("nf3")
+    assert index.lookup("Nf4") is None
+
+
+def test_notation_index_rejects_ambiguous_case_folding():
+    # Both the bishop and the b pawn can take on c3
+    index = NotationIndex(Position.from_fen("4k3/8/8/8/8/2p5/1P6/4B2K w - - 0 1"))
+    assert uci(index.lookup("Bxc3")) == "e1c3"
+    assert uci(index.lookup("bxc3")) == "b2c3"
+    assert index.lookup("BXC3") is None
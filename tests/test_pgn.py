@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from movegen import uci
+from pgn import PgnSplitter, build_documents, decode_moves, game_document, import_pgn, search_hashes
+
+GAMES = """[Event "Club night"]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+[WhiteElo "1800"]
+
+1. e4 {best by test} e5 2. Nf3 (2. f4 exf4) Nc6 $1 3. Bb5 a6!? 4. O-O ; comment
+Nf6 5. Re1 1-0
+
+[Event "Broken"]
+[White "C"]
+[Black "D"]
+
+1. e5 *
+"""
+
+
+def split(text: str, chunk: int):
+    splitter = PgnSplitter()
+    games = []
+    for start in range(0, len(text), chunk):
+        games.extend(splitter.feed(text[start:start + chunk]))
+    games.extend(splitter.close())
+    return games
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 10000])
+def test_splitter_finds_games_across_chunk_boundaries(chunk):
+    games = split(GAMES, chunk)
+    assert len(games) == 2
+    assert games[1].startswith('[Event "Broken"]')
+
+
+def test_game_document_skips_comments_variations_and_nags():
+    doc = game_document(split(GAMES, 10000)[0])
+    assert doc["ply_count"] == 9
+    assert len(doc["moves"]) == 18
+    assert doc["white"] == "A" and doc["result"] == "1-0"
+    assert doc["tags"] == {"WhiteElo": "1800"}
+    assert "fen" not in doc
+
+
+def test_rejected_games_are_reported():
+    docs, errors = build_documents(split(GAMES, 10000))
+    assert len(docs) == 1
+    assert errors == [{"white": "C", "black": "D", "error": "Ply 1: Illegal move 'e5'"}]
+
+
+def test_moves_round_trip():
+    doc = game_document(split(GAMES, 10000)[0])
+    assert [uci(m) for m in decode_moves(doc["moves"])] == [
+        "e2e4", "e7e5", "g1f3", "b8c6", "f1b5", "a7a6", "e1g1", "g8f6", "f1e1",
+    ]
+
+
+AFTER_E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR"
+
+
+def test_full_fen_search_matches_the_stored_position():
+    doc = game_document(split(GAMES, 10000)[0])
+    hashes = search_hashes(f"{AFTER_E4} b KQkq e3 0 1")
+    assert hashes == search_hashes(f"{AFTER_E4} b KQkq - 0 1")
+    assert len(hashes) == 1 and hashes[0] in doc["positions"]
+    assert search_hashes(f"{AFTER_E4} w KQkq - 0 1")[0] not in doc["positions"]
+
+
+def test_placement_only_search_matches_any_side_and_castling():
+    doc = game_document(split(GAMES, 10000)[0])
+    hashes = search_hashes(AFTER_E4)
+    # Both sides, all 16 castling combinations the placement allows
+    assert len(hashes) == 32
+    assert set(hashes) & set(doc["positions"])
+    assert set(search_hashes(f"{AFTER_E4} b")) & set(doc["positions"])
+
+
+def test_placement_only_search_limits_castling_to_the_board():
+    # No rooks on their home squares, so no castling rights are possible
+    assert len(search_hashes("4k3/8/8/8/8/8/8/4K3")) == 2
+
+
+class ListCollection:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+def test_import_inserts_in_batches():
+    async def chunks():
+        for _ in range(5):
+            yield GAMES
+
+    collection = ListCollection()
+    summary = asyncio.run(import_pgn(chunks(), collection, extra={"import_id": "x"}, batch_size=3))
+    assert summary["imported"] == 5 and summary["rejected"] == 5
+    assert all(doc["import_id"] == "x" and "created_at" in doc for doc in collection.docs)
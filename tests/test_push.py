@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+
+from exponent_server_sdk import PushClient, PushTicket
+
+import server
+
+GOOD = [f"ExponentPushToken[device{i}]" for i in range(150)]
+
+
+class FakePushClient:
+    is_exponent_push_token = PushClient.is_exponent_push_token
+    requests = []
+
+    def publish_multiple(self, messages):
+        self.requests.append(len(messages))
+        if any(message.to.endswith("rejected]") for message in messages):
+            raise ValueError("Invalid message")
+        return [
+            PushTicket(push_message=message, status=PushTicket.SUCCESS_STATUS, message="", details=None, id=None)
+            for message in messages
+        ]
+
+
+class FakeTokens:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete_many(self, query):
+        self.deleted.extend(query["token"]["$in"])
+        return SimpleNamespace(deleted_count=len(query["token"]["$in"]))
+
+
+def test_bad_tokens_fail_alone(monkeypatch):
+    tokens = FakeTokens()
+    FakePushClient.requests = []
+    monkeypatch.setattr(server, "PushClient", FakePushClient)
+    monkeypatch.setattr(server, "db", SimpleNamespace(push_tokens=tokens))
+
+    rejected = "ExponentPushToken[rejected]"
+    result = asyncio.run(server.send_push_notification(["not-a-token", *GOOD[:50], rejected, *GOOD[50:]], "t", "b"))
+
+    assert result == {"successful": 150, "failed": 2}
+    assert tokens.deleted == ["not-a-token"]
+    # The first batch of 100 is retried one message at a time, the second goes through
+    assert FakePushClient.requests == [100] + [1] * 100 + [51]
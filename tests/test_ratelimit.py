@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from ratelimit import AdmissionControl, TokenBucketLimiter
+from session_filter import CountingBloomFilter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("ratelimit.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    limiter = TokenBucketLimiter()
+    results = [limiter.take("route", b"client", rate=2.0, burst=3)[0] for _ in range(4)]
+    assert results == [True, True, True, False]
+
+    allowed, retry_after = limiter.take("route", b"client", rate=2.0, burst=3)
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+
+    clock[0] += 0.5
+    assert limiter.take("route", b"client", rate=2.0, burst=3)[0]
+    assert not limiter.take("route", b"client", rate=2.0, burst=3)[0]
+
+
+def test_bucket_never_holds_more_than_burst(clock):
+    limiter = TokenBucketLimiter()
+    limiter.take("route", b"client", rate=1.0, burst=2)
+    clock[0] += 3600
+    results = [limiter.take("route", b"client", rate=1.0, burst=2)[0] for _ in range(3)]
+    assert results == [True, True, False]
+
+
+def test_buckets_are_per_route_and_client(clock):
+    limiter = TokenBucketLimiter()
+    assert limiter.take("a", b"one", rate=1.0, burst=1)[0]
+    assert not limiter.take("a", b"one", rate=1.0, burst=1)[0]
+    assert limiter.take("a", b"two", rate=1.0, burst=1)[0]
+    assert limiter.take("b", b"one", rate=1.0, burst=1)[0]
+    assert limiter.stats()["limited"] == {"a": 1}
+
+
+def test_bucket_count_is_bounded(clock):
+    limiter = TokenBucketLimiter(max_keys=10)
+    for i in range(100):
+        limiter.take("route", str(i).encode(), rate=1.0, burst=1)
+    assert limiter.stats()["buckets"] == 10
+
+
+def test_admission_sheds_on_each_threshold():
+    admission = AdmissionControl(max_in_flight=1, max_pool_waiters=5, max_pool_wait_ms=100)
+    assert admission.enter(6, 0) == "pool_waiters"
+    assert admission.enter(0, 150) == "pool_wait"
+    assert admission.enter(0, 0) is None
+    assert admission.enter(0, 0) == "in_flight"
+    admission.leave()
+    assert admission.enter(0, 0) is None
+    assert admission.stats()["shed"] == {"pool_waiters": 1, "pool_wait": 1, "in_flight": 1}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "rate_limiter", TokenBucketLimiter())
+    monkeypatch.setattr(server, "admission", AdmissionControl(100, 100, 1000))
+    monkeypatch.setattr(server, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(server, "RATE_LIMITS", {("GET", "/api/limited"): (0.001, 2)})
+    monkeypatch.setattr(server, "DEFAULT_RATE_LIMIT", (0.001, 100))
+    return TestClient(server.app)
+
+
+def test_middleware_limits_each_session(client):
+    codes = [client.get("/api/limited", headers={"Authorization": "Bearer a"}).status_code for _ in range(3)]
+    assert codes == [404, 404, 429]
+    response = client.get("/api/limited", headers={"Authorization": "Bearer a"})
+    assert int(response.headers["Retry-After"]) >= 1
+    assert client.get("/api/limited", headers={"Authorization": "Bearer b"}).status_code == 404
+
+
+def test_middleware_keys_login_by_address_not_token(client, monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMITS", {("POST", "/api/auth/session"): (0.001, 2)})
+    codes = [
+        client.post("/api/auth/session", headers={"Authorization": f"Bearer made-up-{i}"}).status_code
+        for i in range(3)
+    ]
+    assert codes[-1] == 429
+
+
+def test_middleware_uses_trusted_forwarded_address(client, monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXY_COUNT", 1)
+    for _ in range(2):
+        client.get("/api/limited", headers={"X-Forwarded-For": "10.0.0.1"})
+    assert client.get("/api/limited", headers={"X-Forwarded-For": "10.0.0.1"}).status_code == 429
+    # A forged first entry does not escape the bucket of the real address
+    assert client.get("/api/limited", headers={"X-Forwarded-For": "1.2.3.4, 10.0.0.1"}).status_code == 429
+    assert client.get("/api/limited", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 404
+
+
+def test_middleware_sheds_load_but_not_diagnostics(client, monkeypatch):
+    monkeypatch.setattr(server, "admission", AdmissionControl(0, 100, 1000))
+
+    async def not_authenticated(*args, **kwargs):
+        raise server.HTTPException(status_code=401)
+
+    monkeypatch.setattr(server, "get_current_user", not_authenticated)
+    response = client.get("/api/anything", headers={"Authorization": "Bearer a"})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    response = client.get("/api/admin/diagnostics/limits", headers={"Authorization": "Bearer a"})
+    assert response.status_code == 401
+
+
+def test_middleware_releases_in_flight_slots(client):
+    for _ in range(5):
+        client.get("/api/anything", headers={"Authorization": "Bearer a"})
+    assert server.admission.in_flight == 0
+    assert server.admission.peak_in_flight == 1
+
+
+def test_middleware_keys_unknown_tokens_by_address(client, monkeypatch):
+    index = server.SessionTokenIndex()
+    index.bloom = CountingBloomFilter(1000, 0.01)
+    index.last_sync = float("inf")  # no database sync
+    index.add("real", datetime.now(timezone.utc))
+    monkeypatch.setattr(server, "session_index", index)
+
+    codes = [
+        client.get("/api/limited", headers={"Authorization": f"Bearer fake-{i}"}).status_code
+        for i in range(3)
+    ]
+    assert codes == [404, 404, 429]
+    assert server.rate_limiter.stats()["buckets"] == 1
+    # A session the filter knows still gets its own bucket
+    assert client.get("/api/limited", headers={"Authorization": "Bearer real"}).status_code == 404
@@ -0,0 +1,162 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from session_filter import CountingBloomFilter, NegativeCache, token_hash
+
+
+def random_digest() -> bytes:
+    return token_hash(os.urandom(16).hex())
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = CountingBloomFilter(1000, 0.01)
+    digests = [random_digest() for _ in range(1000)]
+    for digest in digests:
+        bloom.add(digest)
+    assert all(digest in bloom for digest in digests)
+    assert bloom.count == 1000
+
+
+def test_bloom_false_positive_rate_is_near_target():
+    bloom = CountingBloomFilter(1000, 0.01)
+    for _ in range(1000):
+        bloom.add(random_digest())
+    false_positives = sum(random_digest() in bloom for _ in range(10000))
+    assert false_positives < 300
+
+
+def test_bloom_remove_keeps_other_entries():
+    bloom = CountingBloomFilter(100, 0.01)
+    kept = [random_digest() for _ in range(100)]
+    removed = random_digest()
+    for digest in kept + [removed]:
+        bloom.add(digest)
+    bloom.remove(removed)
+    assert removed not in bloom
+    assert all(digest in bloom for digest in kept)
+
+
+def test_bloom_ignores_removal_of_absent_entry():
+    bloom = CountingBloomFilter(100, 0.01)
+    bloom.add(random_digest())
+    counters = bytes(bloom.counters)
+    absent = next(d for d in iter(random_digest, None) if d not in bloom)
+    bloom.remove(absent)
+    assert bytes(bloom.counters) == counters
+    assert bloom.count == 1
+
+
+def test_bloom_saturated_counters_are_never_lowered():
+    bloom = CountingBloomFilter(10, 0.01)
+    digest = random_digest()
+    for _ in range(300):
+        bloom.add(digest)
+    for _ in range(300):
+        bloom.remove(digest)
+    assert digest in bloom
+
+
+def test_negative_cache_expires_and_evicts(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("session_filter.time.monotonic", lambda: now[0])
+    cache = NegativeCache(max_entries=2, ttl_seconds=10)
+    a, b, c = random_digest(), random_digest(), random_digest()
+    cache.add(a)
+    cache.add(b)
+    cache.add(c)
+    assert a not in cache and b in cache and c in cache
+    now[0] += 11
+    assert b not in cache
+
+
+@pytest.fixture
+def session_index():
+    index = server.SessionTokenIndex()
+    index.bloom = CountingBloomFilter(1000, 0.01)
+    index.last_sync = float("inf")  # no database sync in these tests
+    return index
+
+
+def test_index_accepts_added_and_rejects_removed_tokens(session_index):
+    now = datetime.now(timezone.utc)
+    session_index.add("alive", now)
+    session_index.add("gone", now)
+    session_index.remove("gone")
+
+    assert asyncio.run(session_index.might_be_valid(token_hash("alive")))
+    assert not asyncio.run(session_index.might_be_valid(token_hash("gone")))
+
+
+def test_index_rejects_unknown_tokens_without_the_database(session_index):
+    digest = next(d for d in iter(random_digest, None) if d not in session_index.bloom)
+    assert not asyncio.run(session_index.might_be_valid(digest))
+    assert not asyncio.run(session_index.might_be_valid(digest))
+    assert session_index.rejected_without_db == 2
+
+
+def test_index_login_clears_an_earlier_rejection(session_index):
+    session_index.reject(token_hash("new"))
+    session_index.add("new", datetime.now(timezone.utc))
+    assert asyncio.run(session_index.might_be_valid(token_hash("new")))
+
+
+class FakeSessions:
+    """user_sessions stand-in that knows a fixed set of tokens"""
+
+    def __init__(self, tokens):
+        self.tokens = set(tokens)
+
+    async def delete_one(self, query):
+        token = query["session_token"]
+        deleted = token in self.tokens
+        self.tokens.discard(token)
+        return type("DeleteResult", (), {"deleted_count": int(deleted)})()
+
+
+def test_logout_with_unknown_tokens_keeps_valid_sessions(session_index, monkeypatch):
+    # A full filter has false positives, which is what used to lower shared counters
+    session_index.bloom = CountingBloomFilter(200, 0.05)
+    valid = [f"session_{i}" for i in range(200)]
+    now = datetime.now(timezone.utc)
+    for token in valid:
+        session_index.add(token, now)
+    monkeypatch.setattr(server, "session_index", session_index)
+    monkeypatch.setattr(server, "db", type("FakeDb", (), {"user_sessions": FakeSessions(valid)})())
+    monkeypatch.setattr(server, "RATE_LIMIT_ENABLED", False)
+
+    client = TestClient(server.app)
+    for _ in range(1000):
+        response = client.post("/api/auth/logout", headers={"Authorization": f"Bearer {os.urandom(8).hex()}"})
+        assert response.status_code == 200
+
+    assert all(asyncio.run(session_index.might_be_valid(token_hash(token))) for token in valid)
+
+    client.post("/api/auth/logout", headers={"Authorization": f"Bearer {valid[0]}"})
+    assert not asyncio.run(session_index.might_be_valid(token_hash(valid[0])))
+
+
+def test_logout_on_another_worker_keeps_valid_sessions():
+    # Worker b built its filter before the sessions logged in on worker a,
+    # so it never added them; logging them out through b must not hide its own
+    a, b = server.SessionTokenIndex(), server.SessionTokenIndex()
+    a.bloom = CountingBloomFilter(1000, 0.01)
+    b.bloom = CountingBloomFilter(200, 0.05)
+    a.last_sync = b.last_sync = float("inf")
+    now = datetime.now(timezone.utc)
+    valid = [f"session_{i}" for i in range(200)]
+    for token in valid:
+        b.add(token, now)
+    elsewhere = [f"other_{i}" for i in range(1000)]
+    for token in elsewhere:
+        a.add(token, now)
+
+    for token in elsewhere:
+        b.remove(token)
+
+    assert all(asyncio.run(b.might_be_valid(token_hash(token))) for token in valid)
+    assert not asyncio.run(b.might_be_valid(token_hash(elsewhere[-1])))
@@ -0,0 +1,17 @@
+import asyncio
+
+import server
+
+
+def test_data_migrations_run_when_one_fails(monkeypatch):
+    ran = []
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    async def backfill():
+        ran.append("backfill")
+
+    monkeypatch.setattr(server, "DATA_MIGRATIONS", [failing, backfill])
+    asyncio.run(server.run_data_migrations())
+    assert ran == ["backfill"]
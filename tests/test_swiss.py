@@ -0,0 +1,78 @@
+import pytest
+
+from bench_swiss import run_event
+from swiss import BYE_POINTS, PairingError, SwissPlayer, apply_round, pair_round
+
+
+def field(count: int) -> dict:
+    return {f"p{i}": SwissPlayer(f"p{i}", rating=2000 - i * 10) for i in range(count)}
+
+
+@pytest.mark.parametrize("player_count,rounds", [(8, 7), (9, 7), (31, 7), (60, 9)])
+def test_events_have_no_repeats_double_byes_or_colour_problems(player_count, rounds):
+    # run_event reports repeat pairings, second byes, colour imbalance and
+    # incremental tie-breaks that differ from a full recomputation
+    for seed in range(3):
+        assert run_event(player_count, rounds, seed)["problems"] == []
+
+
+def test_first_round_pairs_top_half_against_bottom_half():
+    boards, bye = pair_round(list(field(8).values()))
+    assert bye is None
+    assert [set(board) for board in boards] == [{"p0", "p4"}, {"p1", "p5"}, {"p2", "p6"}, {"p3", "p7"}]
+    # The top seed alternates colours from board to board
+    assert [board[0] for board in boards] == ["p0", "p5", "p2", "p7"]
+
+
+def test_odd_field_gives_the_bye_to_the_lowest_ranked_player():
+    players = field(5)
+    boards, bye = pair_round(list(players.values()))
+    assert bye == "p4" and len(boards) == 2
+    apply_round(players, [(white, black, "1/2-1/2") for white, black in boards] + [(bye, None, None)])
+    assert players["p4"].score == BYE_POINTS and players["p4"].colors == "-"
+
+    boards, bye = pair_round(list(players.values()))
+    assert bye is not None and bye != "p4"
+
+
+def test_everyone_having_had_a_bye_still_pairs():
+    players = field(3)
+    for player in players.values():
+        player.had_bye = True
+    boards, bye = pair_round(list(players.values()))
+    assert bye == "p2" and len(boards) == 1
+
+
+def test_pairing_never_repeats_a_game():
+    players = field(2)
+    apply_round(players, [("p0", "p1", "1-0")])
+    with pytest.raises(PairingError):
+        pair_round(list(players.values()))
+
+
+def test_apply_round_updates_tiebreaks_of_earlier_opponents():
+    players = field(4)
+    apply_round(players, [("p0", "p2", "1-0"), ("p1", "p3", "1/2-1/2")])
+    apply_round(players, [("p0", "p1", "0-1"), ("p2", "p3", "1-0")])
+    # p0 beat p2 (now 2) and lost to p1 (now 3)
+    assert players["p0"].score == 2
+    assert players["p0"].buchholz == 5
+    assert players["p0"].sonneborn_berger == 2 * 2
+
+
+def test_unrepairable_colour_conflict_is_not_paired():
+    # Both must have white, so only the relaxed search pairs them
+    players = [SwissPlayer("a", rating=2000, colors="BB"), SwissPlayer("b", rating=1900, colors="BB")]
+    with pytest.raises(PairingError):
+        pair_round(players)
+
+
+def test_colour_conflict_moves_the_bye_up():
+    players = [
+        SwissPlayer("a", rating=2000, colors="BB"),
+        SwissPlayer("b", rating=1900, colors="BB"),
+        SwissPlayer("c", rating=1800, colors="WW"),
+    ]
+    boards, bye = pair_round(players)
+    assert bye == "b"
+    assert boards == [("a", "c")]